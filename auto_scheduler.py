@@ -1,6 +1,13 @@
-from libs import tutor_api
-from pendulum import DateTime, Period
-from threading import Thread, Barrier
+from libs import metrics, tutor_api, server_clock, request_scheduler
+from libs.planner import Planner, Rules
+from libs.request_scheduler import RequestScheduler
+from libs.server_clock import ClockEstimate
+from pendulum import DateTime
+from threading import Lock
+from dataclasses import dataclass, field, replace
+import hashlib
+import itertools
+import math
 import time
 
 # get schedule for current week
@@ -12,18 +19,61 @@ import time
 # Check return of API call for success
 # increment hours if success
 # if added 4 hours in row, skip hour
-# # don't add more than 8 hours per day on first pass
-# if hours less than 40, take second pass
-# start after last scheduled hour
+# # don't add more than 8 hours per day unless needed to hit 40
+# if we miss an hour, replan and try for the next best one right away
 # don't violate previous rules
 WEEKENDS = ["MON", "WED"]
 START_TIME = 11
 END_TIME = 24  # Don't schedule this hour or past it
 MAX_PER_DAY = 8
 MAX_PER_WEEK = 40
+RULES = Rules(
+    weekends=tuple(WEEKENDS),
+    start_time=START_TIME,
+    end_time=END_TIME,
+    max_per_day=MAX_PER_DAY,
+    max_per_week=MAX_PER_WEEK,
+)
+# When new hours are released each day, by the server's clock
+RELEASE_HOUR = 11
+# How long after the release time (by the server's clock) we want our
+# requests to arrive, on top of however unsure we are about its clock.
+FIRE_MARGIN = 0.02
+# How long before firing to open the connections. Any earlier and they sit
+# idle long enough that the server might close them again.
+WARM_UP_BEFORE = 2
+# If we only get going this many seconds after the release, there's no
+# moment left to aim for, so everything goes straight away.
+LATE_START = 5
+# Over-subscribing: ask for this many more hours than we need in the first
+# burst (0.5 means half again as many), keep the best of what we win, and
+# give the rest back. 0 turns it off.
+OVERSUBSCRIBE = 0.0
+# How long to wait for the extra hours to be given back
+RELEASE_TIMEOUT = 5
+# Watch mode: how often to check for hours other tutors have dropped. Right
+# after a change it checks every WATCH_FASTEST seconds, slowing down by
+# WATCH_BACKOFF each time nothing changed, up to WATCH_SLOWEST. It never
+# fetches more than WATCH_REQUESTS_PER_HOUR pages an hour on average.
+WATCH_FASTEST = 5
+WATCH_SLOWEST = 60
+WATCH_BACKOFF = 1.5
+WATCH_REQUESTS_PER_HOUR = 1200
+WATCH_WEEKS = 2
+# Where to write timing metrics after each run: Prometheus' text format if
+# it ends in .prom, otherwise JSON. None to not write them.
+METRICS_OUT = None
 
 
 def main():
+    try:
+        auto_schedule()
+    finally:
+        if METRICS_OUT:
+            metrics.registry.write(METRICS_OUT)
+
+
+def auto_schedule():
     _ = tutor_api.login_and_get_html()
     html = tutor_api.get_html_for_week(DateTime.now().add(weeks=1))
 
@@ -32,8 +82,17 @@ def main():
     print(f"Currently scheduled for {hours_before} hours.")
     print("Commence auto scheduling!")
 
-    hours_to_schedule = get_hours_to_schedule(schedule)
-    successfully_scheduled = schedule_hours_in_threads(schedule.week, hours_to_schedule)
+    if OVERSUBSCRIBE:
+        outcome = oversubscribe(schedule, OVERSUBSCRIBE, release_time())
+        print_results(outcome.results)
+        successfully_scheduled = outcome.kept
+    else:
+        planner = Planner(schedule, schedule.hours_scheduled, RULES)
+        hours_to_schedule = planner.plan()
+        planner.request(hours_to_schedule)
+        successfully_scheduled = schedule_hours_in_threads(
+            schedule.week, hours_to_schedule, planner
+        )
 
     schedule.hours_scheduled += len(successfully_scheduled)
     print(
@@ -41,124 +100,416 @@ def main():
         f"for a total of {schedule.hours_scheduled}"
     )
 
-    for day, hour in hours_to_schedule:
-        day_name = tutor_api.DAYS_OF_WEEK[day]
-        if (day, hour) in successfully_scheduled:
-            schedule[day_name][hour] = "Scheduled!"
-        else:
-            del schedule[day_name][hour]
 
-    # do it all again if we haven't hit our weekly maximum
-    if schedule.hours_scheduled < MAX_PER_WEEK:
+@dataclass
+class GrabResult:
+    """The outcome of one attempt to grab a slot."""
+
+    day: int
+    hour: int
+    success: bool
+    # seconds between sending the request and getting the response back
+    latency: float
+    error: Exception | None = None
+
+
+def schedule_hours_in_threads(
+    week: DateTime,
+    hours_to_schedule: list[tuple[int, int]],
+    planner: Planner | None = None,
+) -> list[tuple[int, int]]:
+    """
+    Grab the given hours as soon as they're released at 11:00, and return
+    the ones we got. If a planner is given, hours we miss are replaced with
+    the next best ones right away.
+    """
+    results = grab_hours(week, hours_to_schedule, release_time(), planner=planner)
+    print_results(results)
+    return [(r.day, r.hour) for r in results if r.success]
+
+
+def print_results(results: list[GrabResult]):
+    for result in results:
+        status = "got it" if result.success else "missed"
+        if result.error:
+            status = f"error: {result.error}"
         print(
-            f"Since you need {MAX_PER_WEEK - schedule.hours_scheduled} "
-            f"to meet your desired work amount, I'm going to try to "
-            f"schedule more than {MAX_PER_DAY} hours per day."
-        )
-        hours_to_schedule = get_hours_to_schedule(schedule, ignore_daily_max=True)
-        successfully_scheduled = schedule_hours_in_threads(
-            schedule.week, hours_to_schedule
+            f"{tutor_api.DAYS_OF_WEEK[result.day]} {result.hour:>2}:00 "
+            f"{status} ({result.latency * 1000:.0f} ms)"
         )
 
-        schedule.hours_scheduled += len(successfully_scheduled)
+
+def release_time() -> DateTime:
+    """When hours get released, according to the server's clock."""
+    now = DateTime.now()
+    return DateTime(now.year, now.month, now.day, RELEASE_HOUR, tzinfo=now.tzinfo)
+
+
+def local_fire_time(release: DateTime, clock: ClockEstimate) -> float:
+    """
+    Work out when (as a local time.time() timestamp) to send our requests so
+    they arrive just after `release` by the server's clock. A request takes
+    about half the round trip to get there, and we add the uncertainty in
+    the clock estimate so we're never early.
+    """
+    arrival = clock.local_time_for(release.timestamp())
+    return arrival - clock.rtt / 2 + clock.uncertainty + FIRE_MARGIN
+
+
+def grab_hours(
+    week: DateTime,
+    hours_to_schedule: list[tuple[int, int]],
+    fire_at: DateTime | None,
+    clock: ClockEstimate | None = None,
+    planner: Planner | None = None,
+    armed: tutor_api.ArmedWeek | None = None,
+) -> list[GrabResult]:
+    """
+    Try to schedule all the given hours at the same moment.
+
+    Everything that can be done ahead of time is: all the requests are
+    built and queued up in a RequestScheduler, its threads are started and
+    parked, and the server's clock offset is measured (unless `clock` is
+    given). WARM_UP_BEFORE seconds before firing, the connection pool is
+    warmed up with a connection for each thread, late enough that they
+    can't go idle and get closed. Then just after `fire_at` by the server's
+    clock, all the threads are released at once, and each records its own
+    result and latency. The hours go out in the order they're given, so the
+    planner's first picks are first, within the scheduler's rate limits.
+
+    If `fire_at` is None, or more than LATE_START seconds ago, the hours
+    are already up for grabs, so there's no clock to check or connections
+    to warm up: the threads go as soon as they're ready. `armed` saves building the requests, if they already
+    have been.
+
+    With a planner, every result is reported back to it, and any
+    replacements it comes up with for missed hours are sent straight away
+    by whichever thread is free.
+    """
+    if not hours_to_schedule:
+        return []
+    if fire_at is not None and fire_at.timestamp() < time.time() - LATE_START:
+        print("Missed the release, firing straight away")
+        fire_at = None
+
+    if armed is None:
+        armed = tutor_api.ArmedWeek(week)
+    scheduler = RequestScheduler(
+        lambda slot: armed.schedule_hour(*slot),
+        concurrency=min(len(hours_to_schedule), request_scheduler.CONCURRENCY),
+    )
+    results: list[GrabResult] = []
+    results_lock = Lock()
+    # replacements go after everything that was planned up front
+    priorities = itertools.count()
+
+    def on_done(
+        slot: tuple[int, int],
+        success: bool | None,
+        error: Exception | None,
+        sent_at: float,
+    ):
+        day, hour = slot
+        success = bool(success)
+        latency = time.perf_counter() - sent_at
+        replacements = []
+        outcome = "error" if error else "won" if success else "lost"
+        metrics.count("grabs", outcome=outcome)
+        metrics.observe("grab_latency_seconds", latency)
+        with results_lock:
+            results.append(GrabResult(day, hour, success, latency, error))
+            # If something went wrong, we don't know if we got the hour,
+            # so leave it as pending rather than risk double booking.
+            if planner is not None and error is None:
+                if success:
+                    planner.mark_won(day, hour)
+                else:
+                    replacements = planner.mark_lost(day, hour)
+        for replacement in replacements:
+            scheduler.submit(replacement, next(priorities), on_done)
+
+    for slot in hours_to_schedule:
+        scheduler.submit(slot, next(priorities), on_done)
+    scheduler.start()
+    if clock is None and fire_at is not None:
+        clock = server_clock.estimate_offset(tutor_api.session, tutor_api.BASE_URL)
         print(
-            f"Scheduled {len(successfully_scheduled)} more hours, "
-            f"for a total of {schedule.hours_scheduled}"
+            f"Server clock is {clock.offset:+.3f}s (+/- {clock.uncertainty:.3f}s) "
+            f"from ours, round trip is {clock.rtt * 1000:.0f} ms"
         )
 
+    # now we wait until 11:00, opening the connections just before
+    if fire_at is not None:
+        deadline = local_fire_time(fire_at, clock)
+        if deadline - WARM_UP_BEFORE > time.time():
+            print(f"Sleeping for {deadline - time.time():.1f} seconds")
+            server_clock.wait_until(deadline - WARM_UP_BEFORE)
+        tutor_api.session.warm_up(tutor_api.BASE_URL, scheduler.concurrency)
+        if deadline > time.time():
+            server_clock.wait_until(deadline)
+
+    # and release all the threads at once
+    scheduler.release()
+    if fire_at is not None:
+        metrics.observe("fire_lateness_seconds", time.time() - deadline)
+
+    print("Waiting for threads")
+    scheduler.join()
+    return results
+
 
-def schedule_hours_in_threads(week: DateTime, hours_to_schedule: list[tuple[int, int]]):
-    # The +1 is needed for this main thread
-    barrier = Barrier(len(hours_to_schedule) + 1)
-    successfully_scheduled: list[tuple[int, int]] = []
-    # creating a list of threads first as a probably premature optimization
-    threads = []
-    for day, hour in hours_to_schedule:
-        t = Thread(
-            target=attempt_to_schedule_hour,
-            args=(week, day, hour, successfully_scheduled, barrier),
+@dataclass
+class OversubscribeOutcome:
+    # every attempt to grab an hour, in both rounds
+    results: list[GrabResult]
+    # the new hours we ended up with
+    kept: list[tuple[int, int]]
+    # extra hours we won and gave back
+    released: list[tuple[int, int]]
+    # extra hours we won but couldn't give back
+    stuck: list[tuple[int, int]]
+
+
+def oversubscribe(
+    schedule: tutor_api.Schedule,
+    extra: float,
+    fire_at: DateTime,
+    clock: ClockEstimate | None = None,
+    rules: Rules = RULES,
+) -> OversubscribeOutcome:
+    """
+    Grab more hours than we need, so losing some to other tutors doesn't
+    leave us short, then give back the ones we don't want.
+
+    The first burst asks for everything the planner wants, plus `extra`
+    times as many of the hours it would most likely turn to if some of
+    those were lost (see Planner.fallbacks()). The planner then picks
+    the best set it can out of what we won, and the rest are released with
+    Remove requests all at once, waiting at most RELEASE_TIMEOUT seconds.
+    The week is then fetched again to check: anything still ours that we
+    didn't mean to keep (including hours whose request errored, so we
+    didn't know) is released again. Lastly, if we're still short, the
+    usual planner-driven grab goes after whatever's left.
+    """
+    week = schedule.week
+    planner = Planner(schedule, schedule.hours_scheduled, rules)
+    wanted = planner.plan()
+    extras = planner.fallbacks()[: math.ceil(len(wanted) * extra)]
+    armed = tutor_api.ArmedWeek(week)
+    print(f"Asking for {len(wanted)} hours, plus {len(extras)} extra.")
+    results = grab_hours(week, wanted + extras, fire_at, clock, armed=armed)
+
+    won = [(r.day, r.hour) for r in results if r.success]
+    keep = set(best_hours(schedule, won, rules))
+    release = [slot for slot in won if slot not in keep]
+    released, _ = release_hours(armed, release)
+
+    # see what we really have now
+    after = tutor_api.Schedule(tutor_api.get_html_for_week(week))
+    ours = {
+        (day, hour)
+        for day in range(7)
+        for hour in tutor_api.bits(
+            after.grid.scheduled[day] & ~schedule.grid.scheduled[day]
         )
-        threads.append(t)
+    }
+    leftover = sorted(ours - keep)
+    stuck = []
+    if leftover:
+        released_again, stuck = release_hours(armed, leftover)
+        released = sorted(set(released) | set(released_again))
+        if stuck:
+            print(f"Couldn't give back {len(stuck)} extra hours: {stuck}")
+        after = tutor_api.Schedule(tutor_api.get_html_for_week(week))
+    metrics.count("oversubscribe_released", len(released))
+    metrics.count("oversubscribe_stuck", len(stuck))
 
-    # now we wait until 11:00
-    now = DateTime.now()
-    # one second after eleven to provide some wiggle room for clock difference
-    eleven = DateTime(now.year, now.month, now.day, 11, 0, 1, tzinfo=now.tzinfo)
-    delta: Period = now.diff(eleven, abs=False)
-    if delta.in_seconds() > 0:
-        print(f"Sleeping for {delta.in_seconds()} seconds")
-        time.sleep(delta.in_seconds())
+    # if we lost too many, go after what's left the usual way
+    kept = sorted(ours & keep)
+    planner = Planner(after, after.hours_scheduled, rules)
+    more = planner.plan()
+    if more:
+        planner.request(more)
+        more_results = grab_hours(week, more, None, planner=planner, armed=armed)
+        results += more_results
+        kept += [(r.day, r.hour) for r in more_results if r.success]
+    return OversubscribeOutcome(results, kept, released, stuck)
 
-    # now we can launch those threads
-    for thread in threads:
-        thread.run()
 
-    print("Waiting for threads")
-    barrier.wait()
+def best_hours(
+    schedule: tutor_api.Schedule, won: list[tuple[int, int]], rules: Rules = RULES
+) -> list[tuple[int, int]]:
+    """The best set of the hours we `won` to keep, as far as the planner's concerned."""
+    grid = tutor_api.Grid(scheduled=list(schedule.grid.scheduled))
+    for day, hour in won:
+        grid.available[day] |= 1 << hour
+    mine = tutor_api.Schedule.from_grid(schedule.week, grid)
+    return Planner(mine, schedule.hours_scheduled, rules).plan()
 
-    return successfully_scheduled
 
+def release_hours(
+    armed: tutor_api.ArmedWeek, slots: list[tuple[int, int]]
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Send Remove requests for all the hours at once. Returns the ones that
+    were released, and the ones that weren't (or didn't finish within
+    RELEASE_TIMEOUT seconds).
+    """
+    if not slots:
+        return [], []
+    # Requests still going after the timeout keep adding to this, so only
+    # a copy taken under the lock gets returned
+    done = []
+    lock = Lock()
 
-def attempt_to_schedule_hour(
-    week: DateTime, day: int, hour: int, successfully_scheduled: list, barrier: Barrier
-):
-    if tutor_api.schedule_hour(week, day, hour):
-        successfully_scheduled.append((day, hour))
+    def on_done(slot, success, error, sent_at):
+        if success:
+            with lock:
+                done.append(slot)
 
-    barrier.wait()
+    scheduler = RequestScheduler(
+        lambda slot: armed.schedule_hour(*slot, unset=True),
+        concurrency=min(len(slots), request_scheduler.CONCURRENCY),
+    )
+    for priority, slot in enumerate(slots):
+        scheduler.submit(slot, priority, on_done)
+    scheduler.start()
+    scheduler.release()
+    scheduler.join(RELEASE_TIMEOUT)
+    with lock:
+        released = sorted(done)
+    return released, [slot for slot in slots if slot not in released]
 
 
-# TODO: take into account hours before START_TIME when
-#       initially setting consecutive_hours
 def get_hours_to_schedule(schedule, ignore_daily_max=False) -> list[tuple[int, int]]:
-    available_hours = []
-    hours_scheduled = schedule.hours_scheduled
-    schedule_copy = {
-        day: {hour: availability for hour, availability in hours.items()}
-        for day, hours in schedule.items()
-    }
-    for day, timeslots in schedule_copy.items():
-        if day in WEEKENDS:
-            continue
-
-        if hours_scheduled >= MAX_PER_WEEK:
-            break
-
-        day_of_week = tutor_api.DAYS_OF_WEEK.index(day)
-        consecutive_hours = 0
-        hours_for_day = list(schedule[day].values()).count("Scheduled!")
-        for hour in range(START_TIME, END_TIME):
-            if consecutive_hours == 4:
-                consecutive_hours = 0
+    rules = RULES
+    if ignore_daily_max:
+        rules = replace(rules, max_per_day=24)
+    return Planner(schedule, schedule.hours_scheduled, rules).plan()
+
+
+@dataclass
+class PollInterval:
+    """
+    How long to wait before the next poll. See WATCH_FASTEST and friends.
+    `requests_per_poll` is how many pages each poll fetches, for keeping
+    under the hourly budget.
+    """
+
+    fastest: float = WATCH_FASTEST
+    slowest: float = WATCH_SLOWEST
+    backoff: float = WATCH_BACKOFF
+    requests_per_hour: float = WATCH_REQUESTS_PER_HOUR
+    requests_per_poll: int = 1
+    current: float = field(init=False)
+
+    def __post_init__(self):
+        self.current = self.floor()
+
+    def floor(self) -> float:
+        return max(self.fastest, 3600 * self.requests_per_poll / self.requests_per_hour)
+
+    def changed(self):
+        self.current = self.floor()
+
+    def unchanged(self):
+        self.current = max(self.floor(), min(self.slowest, self.current * self.backoff))
+
+
+class Watcher:
+    """
+    Keeps an eye on the schedule for hours other tutors drop, and grabs the
+    ones the rules allow as soon as they show up.
+
+    Each poll fetches the current week and the next `weeks - 1`. A page
+    that's exactly the same as last time isn't even parsed. Otherwise its
+    grid is compared against the last one, and any hours that just became
+    available are planned (on their own, so hours we passed up before stay
+    passed up) and grabbed straight away. The very first look at a week
+    only records it.
+    """
+
+    def __init__(self, weeks=WATCH_WEEKS, rules=RULES, interval=None):
+        self.weeks = weeks
+        self.rules = rules
+        self.interval = interval or PollInterval(requests_per_poll=weeks)
+        self.hashes: dict[str, str] = {}
+        self.grids: dict[str, tutor_api.Grid] = {}
+        # the requests for each week, built once, along with the cookies
+        # they were built with
+        self.armed: dict[str, tuple[dict, tutor_api.ArmedWeek]] = {}
+
+    def poll(self) -> list[GrabResult]:
+        """Check every week once, and return the results of any grabs."""
+        this_week = DateTime.now().start_of("week")
+        results = []
+        changed = False
+        for i in range(self.weeks):
+            week = this_week.add(weeks=i)
+            key = week.format("YYYY-MM-DD")
+            html = tutor_api.get_html_for_week(week)
+            digest = hashlib.sha1(html.encode()).hexdigest()
+            if self.hashes.get(key) == digest:
+                metrics.count("watch_polls", changed="false")
                 continue
+            self.hashes[key] = digest
+            detected_at = time.perf_counter()
+
+            schedule = tutor_api.Schedule(html)
+            before = self.grids.get(key)
+            self.grids[key] = schedule.grid
+            change = before and schedule.grid.diff(before)
+            metrics.count("watch_polls", changed=str(bool(change)).lower())
+            if not change:
+                continue
+            changed = True
+            if any(change.became_available):
+                grabbed = self.grab(key, schedule, change.became_available)
+                if grabbed:
+                    metrics.observe(
+                        "watch_detect_to_grab_seconds",
+                        time.perf_counter() - detected_at,
+                    )
+                results.extend(grabbed)
+
+        # drop old weeks, so this doesn't grow forever
+        for key in list(self.grids):
+            if key < this_week.format("YYYY-MM-DD"):
+                del self.grids[key], self.hashes[key]
+                self.armed.pop(key, None)
+
+        if changed:
+            self.interval.changed()
+        else:
+            self.interval.unchanged()
+        return results
+
+    def grab(
+        self, key: str, schedule: tutor_api.Schedule, became_available: list[int]
+    ) -> list[GrabResult]:
+        planner = Planner(schedule, schedule.hours_scheduled, self.rules)
+        planner.restrict(became_available)
+        hours = planner.plan()
+        if not hours:
+            return []
+        planner.request(hours)
+        print(f"{len(hours)} hours opened up in the week of {key}, grabbing them.")
+        results = grab_hours(
+            schedule.week,
+            hours,
+            None,
+            planner=planner,
+            armed=self.armed_week(key, schedule.week),
+        )
+        print_results(results)
+        return results
 
-            if hours_for_day >= MAX_PER_DAY and not ignore_daily_max:
-                break
-
-            if timeslots.get(hour) == "Available":
-                available_hours.append((day_of_week, hour))
-                # assume we can schedule it
-                hours_scheduled += 1
-                # schedule[day][hour] = "Scheduled!"
-                consecutive_hours += 1
-                hours_for_day += 1
-
-                # success = tutor_api.schedule_hour(schedule.week, day_of_week, i)
-                # if success:
-                #     schedule.hours_scheduled += 1
-                #     schedule[day][i] = "Scheduled!"
-                #     consecutive_hours += 1
-                #     hours_for_day += 1
-                # else:
-                #     consecutive_hours = 0
-                #     # someone got to it before us, so delete from schedule.
-                #     schedule[day].pop(i, None)
-            elif timeslots.get(hour) == "Scheduled!":
-                consecutive_hours += 1
-            else:
-                consecutive_hours = 0
-
-    return available_hours
+    def armed_week(self, key: str, week: DateTime) -> tutor_api.ArmedWeek:
+        """The week's requests, rebuilt if we've logged in again since."""
+        cookies = tutor_api.session.cookies.get_dict()
+        if key not in self.armed or self.armed[key][0] != cookies:
+            self.armed[key] = (cookies, tutor_api.ArmedWeek(week))
+        return self.armed[key][1]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""
+Compare the cost of building a fresh Calendar service for every operation
+(what calendar_api used to do) against reusing the process-wide client.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_calendar_client
+
+No network access or Google account is needed -- the service is built with
+anonymous credentials, and the requests are only constructed, not sent.
+"""
+
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+
+from libs import calendar_api
+
+ITERATIONS = 50
+
+
+def make_request(service):
+    return service.events().list(calendarId="primary", singleEvents=True)
+
+
+def cold_operation():
+    service = build("calendar", "v3", credentials=AnonymousCredentials())
+    return make_request(service)
+
+
+def warm_operation():
+    return make_request(calendar_api.get_service())
+
+
+def time_per_operation(operation, iterations=ITERATIONS) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        operation()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    calendar_api.creds = AnonymousCredentials()
+    calendar_api.service = None
+
+    start = time.perf_counter()
+    calendar_api.get_service()
+    first_build = time.perf_counter() - start
+
+    cold = time_per_operation(cold_operation)
+    warm = time_per_operation(warm_operation)
+
+    print(f"first get_service():       {first_build * 1000:8.3f} ms")
+    print(f"cold build per operation:  {cold * 1000:8.3f} ms")
+    print(f"warm client per operation: {warm * 1000:8.3f} ms")
+    print(f"speedup:                   {cold / warm:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measure how much work syncing the calendar takes -- HTTP requests, API
+calls, bytes and wall time -- against the fake Calendar API from
+tests/fake_calendar.py, for one week and for many.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_calendar_sync --latency 0.05 --weeks 8
+
+No network access or Google account is needed. The events come from the
+schedule page in tests/page_data, repeated for every week.
+"""
+
+import tempfile
+import time
+
+import click
+from google.auth.credentials import AnonymousCredentials
+
+from libs import calendar_api, tutor_api
+from libs.calendar_mirror import CalendarMirror
+from tests.fake_calendar import FakeCalendarServer
+
+CALENDAR_ID = "benchmark"
+
+
+def load_events(weeks: int) -> list[calendar_api.SimpleEvent]:
+    """The events for the schedule page, copied into `weeks` weeks in a row."""
+    with open("tests/page_data/schedule.html") as f:
+        schedule = tutor_api.Schedule(f.read())
+    week_events = [
+        event for day in schedule.to_simple_events().values() for event in day
+    ]
+    return [
+        calendar_api.SimpleEvent(
+            event.summary, event.start.add(weeks=i), event.end.add(weeks=i)
+        )
+        for i in range(weeks)
+        for event in week_events
+    ]
+
+
+def sync(events, replace=False, mirror: CalendarMirror | None = None):
+    """Sync the calendar the way schedule_to_calendar does."""
+    start = min(event.start for event in events).start_of("week")
+    end = max(event.start for event in events).end_of("week")
+    if mirror is not None:
+        mirror.refresh()
+        existing = mirror.events_between(start, end)
+    else:
+        existing = calendar_api.get_events_between(start, end)
+    if replace:
+        calendar_api.delete_all_events(existing)
+        calendar_api.add_events(events)
+    else:
+        calendar_api.sync_events(events, existing)
+
+
+def measure(server: FakeCalendarServer, name: str, operation):
+    server.reset_stats()
+    start = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    print(
+        f"{name:<38} {stats['http_requests']:>5} {stats['calls']:>6} "
+        f"{stats['bytes_received'] / 1024:>8.1f} {stats['bytes_sent'] / 1024:>8.1f} "
+        f"{elapsed * 1000:>9.1f}"
+    )
+
+
+def bench(server: FakeCalendarServer, weeks: int):
+    events = load_events(weeks)
+    label = f"{weeks} week{'s' if weeks > 1 else ''}"
+    # the same, minus the first event of every day
+    changed = [
+        event
+        for before, event in zip(events, events[1:])
+        if before.start.date() == event.start.date()
+    ]
+
+    measure(server, f"{label}: first sync", lambda: sync(events))
+    measure(server, f"{label}: nothing changed", lambda: sync(events))
+    measure(server, f"{label}: some hours dropped", lambda: sync(changed))
+    measure(server, f"{label}: --replace", lambda: sync(events, replace=True))
+
+    # the same again, reading through a mirror of the calendar. The run
+    # after any writes reads those writes back, so it takes a third run to
+    # see what it costs when nothing's changed at all.
+    server.calendars.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        mirror = CalendarMirror(f"{tmp}/mirror.sqlite3", CALENDAR_ID)
+        for name, desired in [
+            ("first sync", events),
+            ("next sync", events),
+            ("steady state", events),
+            ("some hours dropped", changed),
+        ]:
+            measure(
+                server,
+                f"{label}, mirror: {name}",
+                lambda: sync(desired, mirror=mirror),
+            )
+        mirror.close()
+
+
+@click.command()
+@click.option("--latency", default=0.0, help="Seconds added to every response.")
+@click.option("--rate-limit", default=0.0, help="Chance any call gets rate limited.")
+@click.option("--weeks", default=8, help="How many weeks for the multi-week runs.")
+def main(latency, rate_limit, weeks):
+    with FakeCalendarServer(latency=latency, rate_limit=rate_limit) as server:
+        calendar_api.API_ROOT = server.url
+        calendar_api.creds = AnonymousCredentials()
+        calendar_api.service = None
+        calendar_api.credentials = {"calendar_id": CALENDAR_ID}
+
+        print(
+            f"{'':<38} {'HTTP':>5} {'calls':>6} {'KiB up':>8} {'KiB down':>8} {'ms':>9}"
+        )
+        bench(server, 1)
+        server.calendars.clear()
+        bench(server, weeks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measure how long each entry point takes to start: a fresh interpreter
+importing the module, which is what every cron or container run pays
+before doing anything useful. Also lists the slowest imports under each
+one, and which of the heavy optional dependencies got loaded when they
+shouldn't have.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_import_time --runs 10
+
+Each import runs from an empty directory, so it also checks that merely
+importing doesn't need anything from secrets/.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+ENTRY_POINTS = [
+    "auto_scheduler",
+    "schedule_to_calendar",
+    "daemon",
+    "multi_account",
+    "libs.tutor_api",
+    "libs.calendar_api",
+]
+# Slow to import, and only needed once they're actually used
+HEAVY_MODULES = [
+    "bs4",
+    "html5lib",
+    "googleapiclient.discovery",
+    "google_auth_oauthlib",
+    "google_auth_httplib2",
+    "httplib2",
+]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_import(module: str, cwd: str) -> tuple[float, str, str]:
+    """
+    Import `module` in a new interpreter, and return how long it took, the
+    heavy modules it loaded, and the -X importtime report.
+    """
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise Exception(f"Importing {module} failed:\n{result.stderr}")
+    return elapsed, result.stdout.strip(), result.stderr
+
+
+def slowest_imports(
+    importtime: str, module: str, count: int
+) -> list[tuple[float, str]]:
+    """
+    The packages `module` pulled in that took the longest, in milliseconds,
+    from the -X importtime report.
+    """
+    totals: dict[str, float] = {}
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        package = name.strip().split(".")[0]
+        if package in ("sys", "libs", module.split(".")[0]):
+            continue
+        # the outermost import of a package is the one that includes the rest
+        totals[package] = max(totals.get(package, 0), int(cumulative) / 1000)
+    return sorted(((ms, name) for name, ms in totals.items()), reverse=True)[:count]
+
+
+@click.command()
+@click.option("--runs", default=5, help="How many fresh interpreters per module.")
+@click.option("--top", default=4, help="How many of the slowest imports to list.")
+def main(runs, top):
+    # warm up the OS file cache, and the .pyc files
+    subprocess.run([sys.executable, "-c", "import schedule_to_calendar"], cwd=REPO_ROOT)
+
+    print(f"{'':<22} {'median ms':>10} {'min ms':>8}  heavy modules loaded")
+    with tempfile.TemporaryDirectory() as empty:
+        for module in ENTRY_POINTS:
+            times = []
+            for _ in range(runs):
+                elapsed, heavy, importtime = run_import(module, empty)
+                times.append(elapsed)
+            print(
+                f"{module:<22} {statistics.median(times) * 1000:>10.1f} "
+                f"{min(times) * 1000:>8.1f}  {heavy or '-'}"
+            )
+            for ms, name in slowest_imports(importtime, module, top):
+                print(f"    {name:<18} {ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Benchmark the performance-critical paths end to end, against the fake
+tutor.com server from tests/fake_tutor.py: logging in, parsing schedule
+pages, planning, and grabbing hours when they're released while other
+tutors are trying to grab them too.
+
+Run from the repository root with:
+
+    python -m benchmarks.bench_tutor_endpoints --latency 0.03 --competition 0.3
+
+Everything runs locally, so no tutor.com account is needed. --latency is
+added to every response, to stand in for the round trip to the real site.
+The fake server runs in this same process, so its share of the CPU time
+shows up in the grab latencies too.
+"""
+
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+import click
+import pendulum
+
+import auto_scheduler
+from libs import tutor_api, tutor_http
+from libs.planner import Planner
+from libs.server_clock import ClockEstimate
+from tests.fake_tutor import FakeTutorServer, week_start
+
+ITERATIONS = 20
+PARSE_ITERATIONS = 200
+WEEK = week_start(date.today())
+# The hours that get released, on days the default rules allow
+RELEASED = {(day, hour) for day in (0, 2, 4, 5, 6) for hour in range(11, 24)}
+
+
+def point_at(server: FakeTutorServer, session_file: str):
+    tutor_api.BASE_URL = server.url
+    tutor_api.credentials = server.credentials
+    tutor_api.SESSION_FILE = session_file
+    tutor_api.session = tutor_http.TutorSession()
+
+
+def per_call(function, iterations) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+
+
+def bench_login(latency, session_file):
+    with FakeTutorServer(released={WEEK: RELEASED}, latency=latency) as server:
+        point_at(server, session_file)
+
+        def fresh_login():
+            tutor_api.session = tutor_http.TutorSession()
+            if os.path.exists(session_file):
+                os.remove(session_file)
+            tutor_api.login_and_get_html()
+
+        def reused_login():
+            tutor_api.session = tutor_http.TutorSession()
+            tutor_api.session.load_cookies(session_file)
+            tutor_api.login_and_get_html()
+
+        fresh = per_call(fresh_login, ITERATIONS)
+        reused = per_call(reused_login, ITERATIONS)
+        html = tutor_api.get_html_for_week(pendulum.now())
+        fetch = per_call(
+            lambda: tutor_api.get_html_for_week(pendulum.now()), ITERATIONS
+        )
+
+    print(f"full login:                {fresh * 1000:8.2f} ms")
+    print(f"login with saved session:  {reused * 1000:8.2f} ms")
+    print(f"fetch one week:            {fetch * 1000:8.2f} ms")
+    return html
+
+
+def bench_parsing(html):
+    fast = per_call(lambda: tutor_api.Schedule(html), PARSE_ITERATIONS)
+    soup = per_call(lambda: tutor_api.Schedule.soup_parse(html), PARSE_ITERATIONS // 10)
+    print(f"parse (fast path):         {fast * 1000:8.3f} ms ({1 / fast:,.0f}/s)")
+    print(f"parse (BeautifulSoup):     {soup * 1000:8.3f} ms ({1 / soup:,.0f}/s)")
+
+
+def bench_planner(html):
+    schedule = tutor_api.Schedule(html)
+
+    def plan():
+        Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES).plan()
+
+    def replan():
+        planner = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES)
+        hours = planner.plan()
+        planner.request(hours)
+        planner.mark_lost(*hours[0])
+
+    print(
+        f"plan a week:               {per_call(plan, PARSE_ITERATIONS) * 1e6:8.1f} us"
+    )
+    print(
+        f"plan, then replan a miss:  {per_call(replan, PARSE_ITERATIONS) * 1e6:8.1f} us"
+    )
+
+
+def bench_grabbing(
+    latency, competition, reaction_time, rounds, oversubscribe, session_file
+):
+    latencies = []
+    planned = 0
+    requested = 0
+    won = 0
+    filled = 0
+    settled = []
+    for seed in range(rounds):
+        release_at = time.time() + 0.5
+        server = FakeTutorServer(
+            released={WEEK: RELEASED},
+            release_at=release_at,
+            competition=competition,
+            reaction_time=reaction_time,
+            latency=latency,
+            seed=seed,
+        )
+        with server:
+            point_at(server, session_file)
+            schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+            planner = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES)
+            hours = planner.plan()
+            planner.request(hours)
+            # the clock's already known, the same as it is for the fake server
+            clock = ClockEstimate(offset=0, uncertainty=0, rtt=0)
+            fire_at = pendulum.from_timestamp(release_at)
+            with contextlib.redirect_stdout(io.StringIO()):
+                if oversubscribe:
+                    outcome = auto_scheduler.oversubscribe(
+                        schedule, oversubscribe, fire_at, clock
+                    )
+                    results = outcome.results
+                    kept = len(outcome.kept)
+                else:
+                    results = auto_scheduler.grab_hours(
+                        schedule.week, hours, fire_at, clock, planner
+                    )
+                    kept = sum(result.success for result in results)
+            settled.append(time.time() - release_at)
+        planned += len(hours)
+        requested += len(results)
+        won += sum(result.success for result in results)
+        filled += kept
+        latencies.extend(result.latency for result in results)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"grab latency (median):     {statistics.median(latencies) * 1000:8.2f} ms")
+    print(f"grab latency (p95):        {p95 * 1000:8.2f} ms")
+    print(f"requests won:              {won / requested:8.1%} ({won}/{requested})")
+    print(f"hours filled:              {filled / planned:8.1%} ({filled}/{planned})")
+    print(f"done after (median):       {statistics.median(settled) * 1000:8.2f} ms")
+
+
+@click.command()
+@click.option("--latency", default=0.0, help="Seconds added to every response.")
+@click.option(
+    "--competition", default=0.3, help="Chance another tutor goes for each hour."
+)
+@click.option(
+    "--reaction-time",
+    default=0.05,
+    help="Other tutors grab hours within this many seconds of the release.",
+)
+@click.option("--rounds", default=5, help="How many releases to grab hours from.")
+@click.option(
+    "--oversubscribe",
+    default=0.0,
+    help=(
+        "Ask for this many more hours than needed (0.5 is half again as many) "
+        "and give back the extras, instead of replacing lost hours one by one."
+    ),
+)
+def main(latency, competition, reaction_time, rounds, oversubscribe):
+    with tempfile.TemporaryDirectory() as tmp:
+        session_file = f"{tmp}/session.json"
+        html = bench_login(latency, session_file)
+        bench_parsing(html)
+        bench_planner(html)
+        bench_grabbing(
+            latency, competition, reaction_time, rounds, oversubscribe, session_file
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Record everything tutor_api sends and gets back for one run, with the
+login details and cookie values taken out, so it can be replayed later
+without the live site (see libs/http_recording.py and tests/test_replay.py).
+
+Run from the repository root with:
+
+    python -m benchmarks.record_tutor_session sync.json --weeks 3
+    python -m benchmarks.record_tutor_session auto_schedule.json --auto-schedule
+
+The first logs in and fetches the current week and the ones after it, the
+same way schedule_to_calendar.py does. The second runs the auto scheduler,
+which REALLY signs up for hours, and waits for them to be released first.
+
+With --fake, it records against the fake server from tests/fake_tutor.py
+instead, with hours released a second after it starts and other tutors
+competing for them. That's how the recordings in tests/recordings were
+made.
+"""
+
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import click
+import pendulum
+from pendulum import DateTime
+
+import auto_scheduler
+from libs import tutor_api, tutor_http
+from libs.http_recording import RecordingAdapter
+from tests.fake_tutor import FakeTutorServer, week_start
+
+# What the fake server releases for next week, on days the default rules
+# allow, and what's already ours this week
+RELEASED = {(day, hour) for day in (0, 2, 4, 5, 6) for hour in range(11, 24)}
+THIS_WEEK = {(2, 14): "Scheduled!", (2, 15): "Scheduled!", (4, 18): "Scheduled!"}
+
+
+def record(out: str, weeks: int, auto_schedule: bool):
+    tutor_api.session = tutor_http.TutorSession(
+        adapter=RecordingAdapter, credentials=tutor_api.get_credentials()
+    )
+    adapter = tutor_api.session.adapter
+    recorded_at = DateTime.now()
+    try:
+        if auto_schedule:
+            auto_scheduler.main()
+        else:
+            this_week = recorded_at.start_of("week")
+            tutor_api.login_and_get_html_for_weeks(
+                [this_week.add(weeks=i) for i in range(weeks)]
+            )
+    finally:
+        adapter.save(out, recorded_at)
+    print(f"Recorded {len(adapter.exchanges)} requests to {out}")
+
+
+@click.command()
+@click.argument("out", type=click.Path(dir_okay=False))
+@click.option(
+    "--weeks",
+    default=3,
+    type=click.IntRange(min=1),
+    help="How many weeks to fetch, starting with the current week.",
+)
+@click.option(
+    "--auto-schedule",
+    is_flag=True,
+    help="Record the auto scheduler instead. This really signs up for hours!",
+)
+@click.option("--fake", is_flag=True, help="Record against the fake server.")
+@click.option("--latency", default=0.03, help="Seconds the fake server takes.")
+@click.option(
+    "--competition", default=0.5, help="Chance another tutor goes for each hour."
+)
+def main(out, weeks, auto_schedule, fake, latency, competition):
+    if not fake:
+        record(out, weeks, auto_schedule)
+        return
+
+    today = date.today()
+    release_at = time.time() + 1
+    server = FakeTutorServer(
+        schedule={week_start(today): dict(THIS_WEEK)},
+        released={week_start(today) + timedelta(days=7): RELEASED},
+        release_at=release_at,
+        competition=competition,
+        reaction_time=0.05,
+        latency=latency,
+        # long enough that it can't turn up in the pages by accident
+        username="fake.tutor@example.com",
+        seed=0,
+    )
+    with server, tempfile.TemporaryDirectory() as tmp:
+        tutor_api.BASE_URL = server.url
+        tutor_api.credentials = server.credentials
+        tutor_api.SESSION_FILE = os.path.join(tmp, "session.json")
+        auto_scheduler.release_time = lambda: pendulum.from_timestamp(release_at)
+        record(out, weeks, auto_schedule)
+
+
+if __name__ == "__main__":
+    main()
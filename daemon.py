@@ -0,0 +1,295 @@
+import auto_scheduler
+import schedule_to_calendar
+from libs import metrics, tutor_api, calendar_api
+from libs.calendar_mirror import CalendarMirror
+from libs.snapshot_store import SnapshotStore
+from pendulum import DateTime
+from threading import Event
+import click
+import signal
+import time
+import traceback
+
+# How long before the hours are released to start getting ready for them
+ARM_BEFORE = 120
+# Calendar syncs and watch polls that would start this many seconds before
+# arming wait until after the hours have been grabbed, so they can't hold
+# it up
+QUIET_PERIOD = 300
+# If the auto scheduler fails, try again this many seconds later, until
+# ARM_RETRY_FOR seconds after the release
+ARM_RETRY_DELAY = 30
+ARM_RETRY_FOR = 600
+
+
+def next_release(now: DateTime) -> DateTime:
+    """The next time hours get released, at or after `now`."""
+    release = DateTime(
+        now.year, now.month, now.day, auto_scheduler.RELEASE_HOUR, tzinfo=now.tzinfo
+    )
+    if release <= now:
+        release = release.add(days=1)
+    return release
+
+
+class Daemon:
+    """
+    Keeps one process running, so the imports, the tutor.com session (and
+    its open connections), the Calendar service and the snapshot and mirror
+    databases are all ready to go, instead of starting from scratch on
+    every run.
+
+    It syncs the calendar every `sync_every` seconds, and `arm_before`
+    seconds before each day's release it starts the auto scheduler, which
+    plans, builds its requests, warms up connections and checks the
+    server's clock, then waits for the release. Either one can be turned
+    off by passing None. With a `watcher`, it also polls for hours other
+    tutors drop in between, as often as the watcher's interval says.
+    """
+
+    def __init__(
+        self,
+        sync_every: float | None = None,
+        weeks=2,
+        arm_before: float | None = ARM_BEFORE,
+        metrics_out: str | None = None,
+        watcher: auto_scheduler.Watcher | None = None,
+    ):
+        if sync_every is None and arm_before is None and watcher is None:
+            raise Exception("The daemon needs something to do.")
+        self.sync_every = sync_every
+        self.weeks = weeks
+        self.arm_before = arm_before
+        self.metrics_out = metrics_out
+        self.watcher = watcher
+        self.stop = Event()
+        self.store: SnapshotStore | None = None
+        self.mirror: CalendarMirror | None = None
+
+        now = time.time()
+        self.next_sync = now if sync_every is not None else None
+        self.next_watch = now if watcher is not None else None
+        # the release the auto scheduler is armed for next
+        self.release = next_release(DateTime.now())
+        self.next_arm = self.arm_time(DateTime.now())
+
+    def arm_time(self, now: DateTime) -> float | None:
+        """When to arm the auto scheduler for the next release after `now`."""
+        if self.arm_before is None:
+            return None
+        return next_release(now).timestamp() - self.arm_before
+
+    def next_job(self) -> tuple[str, float]:
+        """The next thing to do ("sync", "watch" or "arm"), and when to do it."""
+        jobs = [
+            (at, job)
+            for job, at in [("sync", self.next_sync), ("watch", self.next_watch)]
+            if at is not None
+        ]
+        if self.next_arm is not None and (
+            not jobs or self.next_arm <= min(jobs)[0] + QUIET_PERIOD
+        ):
+            return "arm", self.next_arm
+        at, job = min(jobs)
+        return job, at
+
+    def run(self):
+        if self.sync_every is not None:
+            self.store = SnapshotStore()
+            self.mirror = CalendarMirror()
+        try:
+            self.warm_up()
+            while not self.stop.is_set():
+                job, at = self.next_job()
+                if self.stop.wait(max(0.0, at - time.time())):
+                    break
+                if job == "arm":
+                    self.arm()
+                elif job == "watch":
+                    self.watch()
+                else:
+                    self.sync()
+        finally:
+            if self.store is not None:
+                self.store.close()
+            if self.mirror is not None:
+                self.mirror.close()
+
+    def warm_up(self):
+        """Log in to everything up front, so the first job doesn't have to."""
+        try:
+            tutor_api.login_and_get_html()
+            if self.watcher is not None:
+                # so the first real poll can already spot changes
+                self.watcher.poll()
+            if self.sync_every is not None:
+                calendar_api.get_service()
+        except Exception:
+            # the jobs will try again, and say what went wrong then
+            traceback.print_exc()
+
+    def sync(self):
+        this_week = DateTime.now().start_of("week")
+        try:
+            schedule_to_calendar.add_weeks_to_calendar(
+                [this_week.add(weeks=i) for i in range(self.weeks)],
+                store=self.store,
+                mirror=self.mirror,
+            )
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.next_sync = time.time() + self.sync_every
+            self.write_metrics()
+
+    def watch(self):
+        try:
+            self.watcher.poll()
+        except Exception:
+            traceback.print_exc()
+            # whatever went wrong, don't keep hitting it at full speed
+            self.watcher.interval.unchanged()
+        finally:
+            self.next_watch = time.time() + self.watcher.interval.current
+            self.write_metrics()
+
+    def arm(self):
+        print(f"Arming the auto scheduler at {DateTime.now().to_time_string()}")
+        failed = True
+        try:
+            auto_scheduler.auto_schedule()
+            failed = False
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.next_arm = self.rearm_time(failed)
+            self.write_metrics()
+
+    def rearm_time(self, failed: bool) -> float:
+        """
+        When to arm the auto scheduler again, after it ran for self.release.
+
+        It can finish before the release, if it failed fast or the server's
+        clock is ahead of ours, so this goes by the release it was armed for
+        rather than the time now. Otherwise it'd be armed for the same
+        release again straight away. A failed run is tried again every
+        ARM_RETRY_DELAY seconds, until ARM_RETRY_FOR seconds after the
+        release.
+        """
+        now = DateTime.now()
+        retry_at = now.timestamp() + ARM_RETRY_DELAY
+        if failed and retry_at < self.release.timestamp() + ARM_RETRY_FOR:
+            return retry_at
+        self.release = next_release(max(self.release.add(seconds=1), now))
+        return self.release.timestamp() - self.arm_before
+
+    def write_metrics(self):
+        if self.metrics_out:
+            metrics.registry.write(self.metrics_out)
+
+
+@click.command(
+    help=(
+        "Keep running, syncing the calendar every so often and signing up "
+        "for hours each day as soon as they're released."
+    )
+)
+@click.option(
+    "--sync-every",
+    default=30,
+    type=click.IntRange(min=0),
+    help="Minutes between calendar syncs. 0 turns syncing off.",
+)
+@click.option(
+    "--weeks",
+    default=2,
+    type=click.IntRange(min=1),
+    help="How many weeks to sync, starting with the current week.",
+)
+@click.option(
+    "--arm-before",
+    default=ARM_BEFORE,
+    type=click.IntRange(min=0),
+    help="Seconds before the hours are released to get ready to grab them.",
+)
+@click.option(
+    "--no-auto-schedule",
+    is_flag=True,
+    help="Only sync the calendar, don't sign up for hours.",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Keep checking for hours other tutors drop, and grab them right away.",
+)
+@click.option(
+    "--watch-fastest",
+    default=auto_scheduler.WATCH_FASTEST,
+    type=click.FloatRange(min=0.5),
+    help=(
+        "Seconds between checks right after something changed. Lower catches "
+        "dropped hours sooner."
+    ),
+)
+@click.option(
+    "--watch-slowest",
+    default=auto_scheduler.WATCH_SLOWEST,
+    type=click.FloatRange(min=0.5),
+    help="Seconds between checks once nothing has changed for a while.",
+)
+@click.option(
+    "--watch-budget",
+    default=auto_scheduler.WATCH_REQUESTS_PER_HOUR,
+    type=click.IntRange(min=1),
+    help="The most schedule pages to fetch per hour while watching.",
+)
+@click.option(
+    "--metrics-out",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help=(
+        "Write the metrics so far to this file after each sync and grab: in "
+        "Prometheus' text format if it ends in .prom, otherwise as JSON."
+    ),
+)
+def daemon_command(
+    sync_every: int,
+    weeks: int,
+    arm_before: int,
+    no_auto_schedule: bool,
+    watch: bool,
+    watch_fastest: float,
+    watch_slowest: float,
+    watch_budget: int,
+    metrics_out: str | None,
+):
+    if not sync_every and no_auto_schedule and not watch:
+        raise click.UsageError("Syncing, auto scheduling and watching are all off.")
+    watcher = None
+    if watch:
+        watcher = auto_scheduler.Watcher(
+            interval=auto_scheduler.PollInterval(
+                fastest=watch_fastest,
+                slowest=max(watch_slowest, watch_fastest),
+                requests_per_hour=watch_budget,
+                requests_per_poll=auto_scheduler.WATCH_WEEKS,
+            )
+        )
+    daemon = Daemon(
+        sync_every=sync_every * 60 if sync_every else None,
+        weeks=weeks,
+        arm_before=None if no_auto_schedule else arm_before,
+        metrics_out=metrics_out,
+        watcher=watcher,
+    )
+    # docker stop sends SIGTERM, so finish up cleanly on it
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop.set())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    print("Stopped.")
+
+
+if __name__ == "__main__":
+    daemon_command()
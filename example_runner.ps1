@@ -4,9 +4,6 @@ cd "C:\Users\Your Username\path\to\this\repository"
 # Activate Virtual Envrionrment
 # Assumes you already created this -- see https://docs.python.org/3/library/venv.html
 .\venv\Scripts\Activate.ps1
-# Run calendar sync for this week...
-echo "Running schedular for this week"
-python .\schedule_to_calendar.py
-# and next.
-echo "Running schedular for next week"
-python .\schedule_to_calendar.py --next
+# Run calendar sync for this week and next.
+echo "Running schedular for this week and next"
+python .\schedule_to_calendar.py --weeks 2
@@ -0,0 +1,132 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+# The repository, so worker processes can import libs (and everything
+# else) no matter which account's directory they're working in.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CREDENTIALS_FILE = os.path.join("secrets", "login_credentials.json")
+# How many accounts to work on at the same time
+MAX_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class Account:
+    """
+    One tutor, and the directory holding everything of theirs: the
+    secrets folder (login credentials, Google token, saved session) and the
+    snapshot and mirror databases that go in it.
+    """
+
+    name: str
+    path: str
+
+
+@dataclass
+class AccountResult:
+    account: Account
+    ok: bool
+    output: str
+    seconds: float
+    result: object = None
+    error: str | None = None
+
+
+def load_accounts(path: str) -> list[Account]:
+    """
+    Find the accounts to work on. `path` is either a directory, where every
+    subdirectory with a secrets/login_credentials.json in it is an account
+    named after it, or a JSON manifest like
+
+        {"accounts": [{"name": "alice", "path": "tutors/alice"}, ...]}
+
+    where relative paths are relative to the manifest.
+    """
+    if os.path.isdir(path):
+        return [
+            Account(entry.name, os.path.abspath(entry.path))
+            for entry in sorted(os.scandir(path), key=lambda entry: entry.name)
+            if entry.is_dir()
+            and os.path.exists(os.path.join(entry.path, CREDENTIALS_FILE))
+        ]
+
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    root = os.path.dirname(os.path.abspath(path))
+    accounts = []
+    for entry in manifest["accounts"]:
+        account_path = os.path.join(root, entry["path"])
+        accounts.append(
+            Account(entry.get("name") or os.path.basename(account_path), account_path)
+        )
+    names = [account.name for account in accounts]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise Exception(f"Account names must be unique: {', '.join(duplicates)}")
+    return accounts
+
+
+def run_account(account: Account, task: Callable, kwargs: dict) -> AccountResult:
+    """
+    Run task(**kwargs) for one account, from inside the account's directory.
+    Everything it prints is collected for the result rather than mixed in
+    with the other accounts' output.
+    """
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        try:
+            os.chdir(account.path)
+            result = task(**kwargs)
+        except Exception:
+            return AccountResult(
+                account,
+                False,
+                output.getvalue(),
+                time.perf_counter() - start,
+                error=traceback.format_exc(),
+            )
+    return AccountResult(
+        account, True, output.getvalue(), time.perf_counter() - start, result
+    )
+
+
+def _init_worker():
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+def run_accounts(
+    accounts: list[Account], task: Callable, max_workers=MAX_WORKERS, **kwargs
+) -> Iterator[AccountResult]:
+    """
+    Run task(**kwargs) for every account, up to `max_workers` at a time, and
+    yield the results as each one finishes.
+
+    Each account gets a brand new process: the libs keep their credentials,
+    tutor.com session and Calendar service in module globals, read relative
+    to the working directory, so a fresh interpreter started in the
+    account's directory is what keeps the accounts apart. That also means
+    `task` has to be a module-level function.
+    """
+    if not accounts:
+        return
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(accounts)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = [
+            pool.submit(run_account, account, task, kwargs) for account in accounts
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -1,44 +1,65 @@
 import os.path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
+import random
+import time
 
 import pendulum
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from libs import metrics
+from libs.events import SimpleEvent
+
+# The rest of the Google client (discovery, auth, httplib2) is slow to
+# import, so it's only imported once it's needed. Plenty of runs never
+# touch the calendar at all.
+if TYPE_CHECKING:
+    from googleapiclient.http import BatchHttpRequest, HttpRequest
+
 # If modifying these scopes, delete the file token.json.
 SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
 
-# singleton for credentials
+# The Calendar API rejects batches with more than 50 requests in them
+BATCH_LIMIT = 50
+# How many batches can be in flight at the same time
+MAX_CONCURRENT_BATCHES = 4
+# How many times a rate-limited request gets retried before giving up
+MAX_RETRIES = 5
+# Seconds to wait on a batch before giving up on it, the same as the Google
+# client gives every other request
+TIMEOUT = 60
+# Reasons Google gives in 403 responses when it's actually rate limiting us
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Where to send Calendar API requests, like "http://127.0.0.1:8080/". None
+# means Google's servers. This is for pointing at a local stand-in, like
+# the one in tests/fake_calendar.py.
+API_ROOT = None
+
+# singletons for credentials and the Calendar service built from them
 creds = None
+service = None
 
 # set up week start and end (it defaults to starting on Monday)
 pendulum.week_starts_at(pendulum.SUNDAY)
 pendulum.week_ends_at(pendulum.SATURDAY)
 
-with open("secrets/login_credentials.json", "r") as f:
-    credentials = json.load(f)
+# The calendar to sync with (and the rest of the login credentials), read
+# from CREDENTIALS_FILE by get_credentials() the first time it's needed
+CREDENTIALS_FILE = "secrets/login_credentials.json"
+credentials = None
 
 
-class SimpleEvent:
-    def __init__(
-        self,
-        summary: str,
-        start: pendulum.DateTime,
-        end: pendulum.DateTime,
-        timezone="America/New_York",
-    ):
-        self.summary = summary
-        self.start = start
-        self.end = end
-        self.timezone = timezone
+def get_credentials() -> dict:
+    global credentials
 
-    def __str__(self):
-        return f"{self.summary}\n\tstart: {self.start}\n\tend: {self.end}"
+    if credentials is None:
+        with open(CREDENTIALS_FILE, "r") as f:
+            credentials = json.load(f)
+    return credentials
 
 
 def connect_oath():
@@ -47,6 +68,10 @@ def connect_oath():
     which (to the best of my knowledge) should last forever (or until access is revoked
     in the security settings of my account).
     """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     _creds = None
     # The file token.json stores the user's access and refresh tokens,
     # and is created automatically when the authorization flow completes
@@ -72,78 +97,424 @@ def connect_oath():
 def get_creds():
     global creds
 
-    if creds:
-        return creds
+    if creds is None:
+        creds = connect_oath()
+    elif creds.expired and creds.refresh_token:
+        # Only refresh when we actually need to. The service's http object
+        # holds onto this same object, so it sees the new token too.
+        from google.auth.transport.requests import Request
 
-    creds = connect_oath()
+        creds.refresh(Request())
     return creds
 
 
-def batch_callback(id_, _response, exception):
-    if exception:
-        print(f"Error with batch request, id={id_}")
-        raise Exception(str(exception))
-
-    # if response:
-    #     print(response)
-
-
-def add_events(events: Iterable[SimpleEvent]):
-    service = build("calendar", "v3", credentials=get_creds())
-    batch = service.new_batch_http_request(callback=batch_callback)
-    # TODO: only batch 50 at a time, which is the limit. I don't thing
-    #       that the library automatically splits them up.
-    for event in events:
-        batch.add(
-            service.events().insert(
-                calendarId=credentials["calendar_id"],
-                body={
-                    "summary": event.summary,
-                    "start": {
-                        "dateTime": event.start.isoformat(),
-                        "timeZone": event.timezone,
-                    },
-                    "end": {
-                        "dateTime": event.end.isoformat(),
-                        "timeZone": event.timezone,
-                    },
-                },
-            )
+def get_service():
+    """
+    Get the process-wide Calendar service, building it on first use.
+
+    Building the service means loading and parsing the (rather large)
+    discovery document, so it's only done once. The discovery document
+    itself comes from the copy bundled with googleapiclient, so building
+    never needs the network either.
+    """
+    global service
+
+    if service is None:
+        from googleapiclient.discovery import build
+
+        client_options = None
+        if API_ROOT is not None:
+            client_options = {"api_endpoint": f"{API_ROOT}calendar/v3/"}
+        service = build(
+            "calendar",
+            "v3",
+            credentials=get_creds(),
+            static_discovery=True,
+            cache_discovery=False,
+            client_options=client_options,
         )
-    batch.execute()
-
-
-def delete_all_events(events: list[dict]):
-    service = build("calendar", "v3", credentials=get_creds())
-    batch = service.new_batch_http_request(callback=batch_callback)
-    # TODO: only batch 50 at a time, which is the limit. I don't thing
-    #       that the library automatically splits them up.
-    for event in events:
-        batch.add(
-            service.events().delete(
-                calendarId=credentials["calendar_id"], eventId=event["id"]
-            )
+    return service
+
+
+def new_batch(service, callback) -> "BatchHttpRequest":
+    """
+    Start a batch request. The discovery document hardcodes Google's batch
+    URL, so it has to be swapped out by hand when API_ROOT is set.
+    """
+    from googleapiclient.http import BatchHttpRequest
+
+    if API_ROOT is None:
+        return service.new_batch_http_request(callback=callback)
+    return BatchHttpRequest(callback=callback, batch_uri=f"{API_ROOT}batch/calendar/v3")
+
+
+def _is_rate_limited(exception: Exception) -> bool:
+    """
+    Whether a failed request is worth retrying. 429s always are, but 403s
+    are only retried when they're a rate limit, not an actual permissions
+    problem. Transport errors (no HttpError at all) are retried too.
+    """
+    if not isinstance(exception, HttpError):
+        return True
+    if exception.status_code == 429:
+        return True
+    if exception.status_code == 403:
+        details = exception.error_details
+        if isinstance(details, list):
+            return any(d.get("reason") in RATE_LIMIT_REASONS for d in details)
+        return "rate limit" in str(exception).lower()
+    return False
+
+
+def _execute_chunk(service, requests: dict[str, "HttpRequest"]) -> dict[str, Exception]:
+    """
+    Send one batch, and return the exception for every sub-request that
+    failed. Each chunk gets its own http object, since httplib2 isn't safe
+    to share between threads.
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    errors: dict[str, Exception] = {}
+
+    def callback(id_, _response, exception):
+        if exception:
+            errors[id_] = exception
+
+    batch = new_batch(service, callback)
+    for id_, request in requests.items():
+        batch.add(request, request_id=id_)
+    try:
+        batch.execute(
+            http=AuthorizedHttp(get_creds(), http=httplib2.Http(timeout=TIMEOUT))
         )
-    batch.execute()
+    except (HttpError, httplib2.HttpLib2Error, OSError) as error:
+        # the whole batch went missing (or was turned away, say because of
+        # rate limiting), so every request in it failed
+        return {id_: error for id_ in requests}
+    return errors
+
+
+def execute_batched(
+    service, requests: Iterable["HttpRequest"], ignore_statuses=(), action="other"
+) -> dict[str, Exception]:
+    """
+    Send any number of requests using batches of at most BATCH_LIMIT, with
+    up to MAX_CONCURRENT_BATCHES of them in flight at once. Sub-requests
+    that get rate limited are retried (and only those) with exponential
+    backoff, and any other errors are collected rather than raised, so one
+    bad request doesn't sink the rest of the run.
+
+    Errors with a status code in `ignore_statuses` count as successes. For
+    example, a 410 on a delete just means the event was already gone.
+    `action` (like "insert") is what the batches get labelled as in the
+    metrics.
+
+    Returns a dict of request index (as a string) to the exception for every
+    request that ultimately failed.
+    """
+    pending = {str(i): request for i, request in enumerate(requests)}
+    failures: dict[str, Exception] = {}
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            # exponential backoff with some jitter, as Google recommends
+            time.sleep(min(2**attempt, 32) + random.random())
+
+        ids = list(pending)
+        chunks = [
+            {id_: pending[id_] for id_ in ids[i : i + BATCH_LIMIT]}
+            for i in range(0, len(ids), BATCH_LIMIT)
+        ]
+
+        def execute(chunk):
+            with metrics.span("calendar_batch", action=action):
+                metrics.count("calendar_requests", len(chunk), action=action)
+                return _execute_chunk(service, chunk)
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BATCHES) as pool:
+            results = list(pool.map(execute, chunks))
+
+        retry = {}
+        for errors in results:
+            for id_, error in errors.items():
+                if getattr(error, "status_code", None) in ignore_statuses:
+                    continue
+                if _is_rate_limited(error) and attempt < MAX_RETRIES:
+                    retry[id_] = pending[id_]
+                else:
+                    failures[id_] = error
+        metrics.count("calendar_retries", len(retry), action=action)
+        pending = retry
+
+    metrics.count("calendar_failures", len(failures), action=action)
+    return failures
+
+
+def _report_failures(action: str, failures: dict[str, Exception]):
+    for id_, error in failures.items():
+        print(f"Error with batch request while {action}, id={id_}: {error}")
+
+
+def event_body(event: SimpleEvent) -> dict:
+    """
+    Translate a SimpleEvent into the body the Calendar API expects for
+    inserts and patches.
+    """
+    return {
+        "summary": event.summary,
+        "start": {
+            "dateTime": event.start.isoformat(),
+            "timeZone": event.timezone,
+        },
+        "end": {
+            "dateTime": event.end.isoformat(),
+            "timeZone": event.timezone,
+        },
+    }
+
+
+def localize(time: pendulum.DateTime, timezone: str) -> pendulum.DateTime:
+    """
+    SimpleEvents can have naive times (Schedule makes them), which mean the
+    wall-clock time in the event's timezone, the same as Google reads them.
+    """
+    if time.tzinfo is not None:
+        return time
+    return pendulum.datetime(
+        time.year, time.month, time.day, time.hour, time.minute, tz=timezone
+    )
+
+
+def event_id(event: SimpleEvent, calendar_id: str | None = None) -> str:
+    """
+    The Calendar event ID for an event, which is always the same for the
+    same calendar, start and end. That way writing an event twice can't
+    make a duplicate, and an event can be found again without looking it
+    up. Google wants IDs in base32hex (0-9 and a-v), and hex is a subset of
+    that.
+    """
+    calendar_id = calendar_id or get_credentials()["calendar_id"]
+    start = _time_key(localize(event.start, event.timezone))
+    end = _time_key(localize(event.end, event.timezone))
+    return hashlib.sha1(f"{calendar_id}|{start}|{end}".encode()).hexdigest()
+
+
+def add_events(events: Iterable[SimpleEvent]) -> dict[str, Exception]:
+    """
+    Insert the events under their event_id(). Inserting is idempotent: if
+    an event with that ID is already there (even one that was deleted, as
+    Google holds on to those), it gets patched back to how it should be.
+    """
+    events = list(events)
+    service = get_service()
+    requests = [
+        service.events().insert(
+            calendarId=get_credentials()["calendar_id"],
+            body={**event_body(event), "id": event_id(event)},
+        )
+        for event in events
+    ]
+    failures = execute_batched(service, requests, action="insert")
+
+    conflicts = [
+        id_
+        for id_, error in failures.items()
+        if getattr(error, "status_code", None) == 409
+    ]
+    if conflicts:
+        patch_failures = _patch(
+            ({"id": event_id(events[int(id_)])}, events[int(id_)]) for id_ in conflicts
+        )
+        for id_ in conflicts:
+            del failures[id_]
+        for i, error in patch_failures.items():
+            failures[conflicts[int(i)]] = error
+
+    _report_failures("adding events", failures)
+    return failures
+
+
+def patch_events(patches: Iterable[tuple[dict, SimpleEvent]]) -> dict[str, Exception]:
+    """
+    Patch existing calendar events so they match their SimpleEvent. Takes
+    (existing event, desired event) pairs, like the ones from diff_events().
+    """
+    failures = _patch(patches)
+    _report_failures("patching events", failures)
+    return failures
+
+
+def _patch(patches: Iterable[tuple[dict, SimpleEvent]]) -> dict[str, Exception]:
+    service = get_service()
+    requests = [
+        service.events().patch(
+            calendarId=get_credentials()["calendar_id"],
+            eventId=existing["id"],
+            # setting the status brings back the event if it was deleted
+            body={**event_body(event), "status": "confirmed"},
+        )
+        for existing, event in patches
+    ]
+    return execute_batched(service, requests, action="patch")
+
+
+def delete_all_events(events: list[dict]) -> dict[str, Exception]:
+    service = get_service()
+    requests = [
+        service.events().delete(
+            calendarId=get_credentials()["calendar_id"], eventId=event["id"]
+        )
+        for event in events
+    ]
+    # 404 and 410 mean the event's already gone, which is what we wanted
+    failures = execute_batched(
+        service, requests, ignore_statuses=(404, 410), action="delete"
+    )
+    _report_failures("deleting events", failures)
+    return failures
+
+
+def parse_event_time(time: dict) -> pendulum.DateTime:
+    """
+    Parse the Calendar API's {"dateTime": ...} (or all-day "date") dict. A
+    time without an offset is in the dict's "timeZone", the way Google reads
+    it, so it doesn't matter how the server chose to write it.
+    """
+    parsed = pendulum.parse(time.get("dateTime") or time["date"], tz=None)
+    return localize(parsed, time.get("timeZone") or "UTC")
+
+
+def event_start(event: dict) -> pendulum.DateTime:
+    return parse_event_time(event["start"])
+
+
+def _time_key(time: dict | pendulum.DateTime) -> str:
+    """
+    Normalize either a DateTime or the Calendar API's {"dateTime": ...}
+    dict into a UTC timestamp, so events in different timezones (or with
+    different offset formatting) still compare equal.
+    """
+    if isinstance(time, dict):
+        time = parse_event_time(time)
+    return time.in_timezone("UTC").isoformat()
+
+
+def diff_events(
+    desired: Iterable[SimpleEvent], existing: Iterable[dict]
+) -> tuple[list[SimpleEvent], list[dict], list[tuple[dict, SimpleEvent]]]:
+    """
+    Compare the events we want in the calendar against the ones already
+    there, and figure out the smallest set of changes needed.
+
+    Events are matched on their start and end times. Returns a tuple of
+    (events to insert, existing events to delete, (existing, desired) pairs
+    to patch). Patches are only needed when the times match but something
+    else, like the summary, doesn't. Duplicates in the calendar get deleted,
+    and so do events that don't have their event_id() (say, because an
+    older version of this added them), so they can be added back under it.
+    """
+    wanted: dict[tuple[str, str], SimpleEvent] = {}
+    for event in desired:
+        start = localize(event.start, event.timezone)
+        end = localize(event.end, event.timezone)
+        wanted[(_time_key(start), _time_key(end))] = event
+
+    to_delete: list[dict] = []
+    to_patch: list[tuple[dict, SimpleEvent]] = []
+    matched: set[tuple[str, str]] = set()
+    for existing_event in existing:
+        key = (_time_key(existing_event["start"]), _time_key(existing_event["end"]))
+        event = wanted.get(key)
+        if event is None or key in matched or existing_event["id"] != event_id(event):
+            to_delete.append(existing_event)
+            continue
+        matched.add(key)
+        if existing_event.get("summary") != event.summary:
+            to_patch.append((existing_event, event))
+
+    to_insert = [event for key, event in wanted.items() if key not in matched]
+    return to_insert, to_delete, to_patch
+
+
+def sync_events(desired: Iterable[SimpleEvent], existing: Iterable[dict]) -> dict:
+    """
+    Make the calendar match `desired`, only issuing the writes that are
+    actually needed. If nothing changed, no write calls are made at all.
+    Returns a count of each type of change for reporting.
+    """
+    return _apply_changes(*diff_events(desired, existing))
+
+
+def sync_events_by_id(
+    desired: Iterable[SimpleEvent], previous: Iterable[SimpleEvent]
+) -> dict:
+    """
+    Like sync_events(), but without reading the calendar at all. Instead,
+    `previous` is what we last put in the calendar, and since every event
+    has its event_id(), the stale ones can be deleted by ID.
+    """
+    wanted = {event_id(event): event for event in desired}
+    before = {event_id(event): event for event in previous}
+    to_insert = [event for id_, event in wanted.items() if id_ not in before]
+    to_delete = [{"id": id_} for id_ in before if id_ not in wanted]
+    to_patch = [
+        ({"id": id_}, event)
+        for id_, event in wanted.items()
+        if id_ in before and before[id_].summary != event.summary
+    ]
+    return _apply_changes(to_insert, to_delete, to_patch)
+
+
+def _apply_changes(
+    to_insert: list[SimpleEvent],
+    to_delete: list[dict],
+    to_patch: list[tuple[dict, SimpleEvent]],
+) -> dict:
+    """
+    Send the changes, and return a count of each type (and of the ones that
+    failed) for reporting.
+    """
+    failed = 0
+    if to_delete:
+        failed += len(delete_all_events(to_delete))
+    if to_patch:
+        failed += len(patch_events(to_patch))
+    if to_insert:
+        failed += len(add_events(to_insert))
+
+    return {
+        "inserted": len(to_insert),
+        "deleted": len(to_delete),
+        "patched": len(to_patch),
+        "failed": failed,
+    }
 
 
 def get_events_for_week(date: pendulum.DateTime) -> list:
+    return get_events_between(date.start_of("week"), date.end_of("week"))
+
+
+def get_events_between(start: pendulum.DateTime, end: pendulum.DateTime) -> list:
     events = []
 
     try:
-        service = build("calendar", "v3", credentials=get_creds())
+        service = get_service()
         # Call the Calendar API
         request = service.events().list(
-            calendarId=credentials["calendar_id"],
-            timeMin=date.start_of("week"),
-            timeMax=date.end_of("week"),
+            calendarId=get_credentials()["calendar_id"],
+            timeMin=start,
+            timeMax=end,
             singleEvents=True,
             orderBy="startTime",
         )
 
         # pagination
         while request is not None:
-            result = request.execute()
+            with metrics.span("calendar_list"):
+                result = request.execute()
             events.extend(result.get("items", []))
             request = service.events().list_next(request, result)
 
@@ -153,6 +524,33 @@ def get_events_for_week(date: pendulum.DateTime) -> list:
     return events
 
 
+def get_event_changes(sync_token: str | None = None) -> tuple[list, str]:
+    """
+    Read the events in the calendar that changed since `sync_token` was
+    handed out, including deleted ones (which have a "cancelled" status).
+    Without a token, that's every event in the calendar. Returns the events
+    and the token to pass in next time.
+
+    Raises an HttpError with a 410 status if the token is too old to use,
+    in which case there's nothing for it but to start over without one.
+    """
+    service = get_service()
+    request = service.events().list(
+        calendarId=get_credentials()["calendar_id"],
+        singleEvents=True,
+        syncToken=sync_token,
+    )
+    events = []
+    while True:
+        with metrics.span("calendar_list", incremental=sync_token is not None):
+            result = request.execute()
+        events.extend(result.get("items", []))
+        next_request = service.events().list_next(request, result)
+        if next_request is None:
+            return events, result["nextSyncToken"]
+        request = next_request
+
+
 if __name__ == "__main__":
     pass
     # print("Logging in and writing token.json")
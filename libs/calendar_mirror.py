@@ -0,0 +1,119 @@
+import json
+import sqlite3
+
+import pendulum
+from googleapiclient.errors import HttpError
+
+from libs import calendar_api
+
+DEFAULT_PATH = "secrets/calendar_mirror.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_tokens (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    start_utc TEXT NOT NULL,
+    end_utc TEXT NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_by_start ON events (calendar_id, start_utc);
+"""
+
+
+def utc_key(time: dict) -> str:
+    """
+    An event's start or end as a UTC timestamp, all formatted the same way,
+    so they sort and compare correctly as text.
+    """
+    return calendar_api.parse_event_time(time).in_timezone("UTC").isoformat()
+
+
+class CalendarMirror:
+    """
+    A local copy of the events in the calendar, kept up to date with the
+    Calendar API's sync tokens: after the first full read, refresh() only
+    fetches the events that changed since the last one. Reading a week (or
+    many) then doesn't cost any requests at all.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, calendar_id: str | None = None):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.calendar_id = calendar_id or calendar_api.get_credentials()["calendar_id"]
+
+    def close(self):
+        self.db.close()
+
+    def sync_token(self) -> str | None:
+        row = self.db.execute(
+            "SELECT sync_token FROM sync_tokens WHERE calendar_id = ?",
+            (self.calendar_id,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, full=False) -> int:
+        """
+        Bring the mirror up to date, and return how many changed events were
+        read. If the sync token has expired (or `full` is set), the whole
+        calendar is read again from scratch.
+        """
+        token = None if full else self.sync_token()
+        try:
+            events, next_token = calendar_api.get_event_changes(token)
+        except HttpError as error:
+            if token is None or error.status_code != 410:
+                raise
+            print("Calendar sync token expired, reading the whole calendar.")
+            token = None
+            events, next_token = calendar_api.get_event_changes()
+
+        with self.db:
+            if token is None:
+                self.db.execute(
+                    "DELETE FROM events WHERE calendar_id = ?", (self.calendar_id,)
+                )
+            for event in events:
+                if event.get("status") == "cancelled":
+                    self.db.execute(
+                        "DELETE FROM events WHERE calendar_id = ? AND id = ?",
+                        (self.calendar_id, event["id"]),
+                    )
+                    continue
+                self.db.execute(
+                    "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.calendar_id,
+                        event["id"],
+                        utc_key(event["start"]),
+                        utc_key(event["end"]),
+                        json.dumps(event),
+                    ),
+                )
+            self.db.execute(
+                "INSERT OR REPLACE INTO sync_tokens VALUES (?, ?, ?)",
+                (self.calendar_id, next_token, pendulum.now().isoformat()),
+            )
+        return len(events)
+
+    def events_between(self, start: pendulum.DateTime, end: pendulum.DateTime) -> list:
+        """
+        The mirrored events that overlap start to end, in order, just like
+        calendar_api.get_events_between() would return.
+        """
+        rows = self.db.execute(
+            "SELECT event FROM events "
+            "WHERE calendar_id = ? AND start_utc < ? AND end_utc > ? "
+            "ORDER BY start_utc",
+            (
+                self.calendar_id,
+                end.in_timezone("UTC").isoformat(),
+                start.in_timezone("UTC").isoformat(),
+            ),
+        )
+        return [json.loads(event) for (event,) in rows]
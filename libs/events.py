@@ -0,0 +1,18 @@
+import pendulum
+
+
+class SimpleEvent:
+    def __init__(
+        self,
+        summary: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        timezone="America/New_York",
+    ):
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.timezone = timezone
+
+    def __str__(self):
+        return f"{self.summary}\n\tstart: {self.start}\n\tend: {self.end}"
@@ -0,0 +1,219 @@
+import http.client
+import json
+import threading
+import time
+from collections import deque
+from email.utils import formatdate
+from io import BytesIO
+from urllib.parse import quote, quote_plus, urlsplit
+
+import pendulum
+from pendulum import DateTime
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+# The parts of the login that get replaced in recordings, wherever they show
+# up: URLs, request bodies, response headers and pages
+SECRET_FIELDS = ("username", "password", "program_id", "user_id")
+# Cookies are as good as a password while they last, so their values go too
+REDACTED_COOKIE = "redacted"
+# Headers that describe how the body was sent over the wire. The recording
+# keeps the body already decoded, so these would only confuse the replay.
+TRANSPORT_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def placeholder(field: str) -> str:
+    """What a secret gets replaced with. Safe to put in a URL as is."""
+    return f"REDACTED_{field}"
+
+
+def placeholder_credentials() -> dict:
+    """Credentials that log in to a replayed recording."""
+    return {field: placeholder(field) for field in SECRET_FIELDS}
+
+
+def path_and_query(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}"
+
+
+def request_key(method: str, url: str) -> str:
+    """
+    How a request is matched to a recorded one: the method, path and query,
+    but not the host, so a recording made against one server can be
+    replayed as another.
+    """
+    return f"{method} {path_and_query(url)}"
+
+
+class Redactor:
+    """Replaces the login's secrets with placeholders."""
+
+    def __init__(self, credentials: dict):
+        self.replacements = []
+        for field in SECRET_FIELDS:
+            value = credentials.get(field)
+            if not value:
+                continue
+            # as is, and however it'd look in a URL or form body
+            for form in {value, quote(value, safe=""), quote_plus(value)}:
+                self.replacements.append((form, placeholder(field)))
+        # longest first, so a secret containing another gets replaced whole
+        self.replacements.sort(key=lambda pair: len(pair[0]), reverse=True)
+
+    def text(self, text: str) -> str:
+        for secret, replacement in self.replacements:
+            text = text.replace(secret, replacement)
+        return text
+
+    def header(self, name: str, value: str) -> str:
+        if name.lower() == "set-cookie":
+            cookie, _, attributes = value.partition(";")
+            name, _, _ = cookie.partition("=")
+            value = f"{name}={REDACTED_COOKIE}" + (
+                ";" + attributes if attributes else ""
+            )
+        return self.text(value)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    A drop-in transport for TutorSession that sends everything as usual,
+    but also keeps every exchange, with the login's secrets and cookie
+    values taken out, so they can be saved with save() and replayed later
+    by ReplayAdapter.
+
+    The request headers (cookies and all) aren't kept, and neither is the
+    response's raw encoding: bodies are saved the way requests hands them
+    back, already decompressed.
+    """
+
+    def __init__(self, credentials: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.redactor = Redactor(credentials)
+        self.exchanges: list[dict] = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        # read the body now, so the time includes it
+        content = response.content
+        seconds = time.perf_counter() - start
+
+        redact = self.redactor
+        body = request.body or ""
+        if isinstance(body, bytes):
+            body = body.decode("latin-1")
+        exchange = {
+            "method": request.method,
+            "url": redact.text(path_and_query(request.url)),
+            "request_body": redact.text(body),
+            "status": response.status_code,
+            "headers": [
+                [name, redact.header(name, value)]
+                for name, value in response.raw.headers.items()
+                if name.lower() not in TRANSPORT_HEADERS
+            ],
+            # latin-1 round trips any bytes, and leaves ASCII readable
+            "body": redact.text(content.decode("latin-1")),
+            "seconds": round(seconds, 6),
+        }
+        with self.lock:
+            self.exchanges.append(exchange)
+        return response
+
+    def save(self, path: str, recorded_at: DateTime | None = None):
+        """
+        Write the exchanges so far to `path`, along with when they were
+        recorded, since the URLs are full of dates.
+        """
+        recorded_at = recorded_at or pendulum.now()
+        with self.lock:
+            recording = {
+                "recorded_at": recorded_at.isoformat(),
+                "exchanges": list(self.exchanges),
+            }
+        with open(path, "w") as f:
+            json.dump(recording, f, indent=1)
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    A transport for TutorSession that never touches the network, and
+    answers each request with the recorded response to the same method,
+    path and query instead. Requests that were made more than once get the
+    recorded responses in the order they came, and once those run out the
+    last one again. A request that was never recorded raises an error.
+
+    With `realtime`, each response takes as long as it did when it was
+    recorded, otherwise it comes back straight away. Date headers are moved
+    up to the current time, so the server's clock seems to match ours.
+
+    The URLs hold the dates they were recorded on, so a replay should run
+    with pendulum's clock set to `recorded_at` (see pendulum.set_test_now),
+    and with placeholder_credentials() as the login.
+    """
+
+    def __init__(self, path: str, realtime=False, **kwargs):
+        super().__init__(**kwargs)
+        with open(path, "r") as f:
+            recording = json.load(f)
+        self.recorded_at = pendulum.parse(recording["recorded_at"])
+        self.exchanges = recording["exchanges"]
+        self.realtime = realtime
+        self.responses: dict[str, deque] = {}
+        for exchange in self.exchanges:
+            key = f"{exchange['method']} {exchange['url']}"
+            self.responses.setdefault(key, deque()).append(exchange)
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url)
+        with self.lock:
+            recorded = self.responses.get(key)
+            if not recorded:
+                raise Exception(f"Nothing recorded for {key}")
+            exchange = recorded.popleft() if len(recorded) > 1 else recorded[0]
+        if self.realtime:
+            time.sleep(exchange["seconds"])
+
+        headers = HTTPHeaderDict()
+        # what the cookie jar reads Set-Cookie headers from
+        message = http.client.HTTPMessage()
+        for name, value in exchange["headers"]:
+            if name.lower() == "date":
+                value = formatdate(usegmt=True)
+            headers.add(name, value)
+            message[name] = value
+
+        body = exchange["body"].encode("latin-1")
+        raw = HTTPResponse(
+            body=BytesIO(body),
+            headers=headers,
+            status=exchange["status"],
+            reason=http.client.responses.get(exchange["status"], ""),
+            preload_content=False,
+            decode_content=False,
+            original_response=_OriginalResponse(message),
+            request_method=request.method,
+            request_url=request.url,
+        )
+        return self.build_response(request, raw)
+
+    def close(self):
+        pass
+
+
+class _OriginalResponse:
+    """Just enough of an http.client.HTTPResponse for requests' cookie jar."""
+
+    def __init__(self, message: http.client.HTTPMessage):
+        self.msg = message
+
+    def isclosed(self) -> bool:
+        return True
+
+    def close(self):
+        pass
@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Put in front of every metric name in the Prometheus output
+PREFIX = "tutor_scheduler_"
+# How many individual spans to keep for the JSON output. The histograms
+# still count every span past this.
+MAX_SPANS = 10_000
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """(upper bound, how many were at or under it), like Prometheus wants."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((str(bound), total))
+        return result + [("+Inf", self.count)]
+
+
+class Span:
+    """One timed phase. Labels can be added while it's running."""
+
+    def __init__(self, name: str, labels: dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self.start = time.time()
+        self.duration = 0.0
+
+
+class Metrics:
+    """
+    Counters and latency histograms for the phases of a run, plus the
+    individual spans, so we can see where the time goes afterwards.
+    Everything is keyed by name and labels, and safe to use from many
+    threads at once.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.spans: list[Span] = []
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+    def count(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[Span]:
+        """
+        Time the body of the with block, and record it in the `name`_seconds
+        histogram. If the block raises, the span gets an error="true" label.
+        """
+        span = Span(name, {k: str(v) for k, v in labels.items()})
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.labels["error"] = "true"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            self.observe(f"{name}_seconds", span.duration, **span.labels)
+            with self.lock:
+                if len(self.spans) < MAX_SPANS:
+                    self.spans.append(span)
+
+    def to_json(self) -> dict:
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": dict(histogram.cumulative()),
+                    }
+                    for (name, labels), histogram in sorted(
+                        self.histograms.items(), key=lambda item: item[0]
+                    )
+                ],
+                "spans": [
+                    {
+                        "name": span.name,
+                        "labels": span.labels,
+                        "start": span.start,
+                        "duration": span.duration,
+                    }
+                    for span in sorted(self.spans, key=lambda span: span.start)
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """The metrics in Prometheus' text format, for the textfile collector."""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+
+            typed = set()
+            for (name, labels), value in counters:
+                name = f"{PREFIX}{name}_total"
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for (name, labels), histogram in histograms:
+                name = f"{PREFIX}{name}"
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in histogram.cumulative():
+                    bucket_labels = format_labels(labels + (("le", bound),))
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Write the metrics to `path`: in Prometheus' text format if it ends in
+        .prom, otherwise as JSON. The file is swapped in all at once, so
+        whatever's reading it never sees half of it.
+        """
+        if str(path).endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_json(), indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+# The process-wide metrics everything records into
+registry = Metrics()
+count = registry.count
+observe = registry.observe
+span = registry.span
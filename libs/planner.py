@@ -0,0 +1,231 @@
+from collections import abc
+from dataclasses import dataclass
+
+from libs import metrics
+from libs.tutor_api import DAYS_OF_WEEK, Grid, bits
+
+# Stands in for "this can't be done" in the planning tables
+IMPOSSIBLE = -(10**6)
+
+
+@dataclass(frozen=True)
+class Rules:
+    """The rules for which hours we're willing to work."""
+
+    # days of the week (like "MON") to never schedule
+    weekends: tuple[str, ...] = ()
+    # first hour of the day we'll schedule
+    start_time: int = 0
+    # don't schedule this hour or past it
+    end_time: int = 24
+    # a soft cap: only exceeded when needed to reach max_per_week
+    max_per_day: int = 24
+    max_per_week: int = 7 * 24
+    max_consecutive: int = 4
+
+
+class Planner:
+    """
+    Works out which available hours to grab, so that we end up with as many
+    hours as the rules allow.
+
+    Each day is planned with a small dynamic program over (hour, length of
+    the current run of scheduled hours), which takes hours that are already
+    scheduled into account, including ones before `start_time`. Hours are
+    then handed out to the days: first up to the daily maximum, and then,
+    if that's not enough to reach the weekly maximum, past it. Within a day
+    the earliest hours are preferred.
+
+    Hours that have been requested but haven't come back yet count as
+    scheduled. When a request fails, mark_lost() replans (only redoing the
+    table for that one day) and returns replacement hours to try right away.
+    """
+
+    def __init__(
+        self, schedule: abc.Mapping, hours_scheduled: int, rules: Rules = Rules()
+    ):
+        """
+        `schedule` is a Schedule, or any {day name: {hour: status}} mapping.
+        """
+        self.rules = rules
+        self.hours_scheduled = hours_scheduled
+        grid = getattr(schedule, "grid", None) or Grid.from_mapping(schedule)
+        # Bitmasks of the hours we could still grab, and of the hours that are
+        # ours (or requested), for each day
+        window = (1 << rules.end_time) - (1 << rules.start_time)
+        self.available = [
+            0 if day in rules.weekends else grid.available[i] & window
+            for i, day in enumerate(DAYS_OF_WEEK)
+        ]
+        self.occupied = list(grid.scheduled)
+        self.pending: set[tuple[int, int]] = set()
+        self._tables: list[list | None] = [None] * 7
+
+    def plan(self) -> list[tuple[int, int]]:
+        """
+        The (day, hour) pairs to request, on top of any that are pending.
+        Hours within the daily maximum come first, in day and hour order,
+        followed by any past it.
+        """
+        with metrics.span("plan"):
+            return self._plan()
+
+    def _plan(self) -> list[tuple[int, int]]:
+        budget = self.rules.max_per_week - self.hours_scheduled
+        if budget <= 0:
+            return []
+
+        # hand out the hours, first up to the daily max, then past it
+        most = [
+            self._table(day)[0][0][0] if self.available[day] else 0 for day in range(7)
+        ]
+        within = [0] * 7
+        for day in range(7):
+            room = max(0, self.rules.max_per_day - self.occupied[day].bit_count())
+            within[day] = min(most[day], room, budget)
+            budget -= within[day]
+        extra = [0] * 7
+        for day in range(7):
+            extra[day] = min(most[day] - within[day], budget)
+            budget -= extra[day]
+
+        primary = []
+        overflow = []
+        for day in range(7):
+            hours = self._pick(day, within[day] + extra[day])
+            primary.extend((day, hour) for hour in hours[: within[day]])
+            overflow.extend((day, hour) for hour in hours[within[day] :])
+        return primary + overflow
+
+    def fallbacks(self) -> list[tuple[int, int]]:
+        """
+        Available hours that aren't part of the plan, most useful first: the
+        ones that would replace the most planned hours, if each of those
+        were lost in turn. Ties (including hours that wouldn't replace any)
+        stay in day and hour order.
+        """
+        plan = self.plan()
+        planned = set(plan)
+        uses: dict[tuple[int, int], int] = {}
+        for day, hour in plan:
+            trial = self._copy()
+            trial.request(plan)
+            for slot in trial.mark_lost(day, hour):
+                uses[slot] = uses.get(slot, 0) + 1
+        hours = [
+            (day, hour)
+            for day in range(7)
+            for hour in bits(self.available[day])
+            if (day, hour) not in planned
+        ]
+        return sorted(hours, key=lambda slot: -uses.get(slot, 0))
+
+    def _copy(self) -> "Planner":
+        """A copy that can be changed without touching this one."""
+        copy = Planner.__new__(Planner)
+        copy.rules = self.rules
+        copy.hours_scheduled = self.hours_scheduled
+        copy.available = list(self.available)
+        copy.occupied = list(self.occupied)
+        copy.pending = set(self.pending)
+        # the tables are never changed once built, only thrown away
+        copy._tables = list(self._tables)
+        return copy
+
+    def restrict(self, masks: list[int]):
+        """
+        Only consider the hours in `masks` (a bitmask per day) from now on,
+        like the ones that just became available.
+        """
+        self.available = [have & mask for have, mask in zip(self.available, masks)]
+        self._tables = [None] * 7
+
+    def request(self, slots: list[tuple[int, int]]):
+        """Mark hours as requested. They count as scheduled until we hear back."""
+        for day, hour in slots:
+            self.available[day] &= ~(1 << hour)
+            self.occupied[day] |= 1 << hour
+            self.pending.add((day, hour))
+            self.hours_scheduled += 1
+            self._tables[day] = None
+
+    def mark_won(self, day: int, hour: int):
+        self.pending.discard((day, hour))
+
+    def mark_lost(self, day: int, hour: int) -> list[tuple[int, int]]:
+        """
+        Someone else got the hour. Returns the hours to request instead, which
+        have already been marked as requested.
+        """
+        self.pending.discard((day, hour))
+        self.occupied[day] &= ~(1 << hour)
+        self.hours_scheduled -= 1
+        self._tables[day] = None
+        replacements = self.plan()
+        self.request(replacements)
+        return replacements
+
+    def _table(self, day: int) -> list:
+        """
+        table[hour][run][picked] is the most hours we could still add from
+        `hour` onwards, if the run of scheduled hours just before `hour` is
+        `run` long, and `picked` says whether we added any of that run.
+        Runs longer than max_consecutive are fine if they were already
+        scheduled, but we can't add to them.
+        """
+        if self._tables[day] is not None:
+            return self._tables[day]
+
+        limit = self.rules.max_consecutive
+        occupied = self.occupied[day]
+        available = self.available[day]
+        table = [()] * 24 + [((0, 0),) * (limit + 2)]
+        for hour in range(23, -1, -1):
+            after = table[hour + 1]
+            if occupied >> hour & 1:
+                # the run gets longer, which is only a problem if we added
+                # to it and it's now too long
+                table[hour] = tuple(
+                    (after[run][0], after[run][1] if run <= limit else IMPOSSIBLE)
+                    for run in range(1, limit + 2)
+                ) + ((after[limit + 1][0], IMPOSSIBLE),)
+            elif available >> hour & 1:
+                # either skip it, or add it if the run isn't already too long
+                skip = after[0][0]
+                table[hour] = tuple(
+                    (best, best)
+                    for best in [
+                        max(skip, 1 + after[run][1]) for run in range(1, limit + 1)
+                    ]
+                    + [skip, skip]
+                )
+            else:
+                table[hour] = ((after[0][0], after[0][0]),) * (limit + 2)
+        self._tables[day] = table
+        return table
+
+    def _pick(self, day: int, count: int) -> list[int]:
+        """The earliest `count` hours on `day` that can be added together."""
+        if count == 0:
+            return []
+        table = self._table(day)
+        limit = self.rules.max_consecutive
+        occupied = self.occupied[day]
+        available = self.available[day]
+        hours = []
+        run = 0
+        for hour in range(24):
+            if len(hours) == count:
+                break
+            if occupied >> hour & 1:
+                run = min(run + 1, limit + 1)
+            elif (
+                available >> hour & 1
+                and run < limit
+                and 1 + table[hour + 1][run + 1][1] >= count - len(hours)
+            ):
+                hours.append(hour)
+                run += 1
+            else:
+                run = 0
+        return hours
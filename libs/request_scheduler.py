@@ -0,0 +1,172 @@
+import itertools
+import math
+import time
+from queue import PriorityQueue
+from threading import Barrier, Condition, Event, Lock, Thread
+from typing import Callable
+
+from libs import metrics
+from libs.tutor_api import UnexpectedResponse
+from libs.tutor_http import POOL_SIZE
+
+# How many requests can be in flight at once. More than the connection pool
+# holds would just have to wait for a connection anyway.
+CONCURRENCY = POOL_SIZE
+# Requests per second, on average, and how many can go out at once on top
+# of that (like right when hours are released)
+RATE = 50
+BURST = 80
+# How many times to retry a request that got a response we don't understand,
+# and how long to hold off everything the first time (doubling each time)
+MAX_RETRIES = 3
+BACKOFF = 0.25
+
+
+class TokenBucket:
+    """
+    Limits requests to `rate` per second, with bursts of up to `burst`.
+    back_off() stops any more from going out for a while.
+    """
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.perf_counter()
+        self.paused_until = 0.0
+        self.lock = Lock()
+
+    def acquire(self) -> float:
+        """Wait for a token, and return how many seconds that took."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.perf_counter()
+                elapsed = now - self.updated
+                self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def back_off(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.perf_counter() + seconds)
+
+
+class RequestScheduler:
+    """
+    Sends requests from a pool of `concurrency` threads, most important
+    first (lowest `priority`), no faster than the token bucket allows.
+
+    If a request gets a response we don't understand, which is usually the
+    server telling us to slow down in some form, every thread holds off for
+    a bit and the request goes back in the queue with the same priority.
+    After `max_retries` of those, the error is given up on and reported.
+
+    Threads are started and parked by start(), and nothing is sent until
+    release(), so requests can be queued up ahead of time and all go the
+    moment it matters.
+    """
+
+    def __init__(
+        self,
+        send: Callable,
+        concurrency=CONCURRENCY,
+        rate=RATE,
+        burst=BURST,
+        max_retries=MAX_RETRIES,
+        backoff=BACKOFF,
+    ):
+        self.send = send
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue: PriorityQueue = PriorityQueue()
+        # breaks ties between equal priorities, first come first served
+        self.order = itertools.count()
+        self.go = Event()
+        self.threads: list[Thread] = []
+        # how many submitted requests haven't been through on_done yet
+        self.pending = 0
+        self.idle = Condition()
+
+    def submit(self, item, priority: float, on_done: Callable):
+        """
+        Queue send(item). Once it's done, on_done(item, result, error,
+        sent_at) gets called from the thread that sent it, and can submit
+        more requests. `sent_at` is time.perf_counter() as the send started,
+        after any wait for the rate limit.
+        """
+        with self.idle:
+            self.pending += 1
+        self.queue.put((priority, next(self.order), item, 0, on_done))
+
+    def start(self):
+        """Start the threads, and return once they're all waiting to go."""
+        # The +1 is needed for this thread
+        ready = Barrier(self.concurrency + 1)
+        self.threads = [
+            Thread(target=self._worker, args=(ready,), daemon=True)
+            for _ in range(self.concurrency)
+        ]
+        for thread in self.threads:
+            thread.start()
+        ready.wait()
+
+    def release(self):
+        self.go.set()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """
+        Wait for every request (and any they led to), then stop the threads.
+        With a `timeout`, gives up waiting after that many seconds and
+        returns False. The threads still finish what's left after that.
+        """
+        with self.idle:
+            done = self.idle.wait_for(lambda: self.pending == 0, timeout)
+        for _ in self.threads:
+            self.queue.put((math.inf, next(self.order), None, 0, None))
+        if done:
+            for thread in self.threads:
+                thread.join()
+        return done
+
+    def _worker(self, ready: Barrier):
+        ready.wait()
+        self.go.wait()
+        while True:
+            priority, _, item, attempt, on_done = self.queue.get()
+            if on_done is None:
+                return
+            waited = self.limiter.acquire()
+            if waited:
+                metrics.observe("rate_limit_wait_seconds", waited)
+            result = error = None
+            sent_at = time.perf_counter()
+            try:
+                result = self.send(item)
+            except UnexpectedResponse as e:
+                if attempt < self.max_retries:
+                    metrics.count("request_retries")
+                    self.limiter.back_off(self.backoff * 2**attempt)
+                    self.queue.put(
+                        (priority, next(self.order), item, attempt + 1, on_done)
+                    )
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+            try:
+                on_done(item, result, error, sent_at)
+            finally:
+                with self.idle:
+                    self.pending -= 1
+                    if self.pending == 0:
+                        self.idle.notify_all()
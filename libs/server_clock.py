@@ -0,0 +1,79 @@
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from statistics import median
+
+# How many requests to make when estimating the server's clock
+SAMPLES = 6
+# How long before the deadline wait_until() stops sleeping and starts
+# spinning. time.sleep() can overshoot by a few milliseconds.
+SPIN_WINDOW = 0.02
+
+
+@dataclass
+class ClockEstimate:
+    """How the server's clock compares to ours."""
+
+    # server time minus local time, in seconds
+    offset: float
+    # the real offset is within this many seconds of `offset`
+    uncertainty: float
+    # the fastest round trip we saw, in seconds
+    rtt: float
+
+    def local_time_for(self, server_timestamp: float) -> float:
+        """Convert a server timestamp into a local time.time() timestamp."""
+        return server_timestamp - self.offset
+
+
+def estimate_offset(session, url: str, samples=SAMPLES) -> ClockEstimate:
+    """
+    Estimate the server's clock offset from the Date headers of a few HEAD
+    requests.
+
+    The Date header only has whole seconds, so one response only tells us
+    the server's clock was somewhere in [date, date + 1) at some point
+    while the request was in flight. That bounds the offset to
+    (date - received, date + 1 - sent). The samples are spread out over a
+    bit more than a second, so they land at different points within the
+    server's second, and intersecting all the bounds narrows the offset
+    down to roughly the round-trip time.
+    """
+    low, high = float("-inf"), float("inf")
+    midpoints = []
+    best_rtt = float("inf")
+    for i in range(samples):
+        if i:
+            # shift where in the second the next sample lands
+            time.sleep(1 / samples + 0.01)
+        sent = time.time()
+        response = session.head(url)
+        received = time.time()
+
+        date = parsedate_to_datetime(response.headers["Date"]).timestamp()
+        low = max(low, date - received)
+        high = min(high, date + 1 - sent)
+        midpoints.append(date + 0.5 - (sent + received) / 2)
+        best_rtt = min(best_rtt, received - sent)
+
+    if low > high:
+        # The bounds don't agree, which can happen if the server's clock
+        # stepped while we were sampling. Fall back to the typical midpoint.
+        return ClockEstimate(median(midpoints), 0.5 + best_rtt / 2, best_rtt)
+    return ClockEstimate((low + high) / 2, (high - low) / 2, best_rtt)
+
+
+def wait_until(deadline: float, spin_window=SPIN_WINDOW):
+    """
+    Wait until the local time.time() reaches `deadline`, with sub-millisecond
+    precision. Sleeps for most of the wait, then busy-waits on the
+    high-resolution counter for the last few milliseconds.
+    """
+    # perf_counter is monotonic and much finer grained than time.time(),
+    # so translate the deadline into it once up front
+    target = time.perf_counter() + (deadline - time.time())
+    remaining = target - time.perf_counter()
+    if remaining > spin_window:
+        time.sleep(remaining - spin_window)
+    while time.perf_counter() < target:
+        pass
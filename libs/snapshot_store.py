@@ -0,0 +1,185 @@
+import hashlib
+import json
+import sqlite3
+
+import pendulum
+from pendulum import DateTime
+
+from libs.tutor_api import Grid, GridChange, Schedule
+
+DEFAULT_PATH = "secrets/schedule_snapshots.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    week TEXT PRIMARY KEY,
+    page_hash TEXT NOT NULL,
+    grid_hash TEXT NOT NULL,
+    hours_scheduled INTEGER NOT NULL,
+    grid TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    week TEXT NOT NULL,
+    changed_at TEXT NOT NULL,
+    change TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_by_week ON changes (week, changed_at);
+-- calendar_grids didn't say which calendar each grid was written to, so
+-- those weeks get synced by reading the calendar once more instead
+DROP TABLE IF EXISTS calendar_grids;
+CREATE TABLE IF NOT EXISTS synced_grids (
+    calendar_id TEXT NOT NULL,
+    week TEXT NOT NULL,
+    grid TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, week)
+);
+"""
+
+
+def week_key(week: DateTime) -> str:
+    """The key snapshots are stored under: the date the week starts on."""
+    return week.start_of("week").format("YYYY-MM-DD")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def grid_to_json(grid: Grid) -> str:
+    return json.dumps(
+        {
+            "scheduled": grid.scheduled,
+            "available": grid.available,
+            "other": sorted(
+                [day, hour, status] for (day, hour), status in grid.other.items()
+            ),
+        },
+        sort_keys=True,
+    )
+
+
+def grid_from_json(data: str) -> Grid:
+    data = json.loads(data)
+    return Grid(
+        data["scheduled"],
+        data["available"],
+        {(day, hour): status for day, hour, status in data["other"]},
+    )
+
+
+class SnapshotStore:
+    """
+    Remembers the last schedule page and parsed grid we saw for each week,
+    so runs where nothing changed can skip parsing and calendar work, and
+    keeps a history of what changed and when.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def page_unchanged(self, week: DateTime, html: str) -> bool:
+        """
+        Whether the page is byte-for-byte the one we saw last time, in which
+        case there's no need to even parse it.
+        """
+        row = self.db.execute(
+            "SELECT page_hash FROM snapshots WHERE week = ?", (week_key(week),)
+        ).fetchone()
+        if row is None or row[0] != hash_text(html):
+            return False
+        with self.db:
+            self.db.execute(
+                "UPDATE snapshots SET fetched_at = ? WHERE week = ?",
+                (pendulum.now().isoformat(), week_key(week)),
+            )
+        return True
+
+    def grid(self, week: DateTime) -> Grid | None:
+        """The last grid we saw for the week, if any."""
+        row = self.db.execute(
+            "SELECT grid FROM snapshots WHERE week = ?", (week_key(week),)
+        ).fetchone()
+        return grid_from_json(row[0]) if row else None
+
+    def save(self, week: DateTime, html: str, schedule: Schedule) -> GridChange | None:
+        """
+        Store the latest page and schedule for the week. If the grid changed
+        since the last snapshot, the change is added to the history and
+        returned.
+        """
+        key = week_key(week)
+        now = pendulum.now().isoformat()
+        grid_json = grid_to_json(schedule.grid)
+        grid_hash = hash_text(grid_json)
+        row = self.db.execute(
+            "SELECT grid_hash, grid, changed_at FROM snapshots WHERE week = ?", (key,)
+        ).fetchone()
+
+        change = None
+        changed_at = now
+        if row is not None and row[0] == grid_hash:
+            changed_at = row[2]
+        elif row is not None:
+            change = schedule.grid.diff(grid_from_json(row[1]))
+
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    hash_text(html),
+                    grid_hash,
+                    schedule.hours_scheduled,
+                    grid_json,
+                    now,
+                    changed_at,
+                ),
+            )
+            if change is not None:
+                self.db.execute(
+                    "INSERT INTO changes (week, changed_at, change) VALUES (?, ?, ?)",
+                    (key, now, json.dumps(change.__dict__)),
+                )
+        return change
+
+    def calendar_grid(self, week: DateTime, calendar_id: str) -> Grid | None:
+        """
+        The grid the week's events in the calendar were last written from,
+        if they were all written successfully with their
+        calendar_api.event_id().
+        """
+        row = self.db.execute(
+            "SELECT grid FROM synced_grids WHERE calendar_id = ? AND week = ?",
+            (calendar_id, week_key(week)),
+        ).fetchone()
+        return grid_from_json(row[0]) if row else None
+
+    def save_calendar_grid(self, week: DateTime, grid: Grid, calendar_id: str):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO synced_grids VALUES (?, ?, ?, ?)",
+                (
+                    calendar_id,
+                    week_key(week),
+                    grid_to_json(grid),
+                    pendulum.now().isoformat(),
+                ),
+            )
+
+    def history(self, week: DateTime) -> list[tuple[DateTime, GridChange]]:
+        """Every change recorded for the week, oldest first."""
+        rows = self.db.execute(
+            "SELECT changed_at, change FROM changes WHERE week = ? ORDER BY id",
+            (week_key(week),),
+        )
+        return [
+            (pendulum.parse(changed_at), GridChange(**json.loads(change)))
+            for changed_at, change in rows
+        ]
@@ -1,29 +1,64 @@
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from collections import abc
-from typing import Iterator
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Iterator
+from dataclasses import dataclass, field
 
-from bs4 import BeautifulSoup
-import mechanize
 import pendulum
 from pendulum import DateTime
 
-from libs.calendar_api import SimpleEvent
+from libs import metrics
+from libs.events import SimpleEvent
+from libs.tutor_http import TutorSession
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
-# logger = logging.getLogger("mechanize")
+
+# logger = logging.getLogger("urllib3")
 # logger.addHandler(logging.StreamHandler(sys.stdout))
 # logger.setLevel(logging.DEBUG)
 
-with open("secrets/login_credentials.json", "r") as f:
-    credentials = json.load(f)
+# The tutor.com login, read from CREDENTIALS_FILE by get_credentials() the
+# first time it's needed
+CREDENTIALS_FILE = "secrets/login_credentials.json"
+credentials = None
 
 
-DAYS_OF_WEEK = ["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"]
+BASE_URL = "https://prv.tutor.com"
 
-br = mechanize.Browser()
-br.set_handle_robots(False)
+DAYS_OF_WEEK = ["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"]
+CELLS_PER_WEEK = 7 * 24
+SCHEDULED = "Scheduled!"
+AVAILABLE = "Available"
+
+# Patterns for pulling the schedule out of the page. The page's script has
+# its quotes escaped with a backslash, hence all the \\'s.
+WEEK_PATTERN = re.compile(r"WEEK OF (\d\d/\d\d/\d\d\d\d) -")
+CELL_PATTERN = re.compile(r"fillCell\(.+, \\'(.+)\\', \\'(.*)\\',.+\)")
+# Everything the fast parser needs, in one pattern so the page only gets
+# scanned once. Only matches cells with a literal index, which skips over
+# the definition of fillCell() itself.
+PAGE_PATTERN = re.compile(
+    r'id="lblScheduledHours">\s*(?P<hours>\d+)\s*<'
+    r"|WEEK OF (?P<week>\d\d/\d\d/\d\d\d\d) -"
+    r"|fillCell\(\\?'[^']*', \\?'(?P<index>\d+)\\?', \\?'(?P<status>[^'\\]*)\\?'"
+)
+
+# Everything SchedulerWorker.aspx is known to send back, and whether it
+# means the request worked
+SCHEDULE_RESPONSES = {
+    b"ScheduleSelectedComplete(1);": True,
+    b"ScheduleSelectedComplete(0);": False,
+}
+
+# One session (and login) for everything, safe to share between threads
+session = TutorSession()
+# Where the login cookies are kept between runs
+SESSION_FILE = "secrets/tutor_session.json"
+login_lock = Lock()
 
 # Sets up week start and end (it defaults to starting on Monday).
 # Fun fact: this doesn't affect .day_of_week and .weekday(), because
@@ -34,28 +69,226 @@ pendulum.week_starts_at(pendulum.SUNDAY)
 pendulum.week_ends_at(pendulum.SATURDAY)
 
 
+def bits(mask: int) -> list[int]:
+    """The positions of the set bits in `mask`, lowest first."""
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
+
+
+def runs(mask: int) -> list[tuple[int, int]]:
+    """
+    The runs of consecutive set bits in `mask`, as (start, end) pairs with
+    `end` being one past the last bit, lowest first.
+    """
+    found = []
+    while mask:
+        start = (mask & -mask).bit_length() - 1
+        shifted = mask >> start
+        # the lowest unset bit of `shifted` is where the run ends
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        found.append((start, start + length))
+        mask &= ~(((1 << length) - 1) << start)
+    return found
+
+
+@dataclass
+class GridChange:
+    """
+    What changed between two Grids, as one bitmask per day for each kind
+    of change.
+    """
+
+    became_available: list[int]
+    stopped_being_available: list[int]
+    became_scheduled: list[int]
+    stopped_being_scheduled: list[int]
+
+    def __bool__(self):
+        return any(
+            self.became_available
+            + self.stopped_being_available
+            + self.became_scheduled
+            + self.stopped_being_scheduled
+        )
+
+
+@dataclass
+class Grid:
+    """
+    The status of every hour of a week. Each day has a bitmask of its
+    "Scheduled!" hours and one of its "Available" hours, where bit `hour`
+    is set if the hour has that status. Day 0 is Sunday.
+    """
+
+    scheduled: list[int] = field(default_factory=lambda: [0] * 7)
+    available: list[int] = field(default_factory=lambda: [0] * 7)
+    # Any other statuses. We don't expect any, but don't want to lose them.
+    other: dict[tuple[int, int], str] = field(default_factory=dict)
+
+    @classmethod
+    def from_mapping(cls, schedule: abc.Mapping) -> "Grid":
+        """Build a grid from a {day name: {hour: status}} mapping."""
+        grid = cls()
+        for day, day_name in enumerate(DAYS_OF_WEEK):
+            for hour, status in schedule[day_name].items():
+                grid.set_status(day, hour, status)
+        return grid
+
+    def status(self, day: int, hour: int) -> str | None:
+        bit = 1 << hour
+        if self.scheduled[day] & bit:
+            return SCHEDULED
+        if self.available[day] & bit:
+            return AVAILABLE
+        return self.other.get((day, hour))
+
+    def set_status(self, day: int, hour: int, status: str | None):
+        bit = 1 << hour
+        self.scheduled[day] &= ~bit
+        self.available[day] &= ~bit
+        self.other.pop((day, hour), None)
+        if status == SCHEDULED:
+            self.scheduled[day] |= bit
+        elif status == AVAILABLE:
+            self.available[day] |= bit
+        elif status:
+            self.other[(day, hour)] = status
+
+    def hours(self, day: int) -> int:
+        """Bitmask of every hour on `day` that has any status."""
+        mask = self.scheduled[day] | self.available[day]
+        for other_day, hour in self.other:
+            if other_day == day:
+                mask |= 1 << hour
+        return mask
+
+    def diff(self, before: "Grid") -> GridChange:
+        """What changed going from `before` to this grid."""
+        return GridChange(
+            [now & ~then for now, then in zip(self.available, before.available)],
+            [then & ~now for now, then in zip(self.available, before.available)],
+            [now & ~then for now, then in zip(self.scheduled, before.scheduled)],
+            [then & ~now for now, then in zip(self.scheduled, before.scheduled)],
+        )
+
+
+class DayView(abc.MutableMapping):
+    """
+    One day of a Grid, looking like the {hour: status} dict the Schedule
+    used to be made of. Changes go straight through to the grid.
+    """
+
+    def __init__(self, grid: Grid, day: int):
+        self._grid = grid
+        self._day = day
+
+    def __getitem__(self, hour: int) -> str:
+        status = self._grid.status(self._day, hour) if 0 <= hour < 24 else None
+        if status is None:
+            raise KeyError(hour)
+        return status
+
+    def __setitem__(self, hour: int, status: str):
+        self._grid.set_status(self._day, hour, status)
+
+    def __delitem__(self, hour: int):
+        if self.get(hour) is None:
+            raise KeyError(hour)
+        self._grid.set_status(self._day, hour, None)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(bits(self._grid.hours(self._day)))
+
+    def __len__(self) -> int:
+        return self._grid.hours(self._day).bit_count()
+
+
 class Schedule(abc.Mapping):
     def __init__(self, html):
+        with metrics.span("parse") as span:
+            span.labels["parser"] = "fast"
+            parsed = self.fast_parse(html)
+            if parsed is None:
+                # Something about the page doesn't look like we expect, so do
+                # it the slow but sure way.
+                span.labels["parser"] = "soup"
+                parsed = self.soup_parse(html)
+        self.hours_scheduled, self.week, self.grid = parsed
+
+    @classmethod
+    def from_grid(cls, week: DateTime, grid: Grid) -> "Schedule":
+        """A schedule for `week` with the given grid, without any page."""
+        schedule = cls.__new__(cls)
+        schedule.week = week
+        schedule.grid = grid
+        schedule.hours_scheduled = sum(mask.bit_count() for mask in grid.scheduled)
+        return schedule
+
+    @classmethod
+    def fast_parse(cls, html: str) -> tuple[int, DateTime, Grid] | None:
+        """
+        Pull the scheduled hours, week and cells straight out of the raw
+        page in a single regex pass, without building a DOM. Returns None if
+        the result doesn't validate (something missing, or not exactly one
+        cell per hour of the week), so the caller can fall back to
+        soup_parse().
+        """
+        hours_scheduled = None
+        week = None
+        extracted_cells: dict[int, str] = {}
+        for m in PAGE_PATTERN.finditer(html):
+            if m.lastgroup == "hours":
+                hours_scheduled = int(m.group("hours"))
+            elif m.lastgroup == "week":
+                week = m.group("week")
+            else:
+                extracted_cells[int(m.group("index"))] = m.group("status")
+
+        if (
+            hours_scheduled is None
+            or week is None
+            or len(extracted_cells) != CELLS_PER_WEEK
+            or max(extracted_cells) != CELLS_PER_WEEK - 1
+        ):
+            return None
+
+        week = pendulum.from_format(week, "MM/DD/YYYY", tz="America/New_York")
+        grid = cls.cells_to_grid(extracted_cells.items())
+        return hours_scheduled, week, grid
+
+    @classmethod
+    def soup_parse(cls, html: str) -> tuple[int, DateTime, Grid]:
+        """
+        Parse the page with BeautifulSoup. Much slower than fast_parse(),
+        but less picky about the page layout.
+        """
+        # bs4 (and html5lib) take a while to import, and most runs never
+        # need them, so they're only loaded if we end up here
+        from bs4 import BeautifulSoup
+
         html = BeautifulSoup(html, features="html5lib")
-        self.hours_scheduled = int(html.find(id="lblScheduledHours").text)
-        self.week = self.parse_week(html)
-        self._schedule: dict[str, dict[int, str]] = self.parse_schedule(html)
+        hours_scheduled = int(html.find(id="lblScheduledHours").text)
+        return hours_scheduled, cls.parse_week(html), cls.parse_schedule(html)
 
     @staticmethod
-    def parse_week(html: BeautifulSoup) -> DateTime:
+    def parse_week(html: "BeautifulSoup") -> DateTime:
         """
         Extract the week from the schedule page and parse it into a
         DateTime.
         """
         script = str(html.form.find_all("script")[-1].string)
-        m = re.search(r"WEEK OF (\d\d/\d\d/\d\d\d\d) -", script)
+        m = WEEK_PATTERN.search(script)
         return pendulum.from_format(m.group(1), "MM/DD/YYYY", tz="America/New_York")
 
-    @staticmethod
-    def parse_schedule(html: BeautifulSoup) -> dict[str, dict[int, str]]:
+    @classmethod
+    def parse_schedule(cls, html: "BeautifulSoup") -> Grid:
         script = str(html.form.find_all("script")[-1].string)
         # Use +? to perform non-greedy match
-        cell_calls = re.findall("fillCell\(.+?\)", script)
+        cell_calls = re.findall(r"fillCell\(.+?\)", script)
         extracted_cells: list[tuple[int, str]] = []
         for cell in cell_calls:
             # Extract the cell index and status ("Available" or
@@ -63,12 +296,15 @@ class Schedule(abc.Mapping):
             # a single backslash, and the regex parser needs it to be
             # escaped. We're using a raw string so we don't have to use even
             # more backslashes to escape these backslashes.
-            pattern = r"fillCell\(.+, \\'(.+)\\', \\'(.*)\\',.+\)"
-            index, status = re.search(pattern, cell).groups()
+            index, status = CELL_PATTERN.search(cell).groups()
             extracted_cells.append((int(index), status))
 
+        return cls.cells_to_grid(extracted_cells)
+
+    @staticmethod
+    def cells_to_grid(extracted_cells: Iterable[tuple[int, str]]) -> Grid:
         # parse the cell indices into hour and day
-        schedule: dict[str, dict[int, str]] = {day: dict() for day in DAYS_OF_WEEK}
+        grid = Grid()
         for index, status in extracted_cells:
             if status:
                 # Note that the javascript cells don't match to the table
@@ -76,51 +312,22 @@ class Schedule(abc.Mapping):
                 # so only 7 wide.
                 hour = index // 7
                 day = index % 7
-                schedule[DAYS_OF_WEEK[day]][hour] = status
-        return schedule
+                grid.set_status(day, hour, status)
+        return grid
 
     def to_simple_events(self):
-        @dataclass
-        class Event:
-            """Stupid simple event to keep the logic simple"""
-
-            start: int
-            end: int
-
-        # Collapse nearby hours into one Event
-        def join_times(times: list[int]) -> list[Event]:
-            if not times:
-                return []
-            t1 = times.pop(0)
-            collapsed = [Event(t1, t1 + 1)]
-            current = 0
-            for t2 in times:
-                t1 = collapsed[current]
-                if t1.end == t2:
-                    t1.end = t2 + 1
-                else:
-                    collapsed.append(Event(t2, t2 + 1))
-                    current += 1
-            return collapsed
-
         simple_events: dict[str, list[SimpleEvent]] = {}
-        for day, hours in self._schedule.items():
-            # filter out the Available time slots
-            hours = [h for h in hours.keys() if hours[h] == "Scheduled!"]
-            # collapse the times
-            events = join_times(hours)
-            # translate the stupid-simple event into SimpleEvents using
-            # DateTime objects
-            day_index = DAYS_OF_WEEK.index(day)
+        for day_index, day in enumerate(DAYS_OF_WEEK):
             simple_events_list = []
-            for event in events:
+            # each run of scheduled hours is one event
+            for start, end in runs(self.grid.scheduled[day_index]):
                 # When daylight savings happens, the week start is an hour off.
                 # Hence this method, instead of using add(), which I was doing
                 # originally. But we do have to use add for the event ent,
-                # because event.end might be 24.
+                # because end might be 24.
                 day_start = self.week.add(days=day_index)
-                event_start = DateTime(day_start.year, day_start.month, day_start.day, event.start)
-                event_end = event_start.add(hours=(event.end - event.start))
+                event_start = DateTime(day_start.year, day_start.month, day_start.day, start)
+                event_end = event_start.add(hours=(end - start))
                 simple = SimpleEvent(
                     "Tutoring",
                     start=event_start,
@@ -131,6 +338,14 @@ class Schedule(abc.Mapping):
 
         return simple_events
 
+    def scheduled_on(self, day: int) -> int:
+        """How many hours are scheduled on `day` (0 is Sunday)."""
+        return self.grid.scheduled[day].bit_count()
+
+    def diff(self, before: "Schedule") -> GridChange:
+        """What changed between an earlier snapshot of this week and now."""
+        return self.grid.diff(before.grid)
+
     def ascii_display(self) -> str:
         lines = [
             f"Week of {self.week.format('MM/DD/YYYY')}",
@@ -139,8 +354,8 @@ class Schedule(abc.Mapping):
 
         for hour in range(24):
             line = str(hour).rjust(2) + " "
-            for daily_schedule in self.values():
-                if status := daily_schedule.get(hour):
+            for day in range(7):
+                if status := self.grid.status(day, hour):
                     line += f" {status[0]}  "
                 else:
                     line += "    "
@@ -149,18 +364,28 @@ class Schedule(abc.Mapping):
         return "\n".join(lines)
 
     def values(self):
-        return self._schedule.values()
+        return [DayView(self.grid, day) for day in range(7)]
 
     def __getitem__(self, k: str):
         if k not in DAYS_OF_WEEK:
             raise Exception(f"Expected day of week, got: {k}")
-        return self._schedule[k]
+        return DayView(self.grid, DAYS_OF_WEEK.index(k))
 
     def __len__(self) -> int:
-        return len(self._schedule)
+        return len(DAYS_OF_WEEK)
 
     def __iter__(self) -> Iterator:
-        return self._schedule.__iter__()
+        return iter(DAYS_OF_WEEK)
+
+
+def get_credentials() -> dict:
+    """The tutor.com login, read from CREDENTIALS_FILE on first use."""
+    global credentials
+
+    if credentials is None:
+        with open(CREDENTIALS_FILE, "r") as f:
+            credentials = json.load(f)
+    return credentials
 
 
 def build_schedule_hour_url(timeslot: DateTime, unset=False):
@@ -184,7 +409,7 @@ def build_schedule_hour_url(timeslot: DateTime, unset=False):
     type_ = "Remove" if unset else "Set"
 
     return (
-        "https://prv.tutor.com/nGEN/Tools/ScheduleManager_v2/"
+        f"{BASE_URL}/nGEN/Tools/ScheduleManager_v2/"
         f"SchedulerWorker.aspx?Type={type_}"
         f"&Week={week}"
         f"&WeekDay={weekday}"
@@ -200,7 +425,7 @@ def build_login_url(program_guid, user_guid):
     and then navigated to the schedule.
     """
     return (
-        f"https://prv.tutor.com/"
+        f"{BASE_URL}/"
         "nGEN/Tools/ScheduleManager_v2/setContactID.aspx"
         f"?ProgramGUID={program_guid}&UserGUID={user_guid}"
     )
@@ -212,7 +437,7 @@ def build_week_url(week: str):
     form of `mm/dd/yyyy`.
     """
     return (
-        f"https://prv.tutor.com/nGEN/Tools/"
+        f"{BASE_URL}/nGEN/Tools/"
         "ScheduleManager_v2/default.aspx?"
         f"SelectedDate={week}&DaysToAdd=0"
     )
@@ -228,15 +453,58 @@ def schedule_hour(week: DateTime, day: int, hour: int, unset=False) -> bool:
     """
     slot = week.add(days=day, hours=hour)
     url = build_schedule_hour_url(slot, unset=unset)
-    response = mechanize.Request(url, method="POST")
 
-    response = br.open(response).get_data()
-    if response == b"ScheduleSelectedComplete(1);":
-        return True
-    elif response == b"ScheduleSelectedComplete(0);":
-        return False
-    else:
-        raise Exception(f"Unforeseen response: {response}")
+    with metrics.span("schedule_hour", unset=unset) as span:
+        success = classify_schedule_response(session.post(url).content)
+        span.labels["success"] = str(success)
+    return success
+
+
+class UnexpectedResponse(Exception):
+    """
+    SchedulerWorker.aspx sent back something we've never seen. We can't tell
+    whether the request worked, but it's often the server being overloaded
+    or limiting us, so it's worth waiting a bit and trying again.
+    """
+
+
+def classify_schedule_response(response: bytes) -> bool:
+    """Whether a response from SchedulerWorker.aspx means it worked."""
+    result = SCHEDULE_RESPONSES.get(response)
+    if result is None:
+        raise UnexpectedResponse(f"Unforeseen response: {response}")
+    return result
+
+
+class ArmedWeek:
+    """
+    Every Set and Remove request for one week, built ahead of time so that
+    scheduling an hour is nothing but sending some bytes and looking up the
+    response. Meant for when every millisecond counts, like right when
+    hours get released.
+
+    The requests have the session's cookies baked in, so this has to be
+    created after logging in.
+    """
+
+    def __init__(self, week: DateTime):
+        """`week` is the start of the week, just like for schedule_hour()."""
+        self.week = week
+        self._requests = {}
+        for day in range(7):
+            for hour in range(24):
+                slot = week.add(days=day, hours=hour)
+                for unset in (False, True):
+                    url = build_schedule_hour_url(slot, unset=unset)
+                    self._requests[(day, hour, unset)] = session.prepare_post(url)
+
+    def schedule_hour(self, day: int, hour: int, unset=False) -> bool:
+        """Same as the schedule_hour() function, minus all the setup."""
+        with metrics.span("schedule_hour", unset=unset) as span:
+            response = session.send(self._requests[(day, hour, unset)])
+            success = classify_schedule_response(response.content)
+            span.labels["success"] = str(success)
+        return success
 
 
 def login_and_get_html() -> str:
@@ -244,39 +512,109 @@ def login_and_get_html() -> str:
     Logs in and returns the HTML form the schedule page, which will
     be for the current week.
 
-    Calling this twice will crash things, because the login page will be
-    skipped, and mechanize won't be able to find the login form.
+    If we're already logged in, or there's a saved session from an earlier
+    run that's still good, that gets used instead of going through the
+    login form. After a real login, the session is saved for next time.
     """
-    url = build_login_url(credentials["program_id"], credentials["user_id"])
-    br.open(url)
-    form = br.forms()[0]
-    form["txtUserName"] = credentials["username"]
-    form["txtPassword"] = credentials["password"]
-    br.form = form
-    response = br.submit()
-    if response.code != 200:
-        raise Exception(
-            (
-                "Something went wrong with form submission -- "
-                "maybe the username or password was wrong?"
-            )
+    # only one thread gets to log in at a time
+    with login_lock, metrics.span("login") as span:
+        if session.cookies or session.load_cookies(SESSION_FILE):
+            current_week = build_week_url(DateTime.now().format("MM/DD/YYYY"))
+            response = session.get(current_week)
+            if is_schedule_page(response):
+                span.labels["session"] = "reused"
+                return str(response.content)
+            # it expired, so start over
+            session.cookies.clear()
+
+        span.labels["session"] = "new"
+
+        credentials = get_credentials()
+        url = build_login_url(credentials["program_id"], credentials["user_id"])
+        login_page = session.get(url)
+        response = session.submit_form(
+            login_page,
+            {
+                "txtUserName": credentials["username"],
+                "txtPassword": credentials["password"],
+            },
         )
-    return str(response.get_data())
+        if response.status_code != 200 or not is_schedule_page(response):
+            raise Exception(
+                (
+                    "Something went wrong with form submission -- "
+                    "maybe the username or password was wrong?"
+                )
+            )
+        session.save_cookies(SESSION_FILE)
+        # The parsers expect the repr of the raw bytes, escaped quotes and all
+        return str(response.content)
+
+
+def is_schedule_page(response) -> bool:
+    """
+    Whether we got the schedule, rather than (say) getting bounced to the
+    login page because the session expired.
+    """
+    return response.status_code == 200 and b"lblScheduledHours" in response.content
 
 
 def get_html_for_week(week: str | DateTime) -> str:
     """
-    Loads the schedule for the given week and returns the HTML. The user
-    MUST be logged in already.
+    Loads the schedule for the given week and returns the HTML. If the
+    session has expired, this logs in again and retries.
     """
     if type(week) == DateTime:
         week = week.format("MM/DD/YYYY")
-    # TODO: make the login a singleton type deal
     url = build_week_url(week)
-    response = br.open(url)
-    if response.code != 200:
-        raise Exception(f"Opening week URL gave error code: {response.code} ")
-    return str(response.get_data())
+    with metrics.span("fetch_week"):
+        response = session.get(url)
+        if response.status_code == 200 and not is_schedule_page(response):
+            login_and_get_html()
+            response = session.get(url)
+        if response.status_code != 200:
+            raise Exception(
+                f"Opening week URL gave error code: {response.status_code} "
+            )
+        metrics.count("fetched_bytes", len(response.content))
+    return str(response.content)
+
+
+def get_html_for_weeks(weeks: list[str | DateTime], max_workers=4) -> list[str]:
+    """
+    Loads the schedule for several weeks at once, returning the HTML in the
+    same order as `weeks`. The user MUST be logged in already.
+    """
+    if len(weeks) <= 1:
+        return [get_html_for_week(week) for week in weeks]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(weeks))) as pool:
+        return list(pool.map(get_html_for_week, weeks))
+
+
+def login_and_get_html_for_weeks(weeks: list[str | DateTime]) -> list[str]:
+    """
+    Log in and load the schedule for several weeks, like get_html_for_weeks(),
+    except that the page logging in already got isn't fetched again.
+    """
+    current = login_and_get_html()
+    current_week = page_week(current)
+    missing = [week for week in weeks if week_of(week) != current_week]
+    fetched = dict(zip(map(week_of, missing), get_html_for_weeks(missing)))
+    return [fetched.get(week_of(week), current) for week in weeks]
+
+
+def week_of(week: str | DateTime) -> str:
+    """The Sunday starting the week `week` is in, as MM/DD/YYYY."""
+    if type(week) != DateTime:
+        week = pendulum.from_format(week, "MM/DD/YYYY")
+    return week.subtract(days=week.day_of_week).format("MM/DD/YYYY")
+
+
+def page_week(html: str) -> str | None:
+    """Which week a schedule page is for, as MM/DD/YYYY, if it says."""
+    m = WEEK_PATTERN.search(html)
+    return m and m.group(1)
 
 
 def main():
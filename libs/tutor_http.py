@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# How many connections to keep open to tutor.com at the same time. Anything
+# that fires off lots of requests at once (like grabbing slots) should stay
+# under this, otherwise the extra requests have to open new connections.
+POOL_SIZE = 32
+# Seconds to wait on tutor.com before giving up on a request, both to
+# connect and between bytes of the response
+TIMEOUT = 30
+
+
+class TutorSession:
+    """
+    The HTTP layer for talking to tutor.com. Wraps a single requests.Session,
+    so there's one shared set of login cookies, and connections are kept
+    alive and pooled between requests.
+
+    Unlike a mechanize.Browser, this has no "current page" state, so it's
+    safe to use from many threads at once: each request just borrows a
+    connection from the pool.
+
+    `adapter` swaps out how requests actually get sent, like the recording
+    and replaying ones in http_recording.py. It's given the same pool
+    settings as the default one.
+
+    Every request gives up after `timeout` seconds without hearing back,
+    unless it's given a timeout of its own.
+    """
+
+    def __init__(
+        self,
+        pool_size=POOL_SIZE,
+        adapter=HTTPAdapter,
+        timeout=TIMEOUT,
+        **adapter_kwargs,
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.adapter = adapter(
+            pool_connections=4, pool_maxsize=pool_size, **adapter_kwargs
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    @property
+    def cookies(self) -> requests.cookies.RequestsCookieJar:
+        return self.session.cookies
+
+    def save_cookies(self, path: str):
+        """
+        Save the session's cookies, so later runs can skip logging in. They're
+        as good as a password while they last, so only we can read the file.
+        """
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires,
+                "secure": cookie.secure,
+                "rest": cookie._rest,
+            }
+            for cookie in self.session.cookies
+        ]
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(cookies, f)
+
+    def load_cookies(self, path: str) -> bool:
+        """Load cookies saved by save_cookies(). Returns whether there were any."""
+        if not os.path.exists(path):
+            return False
+        with open(path, "r") as f:
+            cookies = json.load(f)
+        for cookie in cookies:
+            self.session.cookies.set(**cookie)
+        return bool(cookies)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.head(url, **kwargs)
+
+    def post(self, url: str, data=None, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, data=data, **kwargs)
+
+    def prepare_post(self, url: str, data=None) -> requests.PreparedRequest:
+        """
+        Build and encode a POST request (with the current cookies) without
+        sending it, so it can be fired later with send().
+        """
+        return self.session.prepare_request(requests.Request("POST", url, data=data))
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.send(request, **kwargs)
+
+    def warm_up(self, url: str, connections: int):
+        """
+        Open up to `connections` connections to the server ahead of time, so
+        a burst of requests later doesn't have to wait on TCP and TLS
+        handshakes. The connections stay in the pool afterwards.
+        """
+        connections = max(1, min(connections, self.pool_size))
+
+        def open_connection(_):
+            try:
+                self.head(url)
+            except requests.RequestException:
+                # no big deal, the real request will just have to connect
+                pass
+
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            list(pool.map(open_connection, range(connections)))
+
+    def submit_form(self, page: requests.Response, fields: dict) -> requests.Response:
+        """
+        Submit the first form on `page`, the way a browser would: every
+        field already in the form gets sent along (ASP.NET needs its hidden
+        __VIEWSTATE fields), with `fields` filled in on top.
+        """
+        action, form_fields = parse_form(page.text, page.url)
+        form_fields.update(fields)
+        return self.post(action, data=form_fields)
+
+
+def parse_form(html: str, url: str) -> tuple[str, dict[str, str]]:
+    """
+    Find the first form in the page, and return the URL it submits to and
+    the fields it would submit. Like mechanize, the first submit button
+    counts as the one that was clicked.
+    """
+    from bs4 import BeautifulSoup
+
+    form = BeautifulSoup(html, features="html.parser").find("form")
+    if form is None:
+        raise Exception(f"No form found on page: {url}")
+
+    fields: dict[str, str] = {}
+    clicked = False
+    for control in form.find_all(["input", "select", "textarea"]):
+        name = control.get("name")
+        if not name:
+            continue
+        type_ = control.get("type", "text").lower()
+
+        if control.name == "select":
+            option = control.find("option", selected=True) or control.find("option")
+            if option is not None:
+                fields[name] = option.get("value", option.text)
+        elif control.name == "textarea":
+            fields[name] = control.text
+        elif type_ in ("checkbox", "radio"):
+            if control.has_attr("checked"):
+                fields[name] = control.get("value", "on")
+        elif type_ == "submit":
+            if not clicked:
+                fields[name] = control.get("value", "")
+                clicked = True
+        elif type_ == "image":
+            if not clicked:
+                fields[f"{name}.x"] = "1"
+                fields[f"{name}.y"] = "1"
+                clicked = True
+        elif type_ not in ("button", "reset", "file"):
+            fields[name] = control.get("value", "")
+
+    return urljoin(url, form.get("action", "")), fields
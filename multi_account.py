@@ -0,0 +1,124 @@
+from libs.accounts import MAX_WORKERS, load_accounts, run_accounts
+from pendulum import DateTime
+import click
+import sys
+
+# The tasks import what they need themselves, once they're running in the
+# account's process, so this one doesn't load anything it won't use.
+
+
+def sync_task(weeks: list[DateTime], replace: bool, force: bool, metrics_out):
+    import schedule_to_calendar
+
+    schedule_to_calendar.sync_weeks(weeks, replace, force, metrics_out)
+
+
+def auto_schedule_task(metrics_out):
+    import auto_scheduler
+
+    auto_scheduler.METRICS_OUT = metrics_out
+    auto_scheduler.main()
+
+
+@click.group(
+    help=(
+        "Run for many tutors at once. ACCOUNTS is a directory with one "
+        "subdirectory per tutor (each with its own secrets folder), or a JSON "
+        "manifest listing those directories."
+    )
+)
+@click.argument("accounts", type=click.Path(exists=True))
+@click.option(
+    "--workers",
+    default=MAX_WORKERS,
+    type=click.IntRange(min=1),
+    help="How many tutors to work on at the same time.",
+)
+@click.option(
+    "--metrics-out",
+    default=None,
+    help=(
+        "Write each tutor's timing metrics to this file, in their own "
+        "directory: in Prometheus' text format if it ends in .prom, "
+        "otherwise as JSON."
+    ),
+)
+@click.pass_context
+def cli(ctx, accounts: str, workers: int, metrics_out: str | None):
+    ctx.obj = {
+        "accounts": load_accounts(accounts),
+        "workers": workers,
+        "metrics_out": metrics_out,
+    }
+    if not ctx.obj["accounts"]:
+        raise click.UsageError(f"No accounts found in {accounts}.")
+
+
+@cli.command(help="Add every tutor's schedule to their calendar.")
+@click.option("--next", is_flag=True, help="Start with next week's schedule.")
+@click.option(
+    "--weeks",
+    default=1,
+    type=click.IntRange(min=1),
+    help="How many weeks to add, starting with the current (or next) week.",
+)
+@click.option(
+    "--replace",
+    is_flag=True,
+    help="Delete every event in the weeks and re-add them all.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Sync even the weeks that haven't changed since last time.",
+)
+@click.pass_obj
+def sync(obj: dict, next: bool, weeks: int, replace: bool, force: bool):
+    first_week = DateTime.now().add(weeks=1 if next else 0).start_of("week")
+    run(
+        obj,
+        sync_task,
+        weeks=[first_week.add(weeks=i) for i in range(weeks)],
+        replace=replace,
+        force=force,
+        metrics_out=obj["metrics_out"],
+    )
+
+
+@cli.command(
+    "auto-schedule", help="Sign every tutor up for next week's hours when released."
+)
+@click.pass_obj
+def auto_schedule(obj: dict):
+    if obj["workers"] < len(obj["accounts"]):
+        # the rest only get started once the first ones are done, long after
+        # the hours have been released
+        print(
+            f"Warning: only {obj['workers']} of {len(obj['accounts'])} tutors "
+            "will be waiting when the hours are released. Pass a bigger "
+            "--workers to sign them all up at once."
+        )
+    run(obj, auto_schedule_task, metrics_out=obj["metrics_out"])
+
+
+def run(obj: dict, task, **kwargs):
+    accounts = obj["accounts"]
+    print(f"Running for {len(accounts)} tutors, {obj['workers']} at a time.")
+    failed = []
+    for result in run_accounts(accounts, task, obj["workers"], **kwargs):
+        status = "done" if result.ok else "FAILED"
+        print(f"==> {result.account.name}: {status} in {result.seconds:.1f}s")
+        if result.output:
+            print(result.output.rstrip())
+        if not result.ok:
+            print(result.error.rstrip())
+            failed.append(result.account.name)
+
+    if failed:
+        print(f"{len(failed)} of {len(accounts)} tutors failed: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"All {len(accounts)} tutors done.")
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,4 +1,6 @@
-from libs import tutor_api, calendar_api
+from libs import metrics, tutor_api, calendar_api
+from libs.calendar_mirror import CalendarMirror
+from libs.snapshot_store import SnapshotStore, week_key
 import pendulum
 from pendulum import DateTime
 from datetime import datetime
@@ -19,40 +21,259 @@ import click
         "03/23/2022, or 11/09/2023. If --next was provided, this option is ignored."
     ),
 )
-def add_week_command(next: bool, week: datetime | None):
-    week_to_add = DateTime.now()
-    if next:
-        week_to_add = DateTime.now().add(weeks=1)
+@click.option(
+    "--weeks",
+    default=1,
+    type=click.IntRange(min=1),
+    help=(
+        "How many weeks to add, starting with the current week (or the one "
+        "picked with --next, --week or --from)."
+    ),
+)
+@click.option(
+    "--from",
+    "from_",
+    default=None,
+    type=click.DateTime(["%m/%d/%Y"]),
+    help="A date within the first week of a range of weeks to add, as MM/DD/YYYY.",
+)
+@click.option(
+    "--to",
+    default=None,
+    type=click.DateTime(["%m/%d/%Y"]),
+    help=(
+        "A date within the last week of a range of weeks to add, as MM/DD/YYYY. "
+        "Can't be combined with --weeks."
+    ),
+)
+@click.option(
+    "--replace",
+    is_flag=True,
+    help=(
+        "Delete every event in the week and re-add them all, instead of only "
+        "making the changes needed to bring the calendar up to date."
+    ),
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help=(
+        "Sync the calendar even if the schedule hasn't changed since the last "
+        "time it was synced, and read the whole calendar again rather than "
+        "only what changed."
+    ),
+)
+@click.option(
+    "--metrics-out",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help=(
+        "Write how long each part of the run took to this file: in "
+        "Prometheus' text format if it ends in .prom, otherwise as JSON."
+    ),
+)
+def add_week_command(
+    next: bool,
+    week: datetime | None,
+    weeks: int,
+    from_: datetime | None,
+    to: datetime | None,
+    replace: bool,
+    force: bool,
+    metrics_out: str | None,
+):
+    first_week = DateTime.now()
+    if from_:
+        first_week = pendulum.parse(from_.isoformat())
+    elif next:
+        first_week = DateTime.now().add(weeks=1)
     elif week:
         # Convert built-in DateTime to Pendulum's DateTime
-        week_to_add = pendulum.parse(week.isoformat())
-    add_week_to_calendar(week_to_add)
+        first_week = pendulum.parse(week.isoformat())
+    first_week = first_week.start_of("week")
+
+    if to:
+        if weeks != 1:
+            raise click.UsageError("--to and --weeks can't be used together.")
+        last_week = pendulum.parse(to.isoformat()).start_of("week")
+        if last_week < first_week:
+            raise click.UsageError("--to must not be before the first week.")
+        weeks = (last_week - first_week).in_weeks() + 1
 
+    weeks_to_add = [first_week.add(weeks=i) for i in range(weeks)]
+    sync_weeks(weeks_to_add, replace, force, metrics_out)
     print("It worked! Probably!")
 
 
-def add_week_to_calendar(week: DateTime):
+def sync_weeks(
+    weeks: list[DateTime], replace=False, force=False, metrics_out: str | None = None
+):
+    """
+    Sync the weeks with add_weeks_to_calendar(), using the snapshot store and
+    calendar mirror in the secrets folder, then write out the metrics.
+    """
+    store = SnapshotStore()
+    mirror = CalendarMirror()
+    try:
+        add_weeks_to_calendar(
+            weeks, replace=replace, store=store, force=force, mirror=mirror
+        )
+    finally:
+        store.close()
+        mirror.close()
+        if metrics_out:
+            metrics.registry.write(metrics_out)
+
+
+def add_week_to_calendar(week: DateTime, replace=False):
     """
     For the current or specified week, put all scheduled tutoring times
     into your Google calendar.
+
+    By default, the events already in the calendar are compared against the
+    schedule, and only the inserts, deletes and patches that are needed get
+    sent. With `replace`, the whole week is deleted and re-added instead.
+    """
+    add_weeks_to_calendar([week], replace=replace)
+
+
+def add_weeks_to_calendar(
+    weeks: list[DateTime],
+    replace=False,
+    store: SnapshotStore | None = None,
+    force=False,
+    mirror: CalendarMirror | None = None,
+):
+    """
+    Like add_week_to_calendar(), but for several weeks at once. It only
+    logs in once, fetches all the weeks' pages in parallel, and syncs
+    them to the calendar in one combined pass.
+
+    If a snapshot store is given, weeks whose schedule hasn't changed since
+    the last run are skipped: an identical page isn't even parsed. With
+    `force` (or `replace`), every week is synced regardless.
+
+    Weeks whose events were all written successfully to the same calendar
+    last time are synced by event ID: the events that aren't wanted anymore are
+    deleted by ID, and new ones are added, without reading the calendar at
+    all. Other weeks (and every week, with `force` or `replace`) are
+    compared against what's in the calendar now.
+
+    If a calendar mirror is given, the events already in the calendar are
+    read from it, after fetching only what changed since last time. With
+    `force` (or `replace`), the mirror is rebuilt from scratch.
     """
-    page_data = tutor_api.login_and_get_html()
-    if week:  # currently unneeded, need to improve backend
-        page_data = tutor_api.get_html_for_week(week)
+    skip_unchanged = store is not None and not (force or replace)
+    pages = tutor_api.login_and_get_html_for_weeks(weeks)
+
+    changed: list[tuple[DateTime, str, tutor_api.Schedule]] = []
+    for week, page_data in zip(weeks, pages):
+        if skip_unchanged and store.page_unchanged(week, page_data):
+            continue
+        schedule = tutor_api.Schedule(page_data)
+        if skip_unchanged and store.grid(week) == schedule.grid:
+            store.save(week, page_data, schedule)
+            continue
+        changed.append((week, page_data, schedule))
+
+    if not changed:
+        print("No changes to the schedule since last time.")
+        return
+
+    # Weeks we've synced before can be synced by event ID, without reading
+    # the calendar. The rest have to be compared against what's there.
+    by_id: list[tuple[tutor_api.Schedule, tutor_api.Schedule]] = []
+    by_reading: list[tuple[DateTime, tutor_api.Schedule]] = []
+    calendar_id = calendar_api.get_credentials()["calendar_id"]
+    for week, _, schedule in changed:
+        previous = None
+        if store is not None and not (force or replace):
+            previous = store.calendar_grid(week, calendar_id)
+        if previous is not None:
+            previous = tutor_api.Schedule.from_grid(schedule.week, previous)
+            by_id.append((previous, schedule))
+        else:
+            by_reading.append((week, schedule))
+
+    failed = 0
+    if by_id:
+        changes = calendar_api.sync_events_by_id(
+            simple_events(schedule for _, schedule in by_id),
+            simple_events(previous for previous, _ in by_id),
+        )
+        report(changes)
+        failed += changes["failed"]
+    if by_reading:
+        failed += sync_by_reading(by_reading, replace, force, mirror)
+
+    if not store:
+        return
+    if failed:
+        # leave the snapshots alone, so the next run tries these weeks again
+        print(f"{failed} calendar changes failed, they'll be retried next time.")
+        return
+    for week, page_data, schedule in changed:
+        store.save(week, page_data, schedule)
+        store.save_calendar_grid(week, schedule.grid, calendar_id)
+
 
-    schedule = tutor_api.Schedule(page_data)
-    simple_events = schedule.to_simple_events()
+def simple_events(schedules) -> list[calendar_api.SimpleEvent]:
+    """Merge the events for all days of all the schedules."""
+    return [
+        event
+        for schedule in schedules
+        for day_sched in schedule.to_simple_events().values()
+        for event in day_sched
+    ]
+
+
+def report(changes: dict):
+    print(
+        f"Inserted {changes['inserted']}, deleted {changes['deleted']} "
+        f"and patched {changes['patched']} events."
+    )
+
+
+def sync_by_reading(
+    changed: list[tuple[DateTime, tutor_api.Schedule]],
+    replace: bool,
+    force: bool,
+    mirror: CalendarMirror | None,
+) -> int:
+    """
+    Sync the weeks by reading the events that are in the calendar now, and
+    return how many changes failed.
+    """
+    all_events = simple_events(schedule for _, schedule in changed)
 
-    # merge the schedule lists for all days
-    whole_week = []
-    for day_sched in simple_events.values():
-        whole_week.extend(day_sched)
+    # go by the schedules' own weeks, in their timezone, since the calendar
+    # can hand times back in any offset
+    schedule_weeks = [schedule.week for _, schedule in changed]
+    timezone = schedule_weeks[0].timezone
+    start = min(schedule_weeks).start_of("week")
+    end = max(schedule_weeks).end_of("week")
+    if mirror is not None:
+        mirror.refresh(full=force or replace)
+        existing = mirror.events_between(start, end)
+    else:
+        existing = calendar_api.get_events_between(start, end)
+    # leave alone any weeks in that range that didn't change
+    changed_weeks = {week_key(week) for week in schedule_weeks}
+    existing = [
+        event
+        for event in existing
+        if week_key(calendar_api.event_start(event).in_timezone(timezone))
+        in changed_weeks
+    ]
 
-    # first delete the existing events for that week
-    calendar_api.delete_all_events(calendar_api.get_events_for_week(week))
+    if not replace:
+        changes = calendar_api.sync_events(all_events, existing)
+        report(changes)
+        return changes["failed"]
 
-    # add the new events
-    calendar_api.add_events(whole_week)
+    # first delete the existing events for those weeks, then add the new ones
+    failures = calendar_api.delete_all_events(existing)
+    return len(failures) + len(calendar_api.add_events(all_events))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,20 @@
+"""
+Tasks for test_accounts.py to run in libs.accounts' worker processes. They
+have to live in a module the workers can import by name.
+"""
+
+import os
+
+
+def log_in(base_urls: dict[str, str]) -> dict:
+    """Log in to the account's fake server, and say who and where we were."""
+    from libs import tutor_api
+
+    tutor_api.BASE_URL = base_urls[os.path.basename(os.getcwd())]
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    print(f"Logged in as {tutor_api.get_credentials()['username']}")
+    return {
+        "pid": os.getpid(),
+        "hours": schedule.hours_scheduled,
+        "saved_session": os.path.exists(tutor_api.SESSION_FILE),
+    }
@@ -0,0 +1,16 @@
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+from libs import calendar_api
+from tests.fake_calendar import FakeCalendarServer
+
+
+@pytest.fixture
+def calendar_server(monkeypatch):
+    """Point calendar_api at a fake Calendar API, with a calendar called "test"."""
+    with FakeCalendarServer(page_size=3) as server:
+        monkeypatch.setattr(calendar_api, "API_ROOT", server.url)
+        monkeypatch.setattr(calendar_api, "creds", AnonymousCredentials())
+        monkeypatch.setattr(calendar_api, "service", None)
+        monkeypatch.setattr(calendar_api, "credentials", {"calendar_id": "test"})
+        yield server
@@ -0,0 +1,373 @@
+"""
+A local stand-in for the parts of the Google Calendar v3 API calendar_api
+uses: listing events (with pagination), inserting, patching and deleting
+them, and batches of those. Responses can be slowed down, and requests can
+randomly get the same 403 Google sends when it's rate limiting.
+
+It also counts requests and the bytes in request and response bodies, so
+it can tell how much work a sync actually took. Point calendar_api at it
+by setting calendar_api.API_ROOT to FakeCalendarServer.url (and building
+a fresh service).
+"""
+
+import copy
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from zoneinfo import ZoneInfo
+
+# Google's own limits
+BATCH_LIMIT = 50
+PAGE_SIZE = 250
+
+EVENTS_PATH = re.compile(r"^/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$")
+BATCH_PATH = "/batch/calendar/v3"
+RATE_LIMITED = {
+    "error": {
+        "errors": [
+            {
+                "domain": "usageLimits",
+                "reason": "rateLimitExceeded",
+                "message": "Rate Limit Exceeded",
+            }
+        ],
+        "code": 403,
+        "message": "Rate Limit Exceeded",
+    }
+}
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden"}
+
+
+def parse_time(time: dict | str) -> datetime:
+    """
+    Parse an RFC 3339 timestamp, or the API's {"dateTime": ...} dict. Like
+    Google, a dateTime without an offset is read in the dict's timeZone.
+    """
+    zone = timezone.utc
+    if isinstance(time, dict):
+        if time.get("timeZone"):
+            zone = ZoneInfo(time["timeZone"])
+        time = time.get("dateTime") or time["date"]
+    parsed = datetime.fromisoformat(time)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=zone)
+    return parsed
+
+
+def resolve_times(event: dict):
+    """
+    Write the event's times the way Google hands them back: in its timeZone,
+    with the offset spelled out, whatever form they were sent in.
+    """
+    for key in ("start", "end"):
+        time = event.get(key)
+        if time and "dateTime" in time:
+            parsed = parse_time(time)
+            if time.get("timeZone"):
+                parsed = parsed.astimezone(ZoneInfo(time["timeZone"]))
+            time["dateTime"] = parsed.isoformat()
+
+
+def error(status: int, message: str) -> tuple[int, dict]:
+    return status, {"error": {"errors": [], "code": status, "message": message}}
+
+
+class FakeCalendarServer:
+    """
+    Events are kept per calendar ID, and deleted ones stick around marked
+    "cancelled", like Google does. Every sub-request (whether it came on its
+    own or in a batch) has a `rate_limit` chance of getting a 403
+    rateLimitExceeded instead. `page_size` caps how many events one list
+    response has, so pagination can be tested without thousands of events.
+
+    Listing hands out sync tokens, which are just a count of changes so far,
+    and listing with one returns every event (deleted or not) changed since.
+    expire_sync_tokens() makes the ones handed out so far go stale, so they
+    get a 410, like Google's do after a while.
+    """
+
+    def __init__(self, latency=0.0, rate_limit=0.0, page_size=PAGE_SIZE, seed=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.page_size = page_size
+        self.calendars: dict[str, dict[str, dict]] = {}
+        # how many changes there have been, and the change each event was
+        # last touched by
+        self.version = 0
+        self.versions: dict[tuple[str, str], int] = {}
+        self.oldest_sync_token = 0
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        # HTTP requests by kind, and calls by operation (batched or not)
+        self.requests: Counter[str] = Counter()
+        self.calls: Counter[str] = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+        self.httpd = FakeHTTPServer(("127.0.0.1", 0), FakeCalendarHandler)
+        self.httpd.fake = self
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, args=(0.05,), daemon=True
+        )
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.calls.clear()
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "http_requests": sum(self.requests.values()),
+                "calls": sum(self.calls.values()),
+                **{f"{kind}_requests": n for kind, n in self.requests.items()},
+                **{f"{op}_calls": n for op, n in self.calls.items()},
+                "bytes_received": self.bytes_received,
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def expire_sync_tokens(self):
+        with self.lock:
+            self.oldest_sync_token = self.version + 1
+
+    def events(self, calendar_id="primary") -> list[dict]:
+        """The calendar's events that haven't been deleted, by start time."""
+        with self.lock:
+            events = self.calendars.get(calendar_id, {}).values()
+            return sorted(
+                (e for e in events if e["status"] != "cancelled"),
+                key=lambda e: parse_time(e["start"]),
+            )
+
+    def handle(
+        self, method: str, path: str, query: dict[str, str], body: bytes
+    ) -> tuple[int, dict | None]:
+        """Carry out one API call, and return the status and JSON response."""
+        m = EVENTS_PATH.match(path)
+        if m is None:
+            return error(404, "Not Found")
+        calendar_id = unquote(m.group(1))
+        event_id = m.group(2) and unquote(m.group(2))
+        op = {
+            ("GET", False): "list",
+            ("POST", False): "insert",
+            ("GET", True): "get",
+            ("PATCH", True): "patch",
+            ("DELETE", True): "delete",
+        }.get((method, event_id is not None))
+        if op is None:
+            return error(405, "Method Not Allowed")
+
+        with self.lock:
+            self.calls[op] += 1
+            if self.rate_limit and self.rng.random() < self.rate_limit:
+                return 403, RATE_LIMITED
+            data = json.loads(body) if body else {}
+            status, result = self.call(op, calendar_id, event_id, query, data)
+            # the stored events can change as soon as the lock's released
+            return status, copy.deepcopy(result)
+
+    def call(
+        self, op: str, calendar_id: str, event_id, query: dict, data: dict
+    ) -> tuple[int, dict | None]:
+        events = self.calendars.setdefault(calendar_id, {})
+        if op == "list":
+            return self.list_events(calendar_id, query)
+        if op == "insert":
+            status, event = self.insert_event(events, data)
+            if status == 200:
+                self.touch(calendar_id, event)
+            return status, event
+
+        event = events.get(event_id)
+        if event is None:
+            return error(404, "Not Found")
+        if op == "get":
+            return 200, event
+        if op == "patch":
+            # this is also how deleted events get brought back
+            event.update(copy.deepcopy(data))
+            resolve_times(event)
+            self.touch(calendar_id, event)
+            return 200, event
+        if event["status"] == "cancelled":
+            return error(410, "Resource has been deleted")
+        event["status"] = "cancelled"
+        self.touch(calendar_id, event)
+        return 204, None
+
+    def touch(self, calendar_id: str, event: dict):
+        self.version += 1
+        self.versions[(calendar_id, event["id"])] = self.version
+        event["updated"] = datetime.now(timezone.utc).isoformat()
+
+    def list_events(self, calendar_id: str, query: dict[str, str]) -> tuple[int, dict]:
+        events = self.calendars[calendar_id]
+        matching = sorted(events.values(), key=lambda e: parse_time(e["start"]))
+        if "syncToken" in query:
+            if {"timeMin", "timeMax", "orderBy"} & query.keys():
+                return error(400, "Sync token can't be combined with filters.")
+            since = int(query["syncToken"])
+            if since < self.oldest_sync_token:
+                return error(410, "Sync token is no longer valid.")
+            matching = [
+                e for e in matching if self.versions[(calendar_id, e["id"])] > since
+            ]
+        elif query.get("showDeleted") != "true":
+            matching = [e for e in matching if e["status"] != "cancelled"]
+        if "timeMin" in query:
+            time_min = parse_time(query["timeMin"])
+            matching = [e for e in matching if parse_time(e["end"]) > time_min]
+        if "timeMax" in query:
+            time_max = parse_time(query["timeMax"])
+            matching = [e for e in matching if parse_time(e["start"]) < time_max]
+
+        page_size = min(int(query.get("maxResults", PAGE_SIZE)), self.page_size)
+        offset = int(query.get("pageToken", 0))
+        result = {
+            "kind": "calendar#events",
+            "items": matching[offset : offset + page_size],
+        }
+        if offset + page_size < len(matching):
+            result["nextPageToken"] = str(offset + page_size)
+        else:
+            result["nextSyncToken"] = str(self.version)
+        return 200, result
+
+    def insert_event(self, events: dict[str, dict], data: dict) -> tuple[int, dict]:
+        event_id = data.get("id") or secrets.token_hex(13)
+        if event_id in events:
+            return error(409, "The requested identifier already exists.")
+        event = {
+            "kind": "calendar#event",
+            "status": "confirmed",
+            **copy.deepcopy(data),
+            "id": event_id,
+        }
+        resolve_times(event)
+        events[event_id] = event
+        return 200, event
+
+    def handle_batch(self, content_type: str, body: bytes) -> tuple[int, bytes, str]:
+        """
+        Carry out every request in a multipart/mixed batch, and build the
+        multipart/mixed response, with each part's Content-ID answered by
+        "response-" plus that ID.
+        """
+        message = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        parts = message.get_payload()
+        boundary = f"batch_{secrets.token_hex(8)}"
+        if len(parts) > BATCH_LIMIT:
+            status, result = error(400, "Too many requests in batch.")
+            return status, json.dumps(result).encode(), "application/json"
+
+        responses = []
+        for part in parts:
+            request = part.get_payload().encode().replace(b"\r\n", b"\n")
+            head, _, sub_body = request.partition(b"\n\n")
+            method, target, _version = head.splitlines()[0].decode().split(" ", 2)
+            url = urlparse(target)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, result = self.handle(method, url.path, query, sub_body.strip())
+            payload = b"" if result is None else json.dumps(result).encode()
+            responses.append(
+                (
+                    f"--{boundary}\r\n"
+                    "Content-Type: application/http\r\n"
+                    f"Content-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                    "Content-Type: application/json; charset=UTF-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n"
+                ).encode()
+                + payload
+                + b"\r\n"
+            )
+        content = b"".join(responses) + f"--{boundary}--\r\n".encode()
+        return 200, content, f"multipart/mixed; boundary={boundary}"
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def fake(self) -> FakeCalendarServer:
+        return self.server.fake
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_PATCH(self):
+        self.dispatch()
+
+    def do_DELETE(self):
+        self.dispatch()
+
+    def dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        kind = "batch" if url.path == BATCH_PATH else "single"
+        with self.fake.lock:
+            self.fake.requests[kind] += 1
+            self.fake.bytes_received += len(body)
+
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        if kind == "batch":
+            status, content, content_type = self.fake.handle_batch(
+                self.headers["Content-Type"], body
+            )
+            self.respond(status, content, content_type)
+        else:
+            status, result = self.fake.handle(self.command, url.path, query, body)
+            content = b"" if result is None else json.dumps(result).encode()
+            self.respond(status, content, "application/json; charset=UTF-8")
+
+    def respond(self, status: int, content: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        with self.fake.lock:
+            self.fake.bytes_sent += len(content)
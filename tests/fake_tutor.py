@@ -0,0 +1,274 @@
+"""
+A local stand-in for the tutor.com ScheduleManager_v2 pages, good enough
+to run tutor_api and the auto scheduler against: the login form, the
+schedule page for any week, and SchedulerWorker.aspx for setting and
+removing hours. Responses can be slowed down, hours can be locked until
+a release time, and "other tutors" can snap up released hours.
+
+Point tutor_api at it by setting tutor_api.BASE_URL to FakeTutorServer.url.
+"""
+
+import ast
+import random
+import re
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TEMPLATE_PAGE = "tests/page_data/schedule.html"
+PAGE_PATH = "/nGEN/Tools/ScheduleManager_v2/"
+CELL_PATTERN = re.compile(rb"fillCell\('[^']*', '(\d+)', '[^']*', '[^']*'\)")
+COLORS = {"Available": "#E5E5C3", "Scheduled!": "#99CC99", "": "#BBBBBB"}
+
+LOGIN_PAGE = b"""<html><body>
+<form method="post" action="setContactID.aspx?{query}" id="Form1">
+<input type="hidden" name="__VIEWSTATE" value="dDwtMTA4NzI0NTUwNDs7Pg==" />
+<input name="txtUserName" type="text" id="txtUserName" />
+<input name="txtPassword" type="password" id="txtPassword" />
+<input type="submit" name="btnLogin" value="Log In" id="btnLogin" />
+</form></body></html>"""
+
+Slot = tuple[int, int]
+
+
+def week_start(day: date) -> date:
+    """The Sunday that starts the week `day` is in."""
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+def parse_date(text: str) -> date:
+    month, day, year = (int(part) for part in text.split("/"))
+    return date(year, month, day)
+
+
+def parse_hour(text: str) -> int:
+    """Turn "9PM" or "12AM" back into 0-23."""
+    hour = int(text[:-2]) % 12
+    return hour + 12 if text[-2:].upper() == "PM" else hour
+
+
+class FakeTutorServer:
+    """
+    `schedule` maps a week's start date to the {(day, hour): status} of its
+    hours, where status is "Available" or "Scheduled!" (ours). Hours in
+    `released` show up as Available too, but can't be scheduled until
+    `release_at` (a time.time() timestamp). Each released hour has a
+    `competition` chance of being taken by another tutor at a random time
+    within `reaction_time` seconds of the release, after which it's gone.
+    """
+
+    def __init__(
+        self,
+        schedule: dict[date, dict[Slot, str]] | None = None,
+        released: dict[date, set[Slot]] | None = None,
+        release_at: float = 0.0,
+        competition: float = 0.0,
+        reaction_time: float = 0.5,
+        latency: float = 0.0,
+        username="tutor",
+        password="hunter2",
+        seed=0,
+    ):
+        self.schedule = {week: dict(hours) for week, hours in (schedule or {}).items()}
+        self.released = released or {}
+        self.release_at = release_at
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.sessions: set[str] = set()
+        self.requests: Counter[str] = Counter()
+        self.lock = threading.Lock()
+
+        # decide up front which released hours other tutors will take, and when
+        rng = random.Random(seed)
+        self.taken_at: dict[tuple[date, Slot], float] = {}
+        for week, slots in self.released.items():
+            for slot in sorted(slots):
+                if rng.random() < competition:
+                    taken_at = release_at + rng.uniform(0, reaction_time)
+                    self.taken_at[(week, slot)] = taken_at
+
+        with open(TEMPLATE_PAGE) as f:
+            # the fixture is the repr of the page's bytes
+            self.template = ast.literal_eval(f.read())
+
+        self.httpd = FakeHTTPServer(("127.0.0.1", 0), FakeTutorHandler)
+        self.httpd.fake = self
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, args=(0.05,), daemon=True
+        )
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def credentials(self) -> dict:
+        """What to put in tutor_api.credentials to log in to this server."""
+        return {
+            "username": self.username,
+            "password": self.password,
+            "program_id": "fake-program",
+            "user_id": "fake-user",
+        }
+
+    def status(self, week: date, slot: Slot) -> str:
+        """The status of an hour right now, as the page would show it."""
+        status = self.schedule.get(week, {}).get(slot, "")
+        if status == "Scheduled!":
+            return status
+        if slot in self.released.get(week, ()):
+            taken_at = self.taken_at.get((week, slot))
+            if taken_at is None or time.time() < taken_at:
+                return "Available"
+        return status
+
+    def ours(self, week: date) -> set[Slot]:
+        hours = self.schedule.get(week, {})
+        return {slot for slot, status in hours.items() if status == "Scheduled!"}
+
+    def render_schedule(self, week: date) -> bytes:
+        def fill_cell(m):
+            index = int(m.group(1))
+            status = self.status(week, (index % 7, index // 7))
+            return f"fillCell('{COLORS[status]}', '{index}', '{status}', '')".encode()
+
+        page = CELL_PATTERN.sub(fill_cell, self.template)
+        end = week + timedelta(days=6)
+        page = re.sub(
+            rb"loadWeek\('[^']*', '[^']*', 'WEEK OF [^']*'\)",
+            (
+                f"loadWeek('{week:%m/%d/%Y}', '{end - timedelta(days=1):%m/%d/%Y}', "
+                f"'WEEK OF {week:%m/%d/%Y} - {end:%m/%d/%Y}')"
+            ).encode(),
+            page,
+        )
+        return re.sub(
+            rb'(<span id="lblScheduledHours">)\d+(</span>)',
+            rb"\g<1>%d\g<2>" % len(self.ours(week)),
+            page,
+        )
+
+    def set_hour(self, week: date, slot: Slot, unset: bool) -> bool:
+        with self.lock:
+            hours = self.schedule.setdefault(week, {})
+            if unset:
+                if hours.get(slot) != "Scheduled!":
+                    return False
+                # dropping an hour makes it available to everyone again
+                hours[slot] = "Available"
+                return True
+            if self.status(week, slot) != "Available":
+                return False
+            if slot in self.released.get(week, ()) and time.time() < self.release_at:
+                return False
+            hours[slot] = "Scheduled!"
+            return True
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections when the scheduler opens a
+    # few dozen at once, and the retries take a whole second
+    request_queue_size = 128
+
+
+class FakeTutorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # otherwise Nagle's algorithm and delayed ACKs add ~40 ms to keep-alive
+    # responses that take more than one write
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def fake(self) -> FakeTutorServer:
+        return self.server.fake
+
+    def do_HEAD(self):
+        self.fake.requests["HEAD"] += 1
+        self.respond(b"", include_body=False)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == PAGE_PATH + "setContactID.aspx":
+            self.fake.requests["login page"] += 1
+            self.respond(LOGIN_PAGE.replace(b"{query}", url.query.encode()))
+        elif url.path == PAGE_PATH + "default.aspx":
+            self.fake.requests["week"] += 1
+            if not self.logged_in():
+                self.respond(LOGIN_PAGE.replace(b"{query}", b""))
+                return
+            week = week_start(parse_date(query["SelectedDate"]))
+            self.respond(self.fake.render_schedule(week))
+        else:
+            self.respond(b"Not found", status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+
+        if url.path == PAGE_PATH + "setContactID.aspx":
+            self.fake.requests["login"] += 1
+            if (
+                form.get("txtUserName") != self.fake.username
+                or form.get("txtPassword") != self.fake.password
+                or "__VIEWSTATE" not in form
+            ):
+                self.respond(LOGIN_PAGE.replace(b"{query}", url.query.encode()))
+                return
+            token = secrets.token_hex(8)
+            self.fake.sessions.add(token)
+            week = week_start(date.today())
+            self.respond(
+                self.fake.render_schedule(week),
+                cookie=f"ASP.NET_SessionId={token}; path=/; HttpOnly",
+            )
+        elif url.path == PAGE_PATH + "SchedulerWorker.aspx":
+            self.fake.requests["schedule hour"] += 1
+            if not self.logged_in():
+                self.respond(LOGIN_PAGE.replace(b"{query}", b""))
+                return
+            week = parse_date(query["Week"])
+            slot = (int(query["WeekDay"]) - 1, parse_hour(query["Hour"]))
+            success = self.fake.set_hour(week, slot, query["Type"] == "Remove")
+            self.respond(b"ScheduleSelectedComplete(%d);" % success)
+        else:
+            self.respond(b"Not found", status=404)
+
+    def logged_in(self) -> bool:
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        session = cookie.get("ASP.NET_SessionId")
+        return session is not None and session.value in self.fake.sessions
+
+    def respond(self, body: bytes, status=200, cookie=None, include_body=True):
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
@@ -0,0 +1,86 @@
+import json
+from datetime import date
+
+import pytest
+
+from libs.accounts import Account, load_accounts, run_accounts
+from tests import account_tasks
+from tests.fake_tutor import FakeTutorServer, week_start
+
+WEEK = week_start(date.today())
+
+
+def make_account(root, name: str, server: FakeTutorServer):
+    secrets = root / name / "secrets"
+    secrets.mkdir(parents=True)
+    credentials = {**server.credentials, "calendar_id": f"{name}-calendar"}
+    (secrets / "login_credentials.json").write_text(json.dumps(credentials))
+
+
+def test_load_accounts(tmp_path):
+    for name in ("bob", "alice"):
+        (tmp_path / name / "secrets").mkdir(parents=True)
+        (tmp_path / name / "secrets" / "login_credentials.json").write_text("{}")
+    (tmp_path / "not-an-account").mkdir()
+
+    accounts = load_accounts(str(tmp_path))
+    assert [account.name for account in accounts] == ["alice", "bob"]
+    assert accounts[0].path == str(tmp_path / "alice")
+
+    manifest = tmp_path / "accounts.json"
+    manifest.write_text(
+        json.dumps({"accounts": [{"name": "a", "path": "alice"}, {"path": "bob"}]})
+    )
+    assert load_accounts(str(manifest)) == [
+        Account("a", str(tmp_path / "alice")),
+        Account("bob", str(tmp_path / "bob")),
+    ]
+
+    manifest.write_text(json.dumps({"accounts": [{"path": "bob"}, {"path": "bob"}]}))
+    with pytest.raises(Exception, match="unique"):
+        load_accounts(str(manifest))
+
+
+def test_accounts_are_isolated(tmp_path):
+    servers = {
+        "alice": FakeTutorServer(
+            schedule={WEEK: {(1, 9): "Scheduled!"}}, username="alice"
+        ),
+        "bob": FakeTutorServer(
+            schedule={WEEK: {(1, 9): "Scheduled!", (2, 9): "Scheduled!"}},
+            username="bob",
+        ),
+        "carol": FakeTutorServer(username="carol"),
+    }
+    for name, server in servers.items():
+        server.start()
+        make_account(tmp_path, name, server)
+    # carol's password is wrong, which shouldn't get in anyone else's way
+    servers["carol"].password = "something else"
+
+    try:
+        results = {
+            result.account.name: result
+            for result in run_accounts(
+                load_accounts(str(tmp_path)),
+                account_tasks.log_in,
+                max_workers=2,
+                base_urls={name: server.url for name, server in servers.items()},
+            )
+        }
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    assert results["alice"].ok and results["bob"].ok
+    assert results["alice"].result["hours"] == 1
+    assert results["bob"].result["hours"] == 2
+    assert results["alice"].output == "Logged in as alice\n"
+    # every account got its own process, and its own saved session
+    assert results["alice"].result["pid"] != results["bob"].result["pid"]
+    assert results["alice"].result["saved_session"]
+    assert (tmp_path / "bob" / "secrets" / "tutor_session.json").exists()
+    assert servers["alice"].requests["login"] == 1
+
+    assert not results["carol"].ok
+    assert "username or password" in results["carol"].error
@@ -1,11 +1,14 @@
+import time
+
+from pendulum import DateTime
+
 import auto_scheduler
 from libs import tutor_api
+from libs.server_clock import ClockEstimate
 
 
 class MockResponse:
-    @staticmethod
-    def get_data(*args, **kwargs):
-        return b"ScheduleSelectedComplete(1);"
+    content = b"ScheduleSelectedComplete(1);"
 
 
 def create_test_schedule():
@@ -14,20 +17,84 @@ def create_test_schedule():
 
     # create blank schedule
     sched = tutor_api.Schedule(html)
-    for day in list(sched.keys()):
-        sched._schedule[day] = {hour: "Available" for hour in range(24)}
+    for day in range(7):
+        sched.grid.scheduled[day] = 0
+        sched.grid.available[day] = (1 << 24) - 1
     return sched
 
 
 def test_auto_scheduler(monkeypatch):
-    def mock_open(*args, **kwargs):
-        print(args[0].get_full_url())
+    def mock_post(*args, **kwargs):
+        print(args[0])
 
         return MockResponse()
 
-    monkeypatch.setattr(auto_scheduler.tutor_api.br, "open", mock_open)
+    monkeypatch.setattr(auto_scheduler.tutor_api.session, "post", mock_post)
     s = create_test_schedule()
     print(s.ascii_display())
 
     auto_scheduler.get_hours_to_schedule(s)
     print(s.ascii_display())
+
+
+def test_grab_hours_fires_concurrently(monkeypatch):
+    def mock_schedule_hour(armed, day, hour, unset=False):
+        time.sleep(0.2)
+        if hour == 13:
+            raise Exception("Unforeseen response: b'?'")
+        return day != 2
+
+    monkeypatch.setattr(
+        auto_scheduler.tutor_api.ArmedWeek, "schedule_hour", mock_schedule_hour
+    )
+    monkeypatch.setattr(auto_scheduler.tutor_api.session, "warm_up", lambda *_: None)
+    hours = [(day, hour) for day in range(1, 4) for hour in range(11, 15)]
+
+    start = time.perf_counter()
+    clock = ClockEstimate(offset=0, uncertainty=0, rtt=0)
+    results = auto_scheduler.grab_hours(DateTime.now(), hours, DateTime.now(), clock)
+    elapsed = time.perf_counter() - start
+
+    # all twelve requests were in flight at the same time
+    assert elapsed < 1
+    assert sorted((r.day, r.hour) for r in results) == hours
+    assert all(r.latency >= 0.2 for r in results)
+    assert sum(r.success for r in results) == 6
+    assert sum(r.error is not None for r in results) == 3
+
+
+def test_poll_interval():
+    interval = auto_scheduler.PollInterval(
+        fastest=2, slowest=10, backoff=2, requests_per_hour=3600
+    )
+    assert interval.current == 2
+    for expected in (4, 8, 10, 10):
+        interval.unchanged()
+        assert interval.current == expected
+    interval.changed()
+    assert interval.current == 2
+
+    # two pages a poll, at no more than 360 pages an hour
+    interval = auto_scheduler.PollInterval(
+        fastest=2, slowest=10, requests_per_hour=360, requests_per_poll=2
+    )
+    assert interval.current == 20
+    interval.unchanged()
+    assert interval.current == 20
+
+
+def test_release_hours_timeout(monkeypatch):
+    class SlowArmedWeek:
+        def schedule_hour(self, day, hour, unset=False):
+            assert unset
+            time.sleep(0.3 if hour == 13 else 0)
+            return True
+
+    monkeypatch.setattr(auto_scheduler, "RELEASE_TIMEOUT", 0.1)
+    slots = [(2, 11), (2, 12), (2, 13)]
+    released, stuck = auto_scheduler.release_hours(SlowArmedWeek(), slots)
+    assert (released, stuck) == ([(2, 11), (2, 12)], [(2, 13)])
+
+    # the late one finishing doesn't change what was handed back
+    time.sleep(0.4)
+    assert (released, stuck) == ([(2, 11), (2, 12)], [(2, 13)])
@@ -0,0 +1,139 @@
+from collections import defaultdict
+import json
+import re
+
+import httplib2
+import pendulum
+import pytest
+from googleapiclient.errors import HttpError
+
+from libs import calendar_api
+from libs.calendar_api import SimpleEvent
+
+
+@pytest.fixture(autouse=True)
+def calendar_id(monkeypatch):
+    """Event IDs depend on the calendar, so use a made up one."""
+    monkeypatch.setattr(calendar_api, "credentials", {"calendar_id": "test"})
+
+
+def make_event(start_hour, end_hour, summary="Tutoring"):
+    day = pendulum.datetime(2022, 9, 12, tz="America/New_York")
+    return SimpleEvent(
+        summary, start=day.add(hours=start_hour), end=day.add(hours=end_hour)
+    )
+
+
+def make_existing(start_hour, end_hour, summary="Tutoring", event_id=None):
+    event = make_event(start_hour, end_hour, summary)
+    body = calendar_api.event_body(event)
+    # Google hands times back in UTC offset form, not the one we sent
+    for key in ("start", "end"):
+        time = pendulum.parse(body[key]["dateTime"]).in_timezone("UTC")
+        body[key]["dateTime"] = time.isoformat()
+    body["id"] = event_id or calendar_api.event_id(event)
+    return body
+
+
+def test_diff_events_no_changes():
+    desired = [make_event(11, 13), make_event(15, 16)]
+    existing = [make_existing(11, 13), make_existing(15, 16)]
+
+    assert calendar_api.diff_events(desired, existing) == ([], [], [])
+
+
+def test_diff_events_changes():
+    desired = [make_event(11, 14), make_event(15, 16), make_event(20, 21)]
+    existing = [
+        make_existing(11, 13, event_id="a"),
+        make_existing(15, 16, summary="Something else", event_id="b"),
+        make_existing(20, 21),
+        make_existing(20, 21, event_id="d"),
+    ]
+    existing[1]["id"] = calendar_api.event_id(make_event(15, 16))
+
+    to_insert, to_delete, to_patch = calendar_api.diff_events(desired, existing)
+
+    assert [(e.start.hour, e.end.hour) for e in to_insert] == [(11, 14)]
+    assert [e["id"] for e in to_delete] == ["a", "d"]
+    assert [(e["id"], d.summary) for e, d in to_patch] == [
+        (existing[1]["id"], "Tutoring")
+    ]
+
+
+def test_diff_events_replaces_events_without_our_ids():
+    desired = [make_event(11, 13)]
+    existing = [make_existing(11, 13, event_id="random")]
+
+    to_insert, to_delete, to_patch = calendar_api.diff_events(desired, existing)
+
+    assert to_insert == desired
+    assert [e["id"] for e in to_delete] == ["random"]
+    assert to_patch == []
+
+
+def test_diff_events_times_without_offsets():
+    # a naive time, like Schedule makes, sent and handed back as is
+    start = pendulum.naive(2022, 9, 12, 11)
+    event = SimpleEvent("Tutoring", start=start, end=start.add(hours=2))
+    existing = calendar_api.event_body(event)
+    existing["id"] = calendar_api.event_id(event)
+
+    assert "+" not in existing["start"]["dateTime"]
+    assert calendar_api.diff_events([event], [existing]) == ([], [], [])
+    assert calendar_api.event_start(existing) == pendulum.datetime(
+        2022, 9, 12, 11, tz="America/New_York"
+    )
+
+
+def test_event_ids():
+    event = make_event(11, 13)
+    # naive times are in the event's timezone, like Google reads them
+    naive = SimpleEvent("Tutoring", event.start.naive(), event.end.naive())
+    in_utc = SimpleEvent(
+        "Tutoring", event.start.in_timezone("UTC"), event.end.in_timezone("UTC")
+    )
+
+    assert calendar_api.event_id(event) == calendar_api.event_id(naive)
+    assert calendar_api.event_id(event) == calendar_api.event_id(in_utc)
+    assert calendar_api.event_id(event) != calendar_api.event_id(make_event(11, 14))
+    assert calendar_api.event_id(event) != calendar_api.event_id(event, "other")
+    assert re.fullmatch("[0-9a-v]{5,1024}", calendar_api.event_id(event))
+
+
+def make_http_error(status, reason=""):
+    content = json.dumps(
+        {"error": {"message": reason, "errors": [{"reason": reason}]}}
+    ).encode()
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def test_execute_batched_chunks_and_retries(monkeypatch):
+    chunk_sizes = []
+    attempts = defaultdict(int)
+
+    def mock_execute_chunk(_service, requests):
+        chunk_sizes.append(len(requests))
+        errors = {}
+        for id_ in requests:
+            attempts[id_] += 1
+            # request 3 is rate limited once, request 7 is just broken
+            if id_ == "3" and attempts[id_] == 1:
+                errors[id_] = make_http_error(403, "rateLimitExceeded")
+            elif id_ == "7":
+                errors[id_] = make_http_error(400, "badRequest")
+            elif id_ == "9":
+                errors[id_] = make_http_error(410, "deleted")
+        return errors
+
+    monkeypatch.setattr(calendar_api, "_execute_chunk", mock_execute_chunk)
+    monkeypatch.setattr(calendar_api.time, "sleep", lambda _: None)
+
+    failures = calendar_api.execute_batched(
+        None, [object() for _ in range(120)], ignore_statuses=(410,)
+    )
+
+    assert list(failures) == ["7"]
+    assert sorted(chunk_sizes) == [1, 20, 50, 50]
+    assert attempts["3"] == 2
+    assert attempts["7"] == 1
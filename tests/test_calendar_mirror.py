@@ -0,0 +1,72 @@
+import pendulum
+
+from libs import calendar_api
+from libs.calendar_api import SimpleEvent
+from libs.calendar_mirror import CalendarMirror
+
+WEEK = pendulum.datetime(2022, 9, 11, tz="America/New_York")
+
+
+def make_events(days, summary="Tutoring"):
+    return [
+        SimpleEvent(summary, WEEK.add(days=day, hours=12), WEEK.add(days=day, hours=14))
+        for day in days
+    ]
+
+
+def summaries(events):
+    return [(calendar_api.event_start(e).day, e["summary"]) for e in events]
+
+
+def test_mirror_only_reads_changes(calendar_server, tmp_path):
+    # two weeks' worth
+    calendar_api.add_events(make_events(range(14)))
+    mirror = CalendarMirror(tmp_path / "mirror.sqlite3")
+
+    assert mirror.refresh() == 14
+    events = mirror.events_between(WEEK, WEEK.end_of("week"))
+    assert events == calendar_api.get_events_between(WEEK, WEEK.end_of("week"))
+    assert len(events) == 7
+
+    # nothing changed, so there's nothing to read
+    calendar_server.reset_stats()
+    assert mirror.refresh() == 0
+    assert calendar_server.stats()["list_calls"] == 1
+
+    calendar_api.sync_events(make_events([1, 2]) + make_events([3], "Moved"), events)
+    assert mirror.refresh() == 5
+    assert summaries(mirror.events_between(WEEK, WEEK.end_of("week"))) == [
+        (12, "Tutoring"),
+        (13, "Tutoring"),
+        (14, "Moved"),
+    ]
+    # the next week's events are still there
+    assert len(mirror.events_between(WEEK.add(weeks=1), WEEK.add(weeks=2))) == 7
+
+
+def test_mirror_starts_over_when_the_token_expires(calendar_server, tmp_path):
+    calendar_api.add_events(make_events(range(3)))
+    mirror = CalendarMirror(tmp_path / "mirror.sqlite3")
+    mirror.refresh()
+
+    calendar_server.expire_sync_tokens()
+    calendar_api.delete_all_events(calendar_server.events("test")[:1])
+
+    # the deleted event never shows up, but the whole calendar is re-read
+    assert mirror.refresh() == 2
+    assert summaries(mirror.events_between(WEEK, WEEK.end_of("week"))) == [
+        (12, "Tutoring"),
+        (13, "Tutoring"),
+    ]
+    assert mirror.refresh() == 0
+
+
+def test_mirror_survives_restarts(calendar_server, tmp_path):
+    calendar_api.add_events(make_events(range(3)))
+    mirror = CalendarMirror(tmp_path / "mirror.sqlite3")
+    mirror.refresh()
+    mirror.close()
+
+    mirror = CalendarMirror(tmp_path / "mirror.sqlite3")
+    assert mirror.refresh() == 0
+    assert len(mirror.events_between(WEEK, WEEK.end_of("week"))) == 3
@@ -0,0 +1,104 @@
+import pendulum
+import pytest
+
+import auto_scheduler
+import daemon
+from daemon import Daemon, next_release
+
+NOW = pendulum.datetime(2024, 5, 6, 9, 0, tz="America/New_York")
+
+
+def test_next_release():
+    assert next_release(NOW) == NOW.set(hour=11)
+    assert next_release(NOW.set(hour=11)) == NOW.set(hour=11).add(days=1)
+    assert next_release(NOW.set(hour=15)) == NOW.set(hour=11).add(days=1)
+
+
+def test_next_job():
+    release = NOW.set(hour=11).timestamp()
+
+    d = Daemon(sync_every=60, arm_before=120)
+    d.next_arm = d.arm_time(NOW)
+    assert d.next_arm == release - 120
+
+    d.next_sync = release - 3600
+    assert d.next_job() == ("sync", release - 3600)
+    # a sync just before the grab waits until it's over
+    d.next_sync = release - 180
+    assert d.next_job() == ("arm", release - 120)
+    d.next_sync = release + 60
+    assert d.next_job() == ("arm", release - 120)
+
+    # watch polls take turns with syncs, and pause for the grab too
+    d.watcher = auto_scheduler.Watcher()
+    d.next_watch = release - 3700
+    assert d.next_job() == ("watch", release - 3700)
+    d.next_watch = release - 200
+    assert d.next_job() == ("arm", release - 120)
+
+    assert Daemon(sync_every=60, arm_before=None).next_job()[0] == "sync"
+    assert Daemon(sync_every=None).next_job()[0] == "arm"
+    with pytest.raises(Exception):
+        Daemon(sync_every=None, arm_before=None)
+
+
+def test_run_until_stopped(monkeypatch):
+    d = Daemon(sync_every=0.01, arm_before=None)
+    syncs = []
+
+    def sync():
+        syncs.append(d.next_sync)
+        if len(syncs) == 3:
+            d.stop.set()
+        d.next_sync += d.sync_every
+
+    monkeypatch.setattr(d, "warm_up", lambda: None)
+    monkeypatch.setattr(d, "sync", sync)
+    monkeypatch.setattr(daemon, "SnapshotStore", lambda: None)
+    monkeypatch.setattr(daemon, "CalendarMirror", lambda: None)
+    d.run()
+    assert len(syncs) == 3
+
+
+def test_rearm_after_finishing_early(monkeypatch):
+    release = NOW.set(hour=11)
+    pendulum.set_test_now(release.subtract(seconds=120))
+    try:
+        d = Daemon(sync_every=None)
+        runs = []
+        monkeypatch.setattr(auto_scheduler, "auto_schedule", lambda: runs.append(1))
+
+        # the grab fired before 11:00 by our clock, since the server's ahead
+        pendulum.set_test_now(release.subtract(seconds=1))
+        d.arm()
+        assert d.next_arm == release.add(days=1).timestamp() - 120
+        assert d.next_job() == ("arm", d.next_arm)
+        assert runs == [1]
+    finally:
+        pendulum.set_test_now()
+
+
+def test_rearm_after_failing(monkeypatch):
+    release = NOW.set(hour=11)
+    pendulum.set_test_now(release.subtract(seconds=60))
+    try:
+        d = Daemon(sync_every=None)
+
+        def fail():
+            raise Exception("Couldn't log in")
+
+        monkeypatch.setattr(auto_scheduler, "auto_schedule", fail)
+
+        # tried again a little later, not straight away
+        d.arm()
+        assert (
+            d.next_arm
+            == release.subtract(seconds=60).timestamp() + daemon.ARM_RETRY_DELAY
+        )
+
+        # and given up on once the hours have been out for a while
+        pendulum.set_test_now(release.add(seconds=daemon.ARM_RETRY_FOR))
+        d.arm()
+        assert d.next_arm == release.add(days=1).timestamp() - 120
+    finally:
+        pendulum.set_test_now()
@@ -0,0 +1,154 @@
+"""
+calendar_api talking HTTP to the fake Calendar API in fake_calendar.py.
+"""
+
+import pendulum
+
+import schedule_to_calendar
+from libs import calendar_api
+from libs.calendar_api import SimpleEvent
+from libs.tutor_api import Schedule
+
+WEEK = pendulum.datetime(2022, 9, 11, tz="America/New_York")
+
+
+def make_events(days, start_hour=12, end_hour=14, summary="Tutoring"):
+    return [
+        SimpleEvent(
+            summary,
+            WEEK.add(days=day, hours=start_hour),
+            WEEK.add(days=day, hours=end_hour),
+        )
+        for day in days
+    ]
+
+
+def test_add_and_list_events(calendar_server):
+    assert calendar_api.add_events(make_events(range(7))) == {}
+    # all seven inserts went in a single batch
+    assert calendar_server.stats()["batch_requests"] == 1
+    assert len(calendar_server.events("test")) == 7
+
+    events = calendar_api.get_events_for_week(WEEK.add(days=3))
+    assert [calendar_api.event_start(e) for e in events] == [
+        WEEK.add(days=day, hours=12) for day in range(7)
+    ]
+    # three to a page
+    assert calendar_server.stats()["list_calls"] == 3
+
+    assert calendar_api.get_events_for_week(WEEK.add(weeks=1)) == []
+
+
+def test_sync_only_sends_what_changed(calendar_server):
+    calendar_api.add_events(make_events(range(7)))
+    existing = calendar_api.get_events_for_week(WEEK)
+    calendar_server.reset_stats()
+
+    changes = calendar_api.sync_events(make_events(range(7)), existing)
+    assert changes == {"inserted": 0, "deleted": 0, "patched": 0, "failed": 0}
+    assert calendar_server.stats()["http_requests"] == 0
+
+    desired = make_events(range(1, 6)) + make_events([6], summary="Tutoring!")
+    changes = calendar_api.sync_events(desired, existing)
+    assert changes == {"inserted": 0, "deleted": 1, "patched": 1, "failed": 0}
+    # one batch for the deletes, and one for the patch
+    assert calendar_server.stats()["batch_requests"] == 2
+    assert [e["summary"] for e in calendar_server.events("test")] == [
+        "Tutoring"
+    ] * 5 + ["Tutoring!"]
+
+    # deleting something that's already gone is fine
+    assert calendar_api.delete_all_events(existing[:1]) == {}
+
+
+def test_rate_limited_requests_are_retried(calendar_server, monkeypatch):
+    monkeypatch.setattr(calendar_api.time, "sleep", lambda _: None)
+    calendar_server.rate_limit = 0.3
+
+    assert calendar_api.add_events(make_events(range(7))) == {}
+    assert len(calendar_server.events("test")) == 7
+    assert calendar_server.stats()["insert_calls"] > 7
+
+
+def test_batches_over_the_limit_are_rejected(calendar_server, monkeypatch):
+    monkeypatch.setattr(calendar_api, "BATCH_LIMIT", 60)
+    events = [
+        SimpleEvent("Tutoring", WEEK.add(minutes=i), WEEK.add(minutes=i + 1))
+        for i in range(60)
+    ]
+
+    failures = calendar_api.add_events(events)
+    assert len(failures) == 60
+    assert calendar_server.events("test") == []
+
+
+def test_inserts_are_idempotent(calendar_server):
+    events = make_events(range(7))
+    assert calendar_api.add_events(events) == {}
+    assert calendar_api.add_events(events) == {}
+    assert len(calendar_server.events("test")) == 7
+
+    # deleted events keep their IDs, so adding them back restores them
+    calendar_api.delete_all_events(calendar_server.events("test")[:2])
+    assert calendar_api.add_events(events[:1]) == {}
+    assert len(calendar_server.events("test")) == 6
+
+
+def test_sync_by_id_never_reads(calendar_server):
+    previous = make_events(range(7))
+    calendar_api.add_events(previous)
+    calendar_server.reset_stats()
+
+    desired = make_events(range(2, 7)) + make_events([7], summary="Tutoring!")
+    changes = calendar_api.sync_events_by_id(desired, previous)
+
+    assert changes == {"inserted": 1, "deleted": 2, "patched": 0, "failed": 0}
+    assert "list_calls" not in calendar_server.stats()
+    assert [e["summary"] for e in calendar_server.events("test")] == [
+        "Tutoring"
+    ] * 5 + ["Tutoring!"]
+
+
+def test_resync_schedule_makes_no_requests(calendar_server):
+    with open("tests/page_data/schedule.html") as f:
+        schedule = Schedule(f.read())
+    # Schedule's times are naive, and come back from the server in the
+    # calendar's timezone with an offset, like Google does
+    desired = [e for day in schedule.to_simple_events().values() for e in day]
+    assert desired and desired[0].start.tzinfo is None
+    calendar_api.add_events(desired)
+
+    week = calendar_api.localize(schedule.week, desired[0].timezone)
+    existing = calendar_api.get_events_between(week, week.add(weeks=1))
+    assert len(existing) == len(desired)
+    assert existing[0]["start"]["dateTime"].endswith(("-04:00", "-05:00"))
+
+    calendar_server.reset_stats()
+    changes = calendar_api.sync_events(desired, existing)
+    assert changes == {"inserted": 0, "deleted": 0, "patched": 0, "failed": 0}
+    assert calendar_server.stats()["http_requests"] == 0
+
+
+def test_sync_by_reading_buckets_weeks_in_the_schedules_timezone(calendar_server):
+    with open("tests/page_data/schedule.html") as f:
+        schedule = Schedule(f.read())
+    # a block late on the Saturday that's since been dropped, which a calendar
+    # in UTC hands back as early Sunday, the start of the next week
+    dropped = SimpleEvent(
+        "Tutoring",
+        schedule.week.add(days=6, hours=21),
+        schedule.week.add(days=6, hours=22),
+        timezone="UTC",
+    )
+    calendar_api.add_events([dropped])
+    (existing,) = calendar_server.events("test")
+    assert existing["start"]["dateTime"].startswith("2022-09-18T01:00:00")
+
+    failed = schedule_to_calendar.sync_by_reading(
+        [(schedule.week, schedule)], replace=False, force=False, mirror=None
+    )
+
+    assert failed == 0
+    events = calendar_server.events("test")
+    assert existing["id"] not in [e["id"] for e in events]
+    assert len(events) == len(schedule_to_calendar.simple_events([schedule]))
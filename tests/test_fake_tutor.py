@@ -0,0 +1,270 @@
+"""
+End-to-end tests: the real tutor_api and auto_scheduler code, talking HTTP
+to the fake tutor.com server in fake_tutor.py.
+"""
+
+import time
+from datetime import date
+
+import pendulum
+import pytest
+import requests
+
+import auto_scheduler
+import schedule_to_calendar
+from libs import calendar_api, metrics, server_clock, tutor_api, tutor_http
+from libs.planner import Planner
+from libs.server_clock import ClockEstimate
+from libs.snapshot_store import SnapshotStore
+from tests.fake_tutor import FakeTutorServer, week_start
+
+WEEK = week_start(date.today())
+RELEASED = {(day, hour) for day in (2, 4, 5) for hour in range(11, 21)}
+
+
+@pytest.fixture
+def use_server(monkeypatch, tmp_path):
+    """Point tutor_api at a fake server, with a fresh session."""
+    servers = []
+
+    def use(server: FakeTutorServer) -> FakeTutorServer:
+        server.start()
+        servers.append(server)
+        monkeypatch.setattr(tutor_api, "BASE_URL", server.url)
+        monkeypatch.setattr(tutor_api, "credentials", server.credentials)
+        monkeypatch.setattr(tutor_api, "SESSION_FILE", tmp_path / "session.json")
+        monkeypatch.setattr(tutor_api, "session", tutor_http.TutorSession())
+        return server
+
+    yield use
+    for server in servers:
+        server.stop()
+
+
+def test_login_and_fetch(use_server):
+    server = use_server(
+        FakeTutorServer(schedule={WEEK: {(0, 9): "Scheduled!", (3, 14): "Available"}})
+    )
+
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    assert schedule.week.format("YYYY-MM-DD") == WEEK.isoformat()
+    assert schedule.hours_scheduled == 1
+    assert schedule["SUN"][9] == tutor_api.SCHEDULED
+    assert schedule["WED"][14] == tutor_api.AVAILABLE
+    assert schedule.grid.available[3] == 1 << 14
+
+    # the session sticks around, so there's no need to log in again
+    tutor_api.login_and_get_html()
+    assert server.requests["login"] == 1
+
+    # and a later week is blank
+    html = tutor_api.get_html_for_week(pendulum.now().add(weeks=1))
+    assert tutor_api.Schedule(html).hours_scheduled == 0
+
+
+def test_wrong_password(use_server):
+    server = use_server(FakeTutorServer())
+    server.password = "something else"
+
+    with pytest.raises(Exception, match="username or password"):
+        tutor_api.login_and_get_html()
+
+
+def test_nothing_can_be_grabbed_before_release(use_server):
+    server = use_server(FakeTutorServer(released={WEEK: RELEASED}, release_at=1e10))
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    planner = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES)
+    hours = planner.plan()
+    planner.request(hours)
+
+    clock = ClockEstimate(offset=0, uncertainty=0, rtt=0)
+    results = auto_scheduler.grab_hours(
+        schedule.week, hours, pendulum.now(), clock, planner
+    )
+
+    assert results and not any(r.success for r in results)
+    assert all(r.error is None for r in results)
+    assert server.ours(WEEK) == set()
+
+
+def test_grab_against_other_tutors(use_server):
+    release_at = time.time() + 0.3
+    server = use_server(
+        FakeTutorServer(
+            released={WEEK: RELEASED},
+            release_at=release_at,
+            competition=0.5,
+            # they're always quicker than us
+            reaction_time=0.001,
+            latency=0.005,
+        )
+    )
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    planner = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES)
+    hours = planner.plan()
+    planner.request(hours)
+
+    clock = ClockEstimate(offset=0, uncertainty=0, rtt=0)
+    metrics.registry.reset()
+    results = auto_scheduler.grab_hours(
+        schedule.week, hours, pendulum.from_timestamp(release_at), clock, planner
+    )
+
+    won = {(r.day, r.hour) for r in results if r.success}
+    lost = {(r.day, r.hour) for r in results if not r.success}
+    assert won and won == server.ours(WEEK)
+    assert lost == {slot for _, slot in server.taken_at} & (won | lost)
+    # the hours the other tutors took were replaced
+    assert len(results) > len(hours)
+    assert all(r.error is None for r in results)
+
+    # every attempt was timed
+    spans = metrics.registry.to_json()["spans"]
+    assert len([s for s in spans if s["name"] == "schedule_hour"]) == len(results)
+    assert metrics.registry.counters[("grabs", (("outcome", "won"),))] == len(won)
+
+    # and the page agrees with what we think we got
+    html = tutor_api.get_html_for_week(schedule.week)
+    assert tutor_api.Schedule(html).hours_scheduled == len(won)
+
+
+def test_watch_grabs_dropped_hours(use_server):
+    server = use_server(
+        FakeTutorServer(schedule={WEEK: {(2, 14): "Available", (2, 15): "Scheduled!"}})
+    )
+    tutor_api.login_and_get_html()
+    watcher = auto_scheduler.Watcher(weeks=1)
+    metrics.registry.reset()
+
+    # the first look only records the week, and nothing changes after that
+    assert watcher.poll() == []
+    assert watcher.poll() == []
+    assert metrics.registry.counters[("watch_polls", (("changed", "false"),))] == 2
+
+    # someone drops TUE 12:00 and a MON hour. Only TUE is allowed, and the
+    # hour that was available all along was passed up before, so stays that way
+    server.schedule[WEEK][(2, 12)] = "Available"
+    server.schedule[WEEK][(1, 12)] = "Available"
+    results = watcher.poll()
+    assert [(r.day, r.hour, r.success) for r in results] == [(2, 12, True)]
+    assert server.ours(WEEK) == {(2, 12), (2, 15)}
+    assert watcher.interval.current == watcher.interval.floor()
+
+    # our own grab shows up as a change, but there's nothing new to grab
+    assert watcher.poll() == []
+    assert server.requests["schedule hour"] == 1
+
+
+def test_oversubscribe_gives_back_extras(use_server):
+    release_at = time.time() + 0.3
+    server = use_server(
+        FakeTutorServer(
+            released={WEEK: RELEASED},
+            release_at=release_at,
+            competition=0.5,
+            reaction_time=0.001,
+            latency=0.005,
+        )
+    )
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    wanted = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES).plan()
+
+    clock = ClockEstimate(offset=0, uncertainty=0, rtt=0)
+    metrics.registry.reset()
+    outcome = auto_scheduler.oversubscribe(
+        schedule, 0.5, pendulum.from_timestamp(release_at), clock
+    )
+
+    # we end up with exactly what we meant to keep, and nothing we gave back
+    assert outcome.kept and set(outcome.kept) == server.ours(WEEK)
+    assert not outcome.stuck
+    assert not set(outcome.released) & server.ours(WEEK)
+    assert len(outcome.kept) <= len(wanted)
+    counters = metrics.registry.counters
+    assert counters[("oversubscribe_released", ())] == len(outcome.released)
+
+
+def test_grab_measures_the_servers_clock(use_server):
+    # already released, so the only waiting is for the clock check
+    release_at = time.time()
+    server = use_server(
+        FakeTutorServer(released={WEEK: RELEASED}, release_at=release_at)
+    )
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    hours = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES).plan()
+
+    results = auto_scheduler.grab_hours(
+        schedule.week, hours, pendulum.from_timestamp(release_at)
+    )
+
+    assert server.requests["HEAD"] >= server_clock.SAMPLES
+    assert all(r.success and r.error is None for r in results)
+    assert server.ours(WEEK) == set(hours)
+
+
+def test_grab_after_a_late_start_fires_straight_away(use_server):
+    release_at = time.time() - 60
+    server = use_server(
+        FakeTutorServer(released={WEEK: RELEASED}, release_at=release_at)
+    )
+    schedule = tutor_api.Schedule(tutor_api.login_and_get_html())
+    hours = Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES).plan()
+
+    results = auto_scheduler.grab_hours(
+        schedule.week, hours, pendulum.from_timestamp(release_at)
+    )
+
+    # no clock check or warm-up, it's too late for either to help
+    assert server.requests["HEAD"] == 0
+    assert all(r.success and r.error is None for r in results)
+    assert server.ours(WEEK) == set(hours)
+
+
+def test_sync_fetches_each_week_once(use_server, calendar_server, tmp_path):
+    server = use_server(
+        FakeTutorServer(schedule={WEEK: {(2, 14): "Scheduled!", (4, 9): "Scheduled!"}})
+    )
+    this_week = pendulum.now().start_of("week")
+    weeks = [this_week, this_week.add(weeks=1)]
+    store = SnapshotStore(tmp_path / "snapshots.sqlite3")
+
+    schedule_to_calendar.add_weeks_to_calendar(weeks, store=store)
+    assert len(calendar_server.events("test")) == 2
+    # logging in brought back this week, so only next week was fetched
+    assert server.requests["week"] == 1
+
+    # and with the saved session, checking it is what gets this week
+    server.requests.clear()
+    calendar_server.reset_stats()
+    schedule_to_calendar.add_weeks_to_calendar(weeks, store=store)
+    assert server.requests["week"] == 2
+    assert calendar_server.stats()["http_requests"] == 0
+    store.close()
+
+
+def test_sync_reads_a_calendar_it_never_wrote_to(
+    use_server, calendar_server, tmp_path, monkeypatch
+):
+    server = use_server(
+        FakeTutorServer(schedule={WEEK: {(2, 14): "Scheduled!", (4, 9): "Scheduled!"}})
+    )
+    week = pendulum.now().start_of("week")
+    store = SnapshotStore(tmp_path / "snapshots.sqlite3")
+    schedule_to_calendar.add_weeks_to_calendar([week], store=store)
+
+    # what was saved for "test" says nothing about what's in "other"
+    server.schedule[WEEK][(5, 10)] = "Scheduled!"
+    monkeypatch.setattr(calendar_api, "credentials", {"calendar_id": "other"})
+    schedule_to_calendar.add_weeks_to_calendar([week], store=store)
+    assert len(calendar_server.events("other")) == 3
+    store.close()
+
+
+def test_requests_time_out(use_server, monkeypatch):
+    use_server(FakeTutorServer(latency=0.5))
+    monkeypatch.setattr(tutor_api, "session", tutor_http.TutorSession(timeout=0.1))
+
+    start = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        tutor_api.login_and_get_html()
+    assert time.perf_counter() - start < 0.4
@@ -0,0 +1,27 @@
+"""
+Importing the entry points should be quick and harmless: no reading
+secrets/, and none of the slow optional dependencies until they're used.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_import_time import HEAVY_MODULES, REPO_ROOT
+
+
+@pytest.mark.parametrize("module", ["auto_scheduler", "schedule_to_calendar"])
+def test_import_is_light(module, tmp_path):
+    # tmp_path has no secrets folder, so anything read at import time fails
+    code = f"import sys, {module}\nprint(sorted(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": REPO_ROOT},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert not set(HEAVY_MODULES) & set(eval(result.stdout))
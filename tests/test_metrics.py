@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from libs.metrics import Metrics
+
+
+def test_span_records_latency_and_errors():
+    metrics = Metrics()
+    with metrics.span("fetch_week") as span:
+        span.labels["week"] = "09/11/2022"
+    with pytest.raises(ValueError):
+        with metrics.span("fetch_week"):
+            raise ValueError()
+
+    data = metrics.to_json()
+    assert [(h["name"], h["labels"], h["count"]) for h in data["histograms"]] == [
+        ("fetch_week_seconds", {"error": "true"}, 1),
+        ("fetch_week_seconds", {"week": "09/11/2022"}, 1),
+    ]
+    assert [span["name"] for span in data["spans"]] == ["fetch_week"] * 2
+    assert all(span["duration"] >= 0 for span in data["spans"])
+
+
+def test_prometheus_output():
+    metrics = Metrics()
+    metrics.count("calendar_requests", 3, action="insert")
+    metrics.count("calendar_requests", 2, action="insert")
+    metrics.observe("plan_seconds", 0.003)
+    metrics.observe("plan_seconds", 2)
+
+    assert metrics.to_prometheus().splitlines() == [
+        "# TYPE tutor_scheduler_calendar_requests_total counter",
+        'tutor_scheduler_calendar_requests_total{action="insert"} 5',
+        "# TYPE tutor_scheduler_plan_seconds histogram",
+        'tutor_scheduler_plan_seconds_bucket{le="0.001"} 0',
+        'tutor_scheduler_plan_seconds_bucket{le="0.0025"} 0',
+        'tutor_scheduler_plan_seconds_bucket{le="0.005"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="0.01"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="0.025"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="0.05"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="0.1"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="0.25"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="0.5"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="1"} 1',
+        'tutor_scheduler_plan_seconds_bucket{le="2.5"} 2',
+        'tutor_scheduler_plan_seconds_bucket{le="5"} 2',
+        'tutor_scheduler_plan_seconds_bucket{le="10"} 2',
+        'tutor_scheduler_plan_seconds_bucket{le="30"} 2',
+        'tutor_scheduler_plan_seconds_bucket{le="+Inf"} 2',
+        "tutor_scheduler_plan_seconds_sum 2.003",
+        "tutor_scheduler_plan_seconds_count 2",
+    ]
+
+
+def test_write(tmp_path):
+    metrics = Metrics()
+    metrics.count("grabs", outcome="won")
+
+    metrics.write(tmp_path / "metrics.json")
+    metrics.write(tmp_path / "metrics.prom")
+
+    data = json.loads((tmp_path / "metrics.json").read_text())
+    assert data["counters"] == [
+        {"name": "grabs", "labels": {"outcome": "won"}, "value": 1}
+    ]
+    prom = (tmp_path / "metrics.prom").read_text()
+    assert 'tutor_scheduler_grabs_total{outcome="won"} 1' in prom
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "metrics.json",
+        "metrics.prom",
+    ]
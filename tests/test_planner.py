@@ -0,0 +1,107 @@
+import auto_scheduler
+from libs.planner import Planner, Rules
+from libs.tutor_api import DAYS_OF_WEEK
+
+RULES = auto_scheduler.RULES
+
+
+def make_schedule(available=range(24), scheduled=()):
+    """Every day has the same hours available and scheduled."""
+    schedule = {day: {hour: "Available" for hour in available} for day in DAYS_OF_WEEK}
+    for day in DAYS_OF_WEEK:
+        for hour in scheduled:
+            schedule[day][hour] = "Scheduled!"
+    return schedule
+
+
+def hours_for(plan, day_name):
+    day = DAYS_OF_WEEK.index(day_name)
+    return [hour for d, hour in plan if d == day]
+
+
+def test_plan_blank_week():
+    plan = Planner(make_schedule(), 0, RULES).plan()
+
+    assert len(plan) == RULES.max_per_week
+    assert hours_for(plan, "MON") == []
+    assert hours_for(plan, "SUN") == [11, 12, 13, 14, 16, 17, 18, 19]
+
+
+def test_plan_counts_hours_before_start_time():
+    plan = Planner(make_schedule(scheduled=[8, 9, 10]), 15, RULES).plan()
+
+    # 8-10 plus 11 makes four in a row
+    assert hours_for(plan, "SUN") == [11, 13, 14, 15, 16]
+
+
+def test_plan_avoids_long_runs_with_later_hours():
+    rules = Rules(max_per_day=24)
+    schedule = make_schedule(available=range(11, 15), scheduled=range(15, 18))
+
+    assert hours_for(Planner(schedule, 0, rules).plan(), "SUN") == [11, 12, 13]
+
+
+def test_plan_goes_past_daily_max_last():
+    schedule = make_schedule(available=[])
+    schedule["TUE"] = {hour: "Available" for hour in range(24)}
+    schedule["THU"] = {hour: "Available" for hour in range(11, 13)}
+
+    plan = Planner(schedule, 28, RULES).plan()
+
+    assert len(plan) == 12
+    # the two THU hours are within the daily max, so come before TUE's extras
+    assert plan[8:10] == [(4, 11), (4, 12)]
+    assert hours_for(plan, "TUE") == [11, 12, 13, 14, 16, 17, 18, 19, 21, 22]
+
+
+def test_mark_lost_replans():
+    schedule = make_schedule(available=[])
+    schedule["SUN"] = {hour: "Available" for hour in range(11, 24)}
+    planner = Planner(schedule, 34, RULES)
+    plan = planner.plan()
+    planner.request(plan)
+    assert plan == [(0, h) for h in (11, 12, 13, 14, 16, 17)]
+
+    planner.mark_won(0, 11)
+    replacements = planner.mark_lost(0, 12)
+
+    assert replacements == [(0, 18)]
+    assert planner.plan() == []
+    assert planner.pending == {(0, h) for h in (13, 14, 16, 17, 18)}
+
+
+def test_fallbacks_most_useful_first():
+    schedule = make_schedule(available=[])
+    schedule["SUN"] = {hour: "Scheduled!" for hour in (11, 12, 13, 14, 16, 17, 18, 19)}
+    schedule["SUN"].update({hour: "Available" for hour in (21, 22, 23)})
+    schedule["TUE"] = {hour: "Available" for hour in (11, 12, 13, 14, 16)}
+    planner = Planner(schedule, 37, RULES)
+    plan = planner.plan()
+    assert plan == [(2, 11), (2, 12), (2, 13)]
+
+    # SUN is already full, so TUE 14 is the one that'd stand in for any of
+    # the planned hours
+    assert planner.fallbacks() == [(2, 14), (0, 21), (0, 22), (0, 23), (2, 16)]
+    # and working that out didn't change the plan
+    assert planner.plan() == plan
+    assert planner.pending == set()
+
+
+def test_restrict():
+    planner = Planner(make_schedule(available=range(11, 24)), 30, RULES)
+    planner.restrict([0, 1 << 20, 1 << 12 | 1 << 13, 0, 0, 0, 0])
+
+    # MON is off limits, even when an hour opens up there
+    assert planner.plan() == [(2, 12), (2, 13)]
+
+
+def test_get_hours_to_schedule():
+    schedule = make_schedule()
+    hours = auto_scheduler.get_hours_to_schedule(_WithHours(schedule, 0))
+    assert len(hours) == RULES.max_per_week
+
+
+class _WithHours(dict):
+    def __init__(self, schedule, hours_scheduled):
+        super().__init__(schedule)
+        self.hours_scheduled = hours_scheduled
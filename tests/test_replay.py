@@ -0,0 +1,164 @@
+"""
+Performance regression tests: the real tutor_api, auto_scheduler and
+schedule_to_calendar code, replaying sessions recorded with
+benchmarks/record_tutor_session.py instead of talking to tutor.com.
+
+Every timing has a budget, far above what it takes on a laptop, so only a
+real slowdown trips it. The timings are printed too, to keep an eye on.
+"""
+
+import json
+import time
+
+import pendulum
+import pytest
+
+import auto_scheduler
+import schedule_to_calendar
+from libs import metrics, server_clock, tutor_api, tutor_http
+from libs.http_recording import (
+    RecordingAdapter,
+    ReplayAdapter,
+    placeholder_credentials,
+)
+from libs.planner import Planner
+from libs.server_clock import ClockEstimate
+from tests.fake_tutor import FakeTutorServer, week_start
+
+RECORDINGS = "tests/recordings"
+ITERATIONS = 50
+# Seconds
+BUDGETS = {
+    "parse": 0.005,
+    "plan": 0.005,
+    "auto_schedule": 2.0,
+    "add_week_to_calendar": 2.0,
+}
+
+
+@pytest.fixture
+def replay(monkeypatch, tmp_path):
+    """Point tutor_api at a recording, with pendulum's clock set to match."""
+
+    def use(name: str, realtime=False) -> ReplayAdapter:
+        session = tutor_http.TutorSession(
+            adapter=ReplayAdapter, path=f"{RECORDINGS}/{name}.json", realtime=realtime
+        )
+        monkeypatch.setattr(tutor_api, "session", session)
+        monkeypatch.setattr(tutor_api, "credentials", placeholder_credentials())
+        monkeypatch.setattr(tutor_api, "SESSION_FILE", tmp_path / "session.json")
+        pendulum.set_test_now(session.adapter.recorded_at)
+        return session.adapter
+
+    yield use
+    pendulum.set_test_now()
+
+
+def timed(name: str, function, iterations=1) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    seconds = (time.perf_counter() - start) / iterations
+    print(f"{name}: {seconds * 1000:.2f} ms")
+    assert seconds < BUDGETS[name]
+    return seconds
+
+
+def recorded_pages(adapter: ReplayAdapter) -> list[str]:
+    this_week = adapter.recorded_at.start_of("week")
+    return tutor_api.login_and_get_html_for_weeks(
+        [this_week.add(weeks=i) for i in range(3)]
+    )
+
+
+def test_record_and_replay(monkeypatch, tmp_path):
+    server = FakeTutorServer(
+        schedule={week_start(pendulum.today().date()): {(2, 14): "Scheduled!"}},
+        username="someone@example.com",
+        password="correct horse",
+    )
+    with server:
+        monkeypatch.setattr(tutor_api, "BASE_URL", server.url)
+        monkeypatch.setattr(tutor_api, "credentials", server.credentials)
+        monkeypatch.setattr(tutor_api, "SESSION_FILE", tmp_path / "cookies.json")
+        session = tutor_http.TutorSession(
+            adapter=RecordingAdapter, credentials=server.credentials
+        )
+        monkeypatch.setattr(tutor_api, "session", session)
+        live = tutor_api.login_and_get_html()
+        session.adapter.save(tmp_path / "recording.json")
+
+    with open(tmp_path / "recording.json") as f:
+        recording = f.read()
+    for secret in server.credentials.values():
+        assert secret not in recording
+    assert "correct+horse" not in recording
+    (cookie,) = [
+        value
+        for exchange in json.loads(recording)["exchanges"]
+        for name, value in exchange["headers"]
+        if name == "Set-Cookie"
+    ]
+    assert cookie.startswith("ASP.NET_SessionId=redacted;")
+
+    # the server's gone, but the session lives on
+    replayed = tutor_http.TutorSession(
+        adapter=ReplayAdapter, path=tmp_path / "recording.json"
+    )
+    monkeypatch.setattr(tutor_api, "session", replayed)
+    monkeypatch.setattr(tutor_api, "credentials", placeholder_credentials())
+    monkeypatch.setattr(tutor_api, "SESSION_FILE", tmp_path / "replayed.json")
+    assert tutor_api.login_and_get_html() == live
+    assert tutor_api.session.cookies["ASP.NET_SessionId"] == "redacted"
+    with pytest.raises(Exception, match="Nothing recorded"):
+        tutor_api.get_html_for_week(pendulum.now().add(weeks=5))
+
+
+def test_replay_realtime(replay):
+    adapter = replay("sync", realtime=True)
+    recorded = sum(exchange["seconds"] for exchange in adapter.exchanges[:2])
+    start = time.perf_counter()
+    tutor_api.login_and_get_html()
+    assert time.perf_counter() - start >= recorded
+
+
+def test_parse_time(replay):
+    pages = recorded_pages(replay("sync"))
+    for page in pages:
+        timed("parse", lambda: tutor_api.Schedule(page), ITERATIONS)
+    assert [tutor_api.Schedule(page).hours_scheduled for page in pages] == [3, 0, 0]
+
+
+def test_plan_time(replay):
+    schedule = tutor_api.Schedule(recorded_pages(replay("sync"))[1])
+
+    def plan():
+        Planner(schedule, schedule.hours_scheduled, auto_scheduler.RULES).plan()
+
+    timed("plan", plan, ITERATIONS)
+
+
+def test_auto_schedule_time(monkeypatch, replay):
+    adapter = replay("auto_schedule")
+    # the clock check sleeps between samples on purpose, which isn't worth
+    # timing here
+    monkeypatch.setattr(
+        server_clock, "estimate_offset", lambda *_: ClockEstimate(0, 0, 0)
+    )
+    metrics.registry.reset()
+    timed("auto_schedule", auto_scheduler.main)
+
+    # it went for the same hours as when it was recorded, and won the same
+    won = [e for e in adapter.exchanges if e["body"] == "ScheduleSelectedComplete(1);"]
+    counters = metrics.registry.counters
+    assert counters[("grabs", (("outcome", "won"),))] == len(won)
+    assert ("grabs", (("outcome", "error"),)) not in counters
+
+
+def test_add_week_to_calendar_time(calendar_server, replay):
+    adapter = replay("sync")
+    week = adapter.recorded_at.start_of("week")
+    timed(
+        "add_week_to_calendar", lambda: schedule_to_calendar.add_week_to_calendar(week)
+    )
+    assert len(calendar_server.events("test")) == 2
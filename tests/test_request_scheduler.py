@@ -0,0 +1,117 @@
+import time
+
+from libs.request_scheduler import RequestScheduler, TokenBucket
+from libs.tutor_api import UnexpectedResponse
+
+
+def run(scheduler: RequestScheduler, items: list, priorities: list) -> list:
+    done = []
+
+    def on_done(item, result, error, sent_at):
+        done.append((item, result, error))
+
+    for item, priority in zip(items, priorities):
+        scheduler.submit(item, priority, on_done)
+    scheduler.start()
+    scheduler.release()
+    scheduler.join()
+    return done
+
+
+def test_most_important_first():
+    scheduler = RequestScheduler(lambda item: item * 2, concurrency=1)
+    done = run(scheduler, ["c", "a", "d", "b"], [3, 1, 3, 2])
+
+    # ties go in the order they were submitted
+    assert [item for item, _, _ in done] == ["a", "b", "c", "d"]
+    assert done[0] == ("a", "aa", None)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=5)
+    start = time.perf_counter()
+    for _ in range(15):
+        bucket.acquire()
+    # the first five go straight away, the other ten at 100 a second
+    assert 0.09 < time.perf_counter() - start < 0.2
+
+    bucket.back_off(0.1)
+    assert bucket.acquire() >= 0.09
+
+
+def test_retries_unexpected_responses():
+    attempts = []
+
+    def send(item):
+        attempts.append((item, time.perf_counter()))
+        if item == "flaky" and len(attempts) < 3:
+            raise UnexpectedResponse("Unforeseen response: b'Slow down'")
+        if item == "broken":
+            raise UnexpectedResponse("Unforeseen response: b'?'")
+        if item == "error":
+            raise ValueError("not retried")
+        return True
+
+    scheduler = RequestScheduler(send, concurrency=1, max_retries=2, backoff=0.01)
+    done = {
+        item: (result, error)
+        for item, result, error in run(
+            scheduler, ["flaky", "broken", "error"], [0, 1, 2]
+        )
+    }
+
+    assert done["flaky"] == (True, None)
+    assert isinstance(done["broken"][1], UnexpectedResponse)
+    assert isinstance(done["error"][1], ValueError)
+    assert [item for item, _ in attempts].count("broken") == 3
+    assert [item for item, _ in attempts].count("error") == 1
+    # and it waited longer each time
+    flaky = [at for item, at in attempts if item == "flaky"]
+    assert flaky[2] - flaky[1] > flaky[1] - flaky[0] >= 0.01
+
+
+def test_on_done_can_submit_more():
+    scheduler = RequestScheduler(lambda item: item, concurrency=2)
+    done = []
+
+    def on_done(item, result, error, sent_at):
+        done.append(item)
+        if item < 3:
+            scheduler.submit(item + 1, item + 1, on_done)
+
+    scheduler.submit(0, 0, on_done)
+    scheduler.start()
+    scheduler.release()
+    scheduler.join()
+    assert done == [0, 1, 2, 3]
+
+
+def test_join_timeout():
+    scheduler = RequestScheduler(lambda seconds: time.sleep(seconds), concurrency=2)
+    scheduler.submit(0.3, 0, lambda *_: None)
+    scheduler.submit(0, 0, lambda *_: None)
+    scheduler.start()
+    scheduler.release()
+    start = time.perf_counter()
+    assert not scheduler.join(timeout=0.05)
+    assert time.perf_counter() - start < 0.2
+    assert scheduler.pending == 1
+
+
+def test_sent_at_is_after_the_rate_limit():
+    # one request a tenth of a second, so the second one waits for the first
+    scheduler = RequestScheduler(
+        lambda seconds: time.sleep(seconds), concurrency=2, rate=10, burst=1
+    )
+    latencies = []
+
+    def on_done(item, result, error, sent_at):
+        latencies.append(time.perf_counter() - sent_at)
+
+    scheduler.submit(0.05, 0, on_done)
+    scheduler.submit(0.05, 1, on_done)
+    scheduler.start()
+    scheduler.release()
+    scheduler.join()
+    # each one only counts its own send, not the wait before it
+    assert all(0.05 <= latency < 0.09 for latency in latencies)
@@ -0,0 +1,58 @@
+import time
+from email.utils import formatdate
+
+import pendulum
+
+import auto_scheduler
+from libs import server_clock
+from libs.server_clock import ClockEstimate
+
+
+class FakeServer:
+    """Answers HEAD requests with a Date header from a clock that's off."""
+
+    def __init__(self, offset, latency):
+        self.offset = offset
+        self.latency = latency
+
+    def head(self, _url):
+        time.sleep(self.latency)
+        now = time.time() + self.offset
+        time.sleep(self.latency)
+        return FakeResponse({"Date": formatdate(now, usegmt=True)})
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_estimate_offset():
+    server = FakeServer(offset=-3.37, latency=0.005)
+
+    clock = server_clock.estimate_offset(server, "https://example.com")
+
+    assert abs(clock.offset - server.offset) <= clock.uncertainty
+    # a lot better than the one second we get from a single Date header
+    assert clock.uncertainty < 0.3
+    assert 0.01 <= clock.rtt < 0.05
+
+
+def test_wait_until():
+    deadline = time.time() + 0.05
+    server_clock.wait_until(deadline)
+    # not early, and not so late it'd matter. A busy machine can be slow to
+    # wake the thread up, so there's plenty of room on that side.
+    assert 0 <= time.time() - deadline < 0.05
+
+
+def test_local_fire_time():
+    release = pendulum.datetime(2022, 9, 11, 11, tz="America/New_York")
+    clock = ClockEstimate(offset=2.0, uncertainty=0.1, rtt=0.2)
+
+    fire_at = auto_scheduler.local_fire_time(release, clock)
+
+    # two seconds early since the server's ahead, minus half the round trip,
+    # plus the uncertainty and the margin
+    expected = release.timestamp() - 2.0 - 0.1 + 0.1 + auto_scheduler.FIRE_MARGIN
+    assert abs(fire_at - expected) < 1e-6
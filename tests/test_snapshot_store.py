@@ -0,0 +1,64 @@
+from libs import tutor_api
+from libs.snapshot_store import SnapshotStore
+
+
+def load_schedule(name="schedule"):
+    with open(f"tests/page_data/{name}.html") as f:
+        html = f.read()
+    return html, tutor_api.Schedule(html)
+
+
+def test_snapshot_store(tmp_path):
+    store = SnapshotStore(tmp_path / "snapshots.sqlite3")
+    html, schedule = load_schedule()
+    week = schedule.week
+
+    assert not store.page_unchanged(week, html)
+    assert store.grid(week) is None
+    assert store.save(week, html, schedule) is None
+
+    assert store.page_unchanged(week, html)
+    assert store.grid(week) == schedule.grid
+
+    # a different page with the same grid doesn't count as a change
+    assert not store.page_unchanged(week, html + " ")
+    assert store.save(week, html + " ", schedule) is None
+    assert store.history(week) == []
+
+    schedule["SUN"][22] = "Scheduled!"
+    change = store.save(week, html, schedule)
+    assert change.became_scheduled[0] == 1 << 22
+
+    history = store.history(week)
+    assert len(history) == 1
+    assert history[0][1] == change
+    store.close()
+
+    # and it's all still there next time
+    store = SnapshotStore(tmp_path / "snapshots.sqlite3")
+    assert store.grid(week) == schedule.grid
+    assert len(store.history(week)) == 1
+
+
+def times(schedule):
+    return {
+        day: [(event.start, event.end) for event in events]
+        for day, events in schedule.to_simple_events().items()
+    }
+
+
+def test_calendar_grid(tmp_path):
+    store = SnapshotStore(tmp_path / "snapshots.sqlite3")
+    _, schedule = load_schedule()
+    week = schedule.week
+
+    assert store.calendar_grid(week, "test") is None
+    store.save_calendar_grid(week, schedule.grid, "test")
+    assert store.calendar_grid(week, "test") == schedule.grid
+    # nothing's been written to any other calendar
+    assert store.calendar_grid(week, "other") is None
+
+    previous = tutor_api.Schedule.from_grid(week, store.calendar_grid(week, "test"))
+    assert times(previous) == times(schedule)
+    assert previous.hours_scheduled == schedule.hours_scheduled
+    store.close()
@@ -0,0 +1,181 @@
+import os
+import re
+
+import pendulum
+import pytest
+
+from libs import tutor_api, tutor_http
+from libs.http_recording import placeholder_credentials
+
+
+class MockResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+def load_page(name="schedule"):
+    with open(f"tests/page_data/{name}.html") as f:
+        return f.read()
+
+
+def test_fast_parse_matches_soup_parse():
+    for name in ("schedule", "week2"):
+        html = load_page(name)
+        parsed = tutor_api.Schedule.fast_parse(html)
+        assert parsed is not None
+        assert parsed == tutor_api.Schedule.soup_parse(html)
+
+
+def test_fast_parse_rejects_missing_cells():
+    html = load_page()
+    # knock out a single cell
+    html = re.sub(r"fillCell(?=\(\\'#\w+\\', \\'42\\')", "ignoreCell", html)
+
+    assert tutor_api.Schedule.fast_parse(html) is None
+    # but the schedule still parses, using the fallback
+    schedule = tutor_api.Schedule(html)
+    assert schedule.hours_scheduled == 27
+
+
+def test_parse_form():
+    html = """
+    <form method="post" action="./setContactID.aspx?ProgramGUID=abc" id="Form1">
+        <input type="hidden" name="__VIEWSTATE" value="dDwtMTA" />
+        <input name="txtUserName" type="text" id="txtUserName" />
+        <input name="txtPassword" type="password" id="txtPassword" />
+        <input type="checkbox" name="chkRemember" />
+        <select name="ddlLanguage">
+            <option value="en">English</option>
+            <option value="es" selected>Spanish</option>
+        </select>
+        <input type="submit" name="btnLogin" value="Log In" />
+        <input type="submit" name="btnCancel" value="Cancel" />
+    </form>
+    """
+    url = "https://prv.tutor.com/nGEN/Tools/ScheduleManager_v2/setContactID.aspx"
+
+    action, fields = tutor_http.parse_form(html, url)
+
+    assert action == (
+        "https://prv.tutor.com/nGEN/Tools/ScheduleManager_v2/"
+        "setContactID.aspx?ProgramGUID=abc"
+    )
+    assert fields == {
+        "__VIEWSTATE": "dDwtMTA",
+        "txtUserName": "",
+        "txtPassword": "",
+        "ddlLanguage": "es",
+        "btnLogin": "Log In",
+    }
+
+
+def test_armed_week(monkeypatch):
+    week = pendulum.datetime(2022, 9, 11, tz="America/New_York")
+    armed = tutor_api.ArmedWeek(week)
+    sent = []
+
+    def mock_send(request):
+        sent.append(request)
+        return MockResponse(b"ScheduleSelectedComplete(0);")
+
+    monkeypatch.setattr(tutor_api.session, "send", mock_send)
+
+    assert len(armed._requests) == 7 * 24 * 2
+    assert armed.schedule_hour(2, 21) is False
+    assert sent[0].method == "POST"
+    assert sent[0].url == tutor_api.build_schedule_hour_url(week.add(days=2, hours=21))
+    armed.schedule_hour(6, 0, unset=True)
+    assert "Type=Remove&Week=09/11/2022&WeekDay=7&Hour=12AM" in sent[1].url
+
+
+def test_classify_schedule_response():
+    assert tutor_api.classify_schedule_response(b"ScheduleSelectedComplete(1);")
+    with pytest.raises(tutor_api.UnexpectedResponse, match="Unforeseen response"):
+        tutor_api.classify_schedule_response(b"<html>Session expired</html>")
+
+
+def test_bit_helpers():
+    mask = 0b1110_0110_0001
+    assert tutor_api.bits(mask) == [0, 5, 6, 9, 10, 11]
+    assert tutor_api.runs(mask) == [(0, 1), (5, 7), (9, 12)]
+    assert tutor_api.runs(1 << 23) == [(23, 24)]
+    assert tutor_api.bits(0) == tutor_api.runs(0) == []
+
+
+def test_schedule_views_and_diff():
+    before = tutor_api.Schedule(load_page())
+    after = tutor_api.Schedule(load_page())
+
+    assert dict(after["SUN"]) == {h: "Scheduled!" for h in (15, 16, 17, 19, 20, 21)}
+    assert after.scheduled_on(0) == 6
+    assert not after.diff(before)
+
+    after["SUN"][22] = "Available"
+    after["SUN"][8] = "Unavailable"
+    del after["SUN"][15]
+    change = after.diff(before)
+
+    assert change.became_available == [1 << 22, 0, 0, 0, 0, 0, 0]
+    assert change.stopped_being_scheduled == [1 << 15, 0, 0, 0, 0, 0, 0]
+    assert not any(change.became_scheduled + change.stopped_being_available)
+    assert list(after["SUN"]) == [8, 16, 17, 19, 20, 21, 22]
+    assert after["SUN"][8] == "Unavailable"
+
+
+def test_session_cookies_round_trip(tmp_path):
+    path = tmp_path / "session.json"
+    session = tutor_http.TutorSession()
+    session.cookies.set("ASP.NET_SessionId", "abc123", domain="prv.tutor.com")
+    session.save_cookies(path)
+
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    restored = tutor_http.TutorSession()
+    assert restored.load_cookies(path)
+    assert restored.cookies.get("ASP.NET_SessionId", domain="prv.tutor.com") == "abc123"
+    assert not restored.load_cookies(tmp_path / "missing.json")
+
+
+class PageResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+def test_login_reuses_saved_session(monkeypatch, tmp_path):
+    page = load_page().encode()
+    session = tutor_http.TutorSession()
+    session.cookies.set("ASP.NET_SessionId", "abc123", domain="prv.tutor.com")
+    session.save_cookies(tmp_path / "session.json")
+    logins = []
+
+    monkeypatch.setattr(tutor_api, "SESSION_FILE", tmp_path / "session.json")
+    monkeypatch.setattr(tutor_api, "session", tutor_http.TutorSession())
+    monkeypatch.setattr(tutor_api.session, "get", lambda url: PageResponse(page))
+    monkeypatch.setattr(
+        tutor_api.session, "submit_form", lambda *args: logins.append(args)
+    )
+
+    assert tutor_api.login_and_get_html() == str(page)
+    assert logins == []
+
+
+def test_login_when_session_expired(monkeypatch, tmp_path):
+    page = load_page().encode()
+    logins = []
+
+    def mock_submit_form(*args):
+        logins.append(args)
+        return PageResponse(page)
+
+    monkeypatch.setattr(tutor_api, "credentials", placeholder_credentials())
+    monkeypatch.setattr(tutor_api, "SESSION_FILE", tmp_path / "session.json")
+    monkeypatch.setattr(tutor_api, "session", tutor_http.TutorSession())
+    tutor_api.session.cookies.set("ASP.NET_SessionId", "old", domain="prv.tutor.com")
+    monkeypatch.setattr(
+        tutor_api.session, "get", lambda url: PageResponse(b"<form>Log in</form>")
+    )
+    monkeypatch.setattr(tutor_api.session, "submit_form", mock_submit_form)
+
+    assert tutor_api.login_and_get_html() == str(page)
+    assert len(logins) == 1
+    assert (tmp_path / "session.json").exists()